@@ -0,0 +1,58 @@
+"""
+Throughput of the batch classification, paper by paper and in corpus mode.
+
+Per-paper mode (CSOClassifier.classify_many) matches the n-grams of each paper as it goes, with or without the
+caches of the modules. Corpus mode (CSOClassifier.classify_corpus) collects the distinct n-grams and concepts of the corpus first,
+matches each of them once, and then assembles the topics of each paper. Both run on the same synthetic ontology,
+cached model and papers, tagged by a rule-based spaCy pipeline, and must return the same result.
+
+    python benchmarks/corpus.py --papers 2000 --workers 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model, synthetic_nlp, synthetic_ontology, synthetic_papers  # noqa: E402
+from classifier.classifier import CSOClassifier  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--tokens', type=int, default=50000, help='number of tokens of the synthetic model')
+    parser.add_argument('--papers', type=int, default=1000, help='number of synthetic papers')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    model = synthetic_model(args.tokens, cso)
+    papers = dict(enumerate(synthetic_papers(args.papers, cso)))
+
+    print('{:<10} {:>8} {:>8} {:>12}'.format('mode', 'workers', 'cache', 'papers / s'))
+    expected = None
+    for name, workers, cache_size in (('per-paper', 1, 0), ('per-paper', 1, 100000),
+                                      ('per-paper', args.workers, 100000), ('corpus', 1, 100000),
+                                      ('corpus', args.workers, 100000)):
+        # a new classifier for each run, so that no run benefits from the caches of the previous ones
+        with CSOClassifier(cso=cso, model=model, nlp=synthetic_nlp(), cache_size=cache_size) as classifier:
+            classifier.synt_module.get_index()
+            start = time.perf_counter()
+            if name == 'corpus':
+                result = classifier.classify_corpus(papers, workers=workers)
+            else:
+                result = classifier.classify_many(papers, workers=workers)
+            elapsed = time.perf_counter() - start
+        for paper_result in result.values():
+            # the union comes from a set, its order is arbitrary
+            paper_result['union'] = sorted(paper_result['union'])
+        if expected is None:
+            expected = result
+        assert result == expected, 'the {} mode with {} workers returned a different result'.format(name, workers)
+        print('{:<10} {:>8} {:>8} {:>12.1f}'.format(name, workers, cache_size, len(papers) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Cost of the semantic matching on papers made of multi-word noun phrases, with and without the merge index.
+
+Most bigrams and trigrams of such papers are not in the cached model, so their matches are the topics shared by their
+tokens. The baseline counts the topics of the lists of the tokens at each occurrence of the n-gram, as the semantic
+module did before the merge index. "pruned" merges the tokens of the model pruned for the threshold (see
+classifier.prunedmodel), which also spares the filtering of the matches. All run with the cache of the matches
+disabled, so that every n-gram is merged, and with it, as when a corpus repeats its n-grams. They must find the same
+topics.
+
+    python benchmarks/merge.py --papers 200
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model, synthetic_nlp, synthetic_ontology  # noqa: E402
+from classifier.cache import LRUCache  # noqa: E402
+from classifier.document import AnalyzedDocument  # noqa: E402
+from classifier.mergeindex import MergeIndex  # noqa: E402
+from classifier.semanticmodule import CSOClassifierSemantic  # noqa: E402
+
+
+class CountingMerge(MergeIndex):
+    """The merge of the semantic module before the merge index."""
+
+    def shared(self, tokens):
+        temp_list_of_matches = {}
+        list_of_merged_topics = {}
+        for token in tokens:
+            if token in self.model:
+                for topic_item in self.model[token]:
+                    temp_list_of_matches[topic_item["topic"]] = topic_item
+                    try:
+                        list_of_merged_topics[topic_item["topic"]] += 1
+                    except KeyError:
+                        list_of_merged_topics[topic_item["topic"]] = 1
+        return [temp_list_of_matches[topic] for topic, count in list_of_merged_topics.items() if count >= len(tokens)]
+
+
+def phrase_model(cso, size, shared=1000, seed=0):
+    """Function that returns a cached model whose words share the topics of the multi-word topics they are part of."""
+    rng = random.Random(seed)
+    model = synthetic_model(size, cso, seed)
+    topics = [topic for topic in cso['topics'] if ' ' in topic and all(word in model for word in topic.split())]
+    for topic in rng.sample(topics, min(shared, len(topics))):
+        for word in topic.split():
+            model[word].append({'topic': topic.replace(' ', '_'), 'sim_t': round(rng.uniform(0.9, 1), 4),
+                                'wet': word, 'sim_w': round(rng.uniform(0.6, 1), 4)})
+    return model, topics
+
+
+def phrase_papers(size, topics, seed=0, phrases=(20, 60)):
+    """Function that returns papers made of noun phrases of 2 or 3 words, which the tagger keeps as concepts."""
+    rng = random.Random(seed)
+    words = sorted({word for topic in topics for word in topic.split()})
+    papers = []
+    for _ in range(size):
+        paper = []
+        for _ in range(rng.randint(*phrases)):
+            if rng.random() < 0.5:
+                paper.append(rng.choice(topics))
+            else:
+                paper.append(' '.join(rng.choice(words) for _ in range(rng.randint(2, 3))))
+        papers.append(', '.join(paper))
+    return papers
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--tokens', type=int, default=50000, help='number of tokens of the synthetic model')
+    parser.add_argument('--papers', type=int, default=200, help='number of synthetic papers')
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    model, topics = phrase_model(cso, args.tokens)
+    nlp = synthetic_nlp()
+    module = CSOClassifierSemantic(model, cso, nlp=nlp)
+    concepts = [module.extract_concepts(AnalyzedDocument(paper, nlp)) for paper in phrase_papers(args.papers, topics)]
+
+    start = time.perf_counter()
+    module.get_pruned_model(module.min_similarity)
+    print('model pruned in {:.3f}s'.format(time.perf_counter() - start))
+    print('{:<10} {:>8} {:>12} {:>10}'.format('merge', 'cache', 'ms / paper', 'speedup'))
+
+    expected = before = None
+    for name, merge_index, prune_model in (('counting', CountingMerge(model), False),
+                                           ('index', MergeIndex(model), False), ('pruned', None, True)):
+        for cache_size in (0, 100000):
+            module.merge_index = merge_index
+            module.prune_model = prune_model
+            module.cache = LRUCache(cache_size)
+            start = time.perf_counter()
+            found = [module.classify_concepts(paper_concepts) for paper_concepts in concepts]
+            elapsed = (time.perf_counter() - start) / len(concepts)
+            if expected is None:
+                expected, before = found, elapsed
+            assert found == expected, 'the {} merge found different topics'.format(name)
+            print('{:<10} {:>8} {:>12.2f} {:>9.1f}x'.format(name, cache_size, elapsed * 1000, before / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Memory of the workers of the batch mode, with and without preload.
+
+Without preload, each worker loads its own copy of the ontology and the cached model. With preload, the classifier is
+loaded once in the parent and the workers are forked from it (see CSOClassifier.pool), sharing its pages through
+copy-on-write. Both variants load the same synthetic files, classify the same papers, and then each worker reports
+its memory from /proc/self/smaps_rollup: RSS counts the shared pages in full in every process, PSS divides them
+between the processes that share them, and private pages are those of the worker alone. Linux only.
+
+    python benchmarks/preload.py --workers 4
+    python benchmarks/preload.py --workers 4 --store
+
+The total PSS, over the workers and the parent, is the memory that the batch takes on the machine.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model, synthetic_nlp, synthetic_ontology, synthetic_papers  # noqa: E402
+from classifier import misc  # noqa: E402
+from classifier.classifier import CSOClassifier, _CLASSIFIERS  # noqa: E402
+from classifier.tokenstore import TokenStore, build_token_store  # noqa: E402
+
+# Set before the workers are forked: the barrier makes each of them report its memory exactly once, and the files
+# are those that the workers without preload load
+_BARRIER = None
+_FILES = None
+
+
+def load_classifier(files):
+    """Function that loads a classifier from the synthetic files, as a worker without preload does."""
+    cso_path, model_path = files
+    with open(cso_path, 'rb') as f:
+        cso = pickle.load(f)
+    if model_path.endswith('.bin'):
+        model = TokenStore(model_path)
+    else:
+        with open(model_path) as f:
+            model = json.load(f)
+    return CSOClassifier(modules='semantic', cso=cso, model=model, nlp=synthetic_nlp())
+
+
+def _load_worker():
+    _CLASSIFIERS['worker'] = load_classifier(_FILES)
+
+
+def _classify(key, papers):
+    return _CLASSIFIERS[key].classify_many(papers, workers=1)
+
+
+def memory():
+    """Function that returns the RSS, PSS and private memory of this process, in MB."""
+    with open('/proc/self/smaps_rollup') as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+    kb = {name: int(value.split()[0]) for name, value in fields.items() if value.strip().endswith('kB')}
+    return {'rss': kb['Rss'] / 1024, 'pss': kb['Pss'] / 1024,
+            'private': (kb['Private_Clean'] + kb['Private_Dirty']) / 1024}
+
+
+def _worker_memory(_):
+    # waits for all the workers, so that each of them answers once
+    _BARRIER.wait()
+    return memory()
+
+
+def run(preload, files, papers, workers):
+    """Function that classifies the papers on a pool of workers and returns the memory of each worker and of the
+    parent."""
+    global _BARRIER
+    context = multiprocessing.get_context('fork')
+    _BARRIER = context.Barrier(workers)
+    chunks = list(misc.chunks(papers, -(-len(papers) // (workers * 4))))
+    if preload:
+        with load_classifier(files) as classifier:
+            classifier.pool(workers).map(partial(_classify, id(classifier)), chunks)
+            return classifier.pool(workers).map(_worker_memory, range(workers), chunksize=1), memory()
+    gc.collect()
+    with context.Pool(workers, initializer=_load_worker) as pool:
+        pool.map(partial(_classify, 'worker'), chunks)
+        return pool.map(_worker_memory, range(workers), chunksize=1), memory()
+
+
+def main():
+    global _FILES
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--tokens', type=int, default=300000, help='number of tokens of the synthetic model')
+    parser.add_argument('--papers', type=int, default=400, help='number of synthetic papers')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--store', action='store_true', help='load the model as a token store instead of json')
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    papers = dict(enumerate(synthetic_papers(args.papers, cso)))
+    with tempfile.TemporaryDirectory() as tmp:
+        cso_path = os.path.join(tmp, 'cso.p')
+        with open(cso_path, 'wb') as f:
+            pickle.dump(cso, f)
+        model = synthetic_model(args.tokens, cso)
+        if args.store:
+            model_path = os.path.join(tmp, 'token-to-cso-combined.bin')
+            build_token_store(model, model_path)
+        else:
+            model_path = os.path.join(tmp, 'token-to-cso-combined.json')
+            with open(model_path, 'w') as f:
+                json.dump(model, f)
+        _FILES = cso_path, model_path
+        del cso, model
+        gc.collect()
+
+        print('{:<10} {:>10} {:>10} {:>14} {:>16}'.format('', 'RSS (MB)', 'PSS (MB)', 'private (MB)',
+                                                          'total PSS (MB)'))
+        for preload in (False, True):
+            workers, parent = run(preload, _FILES, papers, args.workers)
+            mean = {name: sum(worker[name] for worker in workers) / len(workers) for name in ('rss', 'pss', 'private')}
+            print('{:<10} {:>10.1f} {:>10.1f} {:>14.1f} {:>16.1f}'.format(
+                'preload' if preload else 'no preload', mean['rss'], mean['pss'], mean['private'],
+                sum(worker['pss'] for worker in workers) + parent['pss']))
+        print('means over the workers, except total PSS, which is the sum over the workers and the parent')
+
+
+if __name__ == '__main__':
+    main()
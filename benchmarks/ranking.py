@@ -0,0 +1,50 @@
+"""
+Cost of the ranking and selection of the semantic topics, paper by paper and for a batch of papers.
+
+CSOClassifierSemantic.classify_concepts ranks the topics of each paper with a dictionary per topic and selects them
+at the knee of their scores. classify_concepts_batch ranks the topics of all the papers together with numpy (see
+classifier.ranking) and finds the knees of all the papers together (see classifier.knee). The matches of the n-grams
+are cached by a first run, so that both measure the ranking and selection. They must find the same topics.
+
+    python benchmarks/ranking.py --papers 1000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model, synthetic_nlp, synthetic_ontology, synthetic_papers  # noqa: E402
+from classifier.document import analyze_texts  # noqa: E402
+from classifier.semanticmodule import CSOClassifierSemantic  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--tokens', type=int, default=50000, help='number of tokens of the synthetic model')
+    parser.add_argument('--papers', type=int, default=1000, help='number of synthetic papers')
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    model = synthetic_model(args.tokens, cso)
+    nlp = synthetic_nlp()
+    module = CSOClassifierSemantic(model, cso, cache_size=None, nlp=nlp)
+    batch = [module.extract_concepts(document) for document in analyze_texts(synthetic_papers(args.papers, cso), nlp)]
+    expected = [module.classify_concepts(concepts) for concepts in batch]
+
+    print('{:<10} {:>12} {:>10}'.format('ranking', 'ms / paper', 'speedup'))
+    before = None
+    for name, classify in (('per-paper', lambda: [module.classify_concepts(concepts) for concepts in batch]),
+                           ('batch', lambda: module.classify_concepts_batch(batch))):
+        start = time.perf_counter()
+        found = classify()
+        elapsed = (time.perf_counter() - start) / len(batch)
+        before = before or elapsed
+        assert found == expected, 'the {} ranking found different topics'.format(name)
+        print('{:<10} {:>12.3f} {:>9.1f}x'.format(name, elapsed * 1000, before / elapsed))
+
+
+if __name__ == '__main__':
+    main()
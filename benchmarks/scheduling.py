@@ -0,0 +1,68 @@
+"""
+Load balance of the workers of the batch mode, with papers of very different lengths.
+
+The papers used to be split by count into one chunk per worker (misc.chunks); CSOClassifier.classify_many now packs
+them into units of about the same estimated cost, handed out to the workers as they become free (see
+classifier.scheduler). Both schedules run on the same synthetic ontology, cached model and papers, whose lengths
+follow a Pareto distribution, and the utilization of each worker is reported.
+
+    python benchmarks/scheduling.py --papers 2000 --workers 4
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model, synthetic_nlp, synthetic_ontology, synthetic_papers  # noqa: E402
+from classifier import misc, scheduler  # noqa: E402
+from classifier.classifier import CSOClassifier, _classify_unit  # noqa: E402
+
+
+def skewed_papers(size, cso, seed=0):
+    """Function that returns synthetic papers whose lengths follow a Pareto distribution, from 20 words."""
+    rng = random.Random(seed)
+    return [synthetic_papers(1, cso, seed=seed * size + i, words=(length, length))[0]
+            for i, length in enumerate(min(5000, int(20 * rng.paretovariate(1.2))) for _ in range(size))]
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--tokens', type=int, default=50000, help='number of tokens of the synthetic model')
+    parser.add_argument('--papers', type=int, default=1000, help='number of synthetic papers')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    model = synthetic_model(args.tokens, cso)
+    papers = dict(enumerate(skewed_papers(args.papers, cso)))
+
+    with CSOClassifier(modules='semantic', cso=cso, model=model, nlp=synthetic_nlp(), cache_size=0) as classifier:
+        pool = classifier.pool(args.workers)
+        # warms up the workers, so that neither schedule pays for it
+        classifier.classify_many(dict(list(papers.items())[:args.workers * 20]), workers=args.workers)
+
+        # by count, one chunk per worker, as before
+        chunk_size = math.ceil(len(papers) / args.workers)
+        units = [(sum(map(scheduler.paper_cost, chunk.values())), chunk) for chunk in misc.chunks(papers, chunk_size)]
+        utilization = scheduler.Utilization()
+        start = time.perf_counter()
+        for _, stats in pool.map(partial(_classify_unit, id(classifier), modules='semantic', enhancement='first'),
+                                 units):
+            utilization.add(stats)
+        print('by count: {:.1f} papers / s'.format(len(papers) / (time.perf_counter() - start)))
+        print(utilization.finish().report())
+
+        start = time.perf_counter()
+        classifier.classify_many(papers, workers=args.workers)
+        print('\nby cost: {:.1f} papers / s'.format(len(papers) / (time.perf_counter() - start)))
+        print(classifier.utilization.report())
+
+
+if __name__ == '__main__':
+    main()
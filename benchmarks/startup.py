@@ -0,0 +1,84 @@
+"""
+Compare startup time and resident memory of the ways of loading the ontology and the cached model.
+
+Each variant runs in a fresh interpreter, loads its files and looks up a sample of grams, then reports the load time,
+the lookup time and the resident memory of the process. By default it uses the files in classifier/models; pass --synthetic
+to generate a cached model of the given number of tokens in a temporary directory instead.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --synthetic 300000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import synthetic_model  # noqa: E402
+
+VARIANT = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+if {variant!r} == 'json':
+    with open({json_path!r}) as f:
+        model = json.load(f)
+else:
+    from classifier.tokenstore import TokenStore
+    model = TokenStore({store_path!r})
+loaded = time.perf_counter()
+grams = {grams!r}
+found = sum(1 for gram in grams if gram in model and model[gram] is not None)
+done = time.perf_counter()
+# Private (anonymous) and file-backed RSS of this interpreter. ru_maxrss would include the parent's peak, which
+# survives fork and exec. File-backed pages are clean page cache shared with every other process mapping the file.
+with open('/proc/self/status') as f:
+    status = dict(line.split(':', 1) for line in f)
+rss = {{name: int(status[name].split()[0]) / 1024 for name in ('RssAnon', 'RssFile')}}
+print(json.dumps({{'load': loaded - start, 'lookup': done - loaded, 'found': found, 'rss': rss}}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--synthetic', type=int, help='number of tokens of a synthetic cached model')
+    parser.add_argument('--lookups', type=int, default=500, help='number of grams looked up after loading')
+    args = parser.parse_args()
+
+    root = str(Path(__file__).resolve().parents[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        from classifier.tokenstore import build_token_store
+        if args.synthetic:
+            json_path = os.path.join(tmp, 'token-to-cso-combined.json')
+            store_path = os.path.join(tmp, 'token-to-cso-combined.bin')
+            model = synthetic_model(args.synthetic)
+            with open(json_path, 'w') as f:
+                json.dump(model, f)
+            build_token_store(model, store_path)
+        else:
+            from classifier import misc
+            misc.check_cached_model_store()
+            json_path, store_path = misc.CACHED_MODEL, misc.CACHED_MODEL_STORE
+            with open(json_path) as f:
+                model = json.load(f)
+        grams = random.sample(list(model), min(args.lookups, len(model)))
+        grams += ['missing_{}'.format(i) for i in range(args.lookups // 5)]
+        del model
+
+        print('{:<6} {:>10} {:>10} {:>14} {:>14}'.format('', 'load (s)', 'lookup (s)', 'private (MB)',
+                                                        'mapped (MB)'))
+        for variant in ('json', 'store'):
+            code = VARIANT.format(root=root, variant=variant, json_path=json_path, store_path=store_path, grams=grams)
+            result = json.loads(subprocess.check_output([sys.executable, '-c', code]))
+            print('{:<6} {:>10.3f} {:>10.4f} {:>14.1f} {:>14.1f}'.format(variant, result['load'], result['lookup'],
+                                                                        result['rss']['RssAnon'],
+                                                                        result['rss']['RssFile']))
+
+
+if __name__ == '__main__':
+    main()
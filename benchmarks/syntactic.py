@@ -0,0 +1,95 @@
+"""
+Per-paper cost of the syntactic matching, before and after the syntactic index and its fuzzy matcher.
+
+The baseline is the former CSOClassifierSyntactic.statistic_similarity, which rebuilt the topic stems for every paper
+and compared each n-gram with every topic sharing its first 4 characters. "indexed" compares each n-gram with the
+topics of compatible length only, "fuzzy" uses the BK-trees of the index, and "exact" also finds the n-grams that are
+exactly a topic with the Aho-Corasick automaton of the index, so that they skip the fuzzy matching. "cached" adds the
+cache of the matches across papers, as when a corpus repeats its n-grams. All versions run on the same synthetic
+ontology and papers, and must find the same topics.
+
+    python benchmarks/syntactic.py --papers 200
+"""
+import argparse
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import Levenshtein.StringMatcher as ls  # noqa: E402
+from nltk import ngrams  # noqa: E402
+from nltk.tokenize import word_tokenize  # noqa: E402
+
+from benchmarks.synthetic import synthetic_ontology, synthetic_papers  # noqa: E402
+from classifier.cache import LRUCache  # noqa: E402
+from classifier.syntacticmodule import CSOClassifierSyntactic  # noqa: E402
+
+
+def baseline_similarity(cso, paper, min_similarity):
+    found_topics = defaultdict(list)
+    matches = set()
+    tokens = word_tokenize(paper, preserve_line=True)
+    topic_stems = defaultdict(list)
+    for k in cso['topics'].keys():
+        topic_stems[k[:4]].append(k)
+    for n in range(3, 0, -1):
+        for i, grams in enumerate(ngrams(tokens, n)):
+            if i in matches:
+                continue
+            gram = " ".join(grams)
+            for topic in topic_stems[gram[:4]]:
+                m = ls.StringMatcher(None, topic, gram).ratio()
+                if m >= min_similarity:
+                    topic = cso['primary_labels'].get(topic, topic)
+                    found_topics[topic].append({'matched': gram, 'similarity': m})
+                    matches.add(i)
+    return found_topics
+
+
+def timed(function, papers):
+    start = time.perf_counter()
+    results = [set(function(paper)) for paper in papers]
+    return (time.perf_counter() - start) / len(papers), results
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('--topics', type=int, default=15000, help='number of topics of the synthetic ontology')
+    parser.add_argument('--papers', type=int, default=100, help='number of synthetic papers')
+    parser.add_argument('--min-similarity', type=float, default=0.94)
+    args = parser.parse_args()
+
+    cso = synthetic_ontology(args.topics)
+    papers = synthetic_papers(args.papers, cso)
+    module = CSOClassifierSyntactic(cso)
+    start = time.perf_counter()
+    module.get_index()
+    print('index built in {:.3f}s'.format(time.perf_counter() - start))
+
+    before, expected = timed(lambda paper: baseline_similarity(cso, paper, args.min_similarity), papers)
+    print('{:<10} {:>12} {:>10} {:>14} {:>14}'.format('', 'ms / paper', 'speedup', 'exact n-grams',
+                                                      'cached n-grams'))
+    print('{:<10} {:>12.2f} {:>9.1f}x'.format('baseline', before * 1000, 1))
+    for name, fuzzy_index, exact_matching, cache_size in (('indexed', False, False, 0), ('fuzzy', True, False, 0),
+                                                          ('exact', True, True, 0), ('cached', True, True, None)):
+        module.fuzzy_index = fuzzy_index
+        module.exact_matching = exact_matching
+        module.cache = LRUCache(cache_size)
+        stats = Counter()
+
+        def similarity(paper):
+            found_topics = module.statistic_similarity(paper, args.min_similarity)
+            stats.update(module.stats)
+            return found_topics
+
+        after, found = timed(similarity, papers)
+        assert found == expected, 'the {} matching found different topics'.format(name)
+        print('{:<10} {:>12.2f} {:>9.1f}x {:>13.1f}% {:>13.1f}%'.format(
+            name, after * 1000, before / after, 100 * stats['exact'] / stats['grams'],
+            100 * stats['cached'] / stats['grams']))
+
+
+if __name__ == '__main__':
+    main()
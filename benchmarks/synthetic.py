@@ -0,0 +1,83 @@
+"""Synthetic ontology, cached model and papers for the benchmarks, with roughly the shape of the real ones."""
+import random
+
+import spacy
+from spacy.language import Language
+
+WORDS = ['data', 'network', 'neural', 'learning', 'computer', 'computing', 'system', 'graph', 'quantum', 'security',
+         'image', 'vision', 'language', 'model', 'sensor', 'wireless', 'mining', 'cloud', 'robot', 'logic', 'query',
+         'distributed', 'parallel', 'compiler', 'database', 'software', 'semantic', 'web', 'signal', 'control']
+SUFFIXES = ['', 's', 'ing', 'ed', 'al', 'ic', 'ation', 'er']
+
+
+def word(rng):
+    return rng.choice(WORDS) + rng.choice(SUFFIXES)
+
+
+def synthetic_ontology(size=15000, seed=0):
+    """Function that returns a random ontology with the structure of misc.load_cso(), as an acyclic graph."""
+    rng = random.Random(seed)
+    topics = {}
+    while len(topics) < size:
+        topics[' '.join(word(rng) for _ in range(rng.choice([1, 2, 2, 2, 3, 3])))] = True
+    labels = list(topics)
+    broaders, narrowers, same_as, primary_labels, topics_wu, primary_labels_wu = {}, {}, {}, {}, {}, {}
+    for i, topic in enumerate(labels[1:], 1):
+        # broader topics are always older, so there are no cycles
+        for broader in rng.sample(labels[:i], min(i, rng.choice([1, 1, 1, 2, 3]))):
+            broaders.setdefault(topic, []).append(broader)
+            narrowers.setdefault(broader, []).append(topic)
+    for topic in labels:
+        topics_wu[topic.replace(' ', '_')] = topic
+    for topic in rng.sample(labels, size // 10):
+        primary = rng.choice(labels)
+        same_as.setdefault(primary, []).append(topic)
+        primary_labels[topic] = primary
+        primary_labels_wu[topic.replace(' ', '_')] = primary.replace(' ', '_')
+    return {'topics': topics, 'broaders': broaders, 'narrowers': narrowers, 'same_as': same_as,
+            'primary_labels': primary_labels, 'topics_wu': topics_wu, 'primary_labels_wu': primary_labels_wu}
+
+
+def synthetic_model(size=300000, cso=None, seed=0):
+    """Function that returns a random cached model, i.e., token -> list of {"topic", "sim_t", "wet", "sim_w"}."""
+    rng = random.Random(seed)
+    topics = list(cso['topics_wu']) if cso else ['topic_{}'.format(i) for i in range(15000)]
+    model = {}
+    tokens = ['{}{}'.format(w, s) for w in WORDS for s in SUFFIXES] + ['token_{}'.format(i) for i in range(size)]
+    for token in tokens[:size]:
+        model[token] = [{'topic': rng.choice(topics), 'sim_t': round(rng.uniform(0.8, 1), 4),
+                         'wet': rng.choice(topics), 'sim_w': round(rng.uniform(0.6, 1), 4)}
+                        for _ in range(rng.randint(1, 10))]
+    return model
+
+
+def synthetic_papers(size=200, cso=None, seed=0, words=(50, 250)):
+    """Function that returns random paper texts (lowercase, stop words removed), mixing topics and plain words."""
+    rng = random.Random(seed)
+    labels = list(cso['topics']) if cso else []
+    papers = []
+    for _ in range(size):
+        tokens = []
+        length = rng.randint(*words)
+        while len(tokens) < length:
+            if labels and rng.random() < 0.2:
+                tokens.extend(rng.choice(labels).split())
+            else:
+                tokens.append(word(rng) if rng.random() < 0.6 else 'w{}'.format(rng.randrange(5000)))
+        papers.append(' '.join(tokens))
+    return papers
+
+
+@Language.component('synthetic_noun_tagger')
+def synthetic_noun_tagger(doc):
+    """Tags alphabetic tokens as nouns, so that every run of words is a concept for the semantic module."""
+    for token in doc:
+        token.tag_ = 'NN' if token.is_alpha else ''
+    return doc
+
+
+def synthetic_nlp():
+    """Function that returns a spaCy pipeline for the synthetic papers, which does not need a trained model."""
+    nlp = spacy.blank('en')
+    nlp.add_pipe('synthetic_noun_tagger')
+    return nlp
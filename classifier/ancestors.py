@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index of the broader topics of the ontology, used to enhance the topics of a paper.
+
+misc.climb_ontology(cso, topics, 'all') used to call get_broader_of_topics until no new broader topic was found: each
+call scanned the topics of the paper and every broader topic found so far, checked the narrower topics of each one
+with list lookups, and the loop compared copies of the result at each round. The broader topics are found in the
+order of a breadth-first search from the topics of the paper, and each list of narrower topics in the order its
+topics are first scanned, which is the same search. The ancestor index numbers the topics once per ontology, holds the
+direct broaders of each topic as a tuple of integers and the set of all its ancestors, so that the search visits each
+relationship of the paper's closure once, on integers, and the primary labels are resolved when the index is built.
+
+misc.get_network and misc.get_coverage used to search the broader topics of each topic of a paper along every path,
+with no memory of the topics already visited, to fill a square matrix. The network links each topic to its found
+ancestors at the longest distance, the last one the search wrote, and the coverage of a topic counts the found topics
+it is an ancestor of. The index answers both from the ancestor sets and from the longest distance of each topic to
+each of its ancestors, which is computed once per topic from those of its broaders.
+
+climb_batch enhances the topics of many papers at once: the papers' topics are a sparse paper x topic matrix, the
+search advances one level of broader topics for all the papers at a time with numpy, and the matched counts are the
+product of the matrix of the topics scanned by the sparse matrix of the broader relationships.
+"""
+
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+
+# Index of the last ontology in this process, by id of the ontology it was built from
+_INDEXES = {}
+
+
+class AncestorIndex:
+    """The broader topics of each topic of the ontology, as integers."""
+
+    def __init__(self, topics, broaders, primary_labels):
+        """Function that initialises the index. Use build() or for_ontology() to create one.
+
+        Args:
+            topics (list): the topics having or being broader topics, by id.
+            broaders (list): for each topic, the tuple of the ids of its direct broader topics, in the order of the
+            ontology and without repetitions.
+            primary_labels (list): for each topic, its primary label.
+        """
+        self.topics = topics
+        self.ids = {topic: i for i, topic in enumerate(topics)}
+        self.broaders = broaders
+        self.primary_labels = primary_labels
+        self.ancestors = _ancestor_sets(broaders)
+        # longest distance to each ancestor, by topic, computed when first needed, see longest_distances
+        self.distances = [None] * len(topics)
+        self._broader_matrix = None
+
+    @classmethod
+    def build(cls, cso):
+        """Function that builds the index of an ontology.
+
+        Args:
+            cso (dictionary): the ontology.
+
+        Returns:
+            index (AncestorIndex): the index.
+        """
+
+        ids = {}
+        edges = []
+        for topic, broaders in cso['broaders'].items():
+            edges.append((ids.setdefault(topic, len(ids)), [ids.setdefault(broader, len(ids)) for broader in broaders]))
+        broaders = [()] * len(ids)
+        for i, broader_ids in edges:
+            broaders[i] = tuple(dict.fromkeys(broader_ids))
+        primary_labels = cso['primary_labels']
+        topics = list(ids)
+        return cls(topics, broaders, [primary_labels.get(topic, topic) for topic in topics])
+
+    @classmethod
+    def for_ontology(cls, cso):
+        """Function that returns the index of an ontology, building it only if it is not the last ontology indexed.
+
+        Args:
+            cso (dictionary): the ontology.
+
+        Returns:
+            index (AncestorIndex): the index.
+        """
+
+        if id(cso) in _INDEXES and _INDEXES[id(cso)][0] is cso:
+            return _INDEXES[id(cso)][1]
+        index = cls.build(cso)
+        # only the index of the last ontology is kept, so that the previous ones can be freed
+        _INDEXES.clear()
+        _INDEXES[id(cso)] = (cso, index)
+        return index
+
+    def closure(self, topics):
+        """Function that returns all the ancestors of some topics.
+
+        Args:
+            topics (iterable): the topics.
+
+        Returns:
+            ancestors (set): the ids of the ancestors of the topics.
+        """
+        ids = [self.ids[topic] for topic in topics if topic in self.ids]
+        return set().union(*(self.ancestors[i] for i in ids))
+
+    def climb(self, found_topics, climb_ont):
+        """Function that climbs the ontology from some topics, as misc.climb_ontology does.
+
+        Args:
+            found_topics (iterable): the topics found in a paper.
+            climb_ont (string): "first" for their direct broader topics, "all" for all their ancestors.
+
+        Returns:
+            inferred_topics (dictionary): primary label of each broader topic -> list of {'matched', 'broader of'},
+            one per broader topic having this primary label.
+        """
+
+        # topics scanned in order: the topics found, then the broader topics in the order they are found
+        order = list(dict.fromkeys(self.ids[topic] for topic in found_topics if topic in self.ids))
+        scanned = set(order)
+        climb_all = climb_ont == 'all'
+        narrowers = {}  # broader id -> ids of its narrower topics, in the order they were scanned
+        broaders = self.broaders
+        for i in order:
+            for broader in broaders[i]:
+                narrower = narrowers.get(broader)
+                if narrower is None:
+                    narrowers[broader] = [i]
+                    if climb_all and broader not in scanned:
+                        scanned.add(broader)
+                        order.append(broader)
+                else:
+                    narrower.append(i)
+
+        inferred_topics = {}
+        topics, primary_labels = self.topics, self.primary_labels
+        for broader, narrower in narrowers.items():
+            match = {'matched': len(narrower), 'broader of': [topics[i] for i in narrower]}
+            label = primary_labels[broader]
+            if label in inferred_topics:
+                inferred_topics[label].append(match)
+            else:
+                inferred_topics[label] = [match]
+        return inferred_topics
+
+    def broader_matrix(self):
+        """Function that returns the topic x topic sparse matrix of the direct broader relationships, built once.
+        The broaders of each row are in the order of the ontology."""
+
+        if self._broader_matrix is None:
+            size = len(self.topics)
+            indptr = np.zeros(size + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(broaders) for broaders in self.broaders])
+            indices = np.fromiter(chain.from_iterable(self.broaders), dtype=np.int64, count=indptr[-1])
+            self._broader_matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr),
+                                                     shape=(size, size))
+        return self._broader_matrix
+
+    def climb_batch(self, topic_lists, climb_ont):
+        """Function that climbs the ontology from the topics of many papers at once.
+
+        Args:
+            topic_lists (list): the topics found in each paper.
+            climb_ont (string): "first" for their direct broader topics, "all" for all their ancestors.
+
+        Returns:
+            inferred_topics (list): for each paper, primary label of each broader topic -> list of the 'matched'
+            counts of the broader topics having this primary label. They are those of climb(), in the same order.
+        """
+
+        size = len(self.topics)
+        found, keys = self._climb_codes(topic_lists, climb_ont)
+        scanned = found if climb_ont == 'first' else np.concatenate([found, keys[~_contains(np.sort(found), keys)]])
+        scanned = sparse.csr_matrix((np.ones(len(scanned), dtype=np.int64), (scanned // size, scanned % size)),
+                                    shape=(len(topic_lists), size))
+        matched = scanned.dot(self.broader_matrix()).tocsr()
+        matched.sort_indices()
+        # the broaders of the topics scanned are the broader topics found: the non-zero counts, by paper and topic
+        rows = np.repeat(np.arange(len(topic_lists), dtype=np.int64), np.diff(matched.indptr))
+        counts = matched.data[np.searchsorted(rows * size + matched.indices, keys)].tolist()
+
+        inferred_topics = []
+        for labels, start, end in self._paper_labels(keys, len(topic_lists)):
+            inferred = {}
+            for label, count in zip(labels, counts[start:end]):
+                if label in inferred:
+                    inferred[label].append(count)
+                else:
+                    inferred[label] = [count]
+            inferred_topics.append(inferred)
+        return inferred_topics
+
+    def broader_topics_batch(self, topic_lists, climb_ont):
+        """Function that returns the primary labels of the broader topics of the topics of many papers, i.e., the keys
+        of climb_batch(), without counting the matches.
+
+        Args:
+            topic_lists (list): the topics found in each paper.
+            climb_ont (string): "first" for their direct broader topics, "all" for all their ancestors.
+
+        Returns:
+            broader_topics (list): for each paper, the list of the primary labels, in the order of climb().
+        """
+
+        _, keys = self._climb_codes(topic_lists, climb_ont)
+        return [list(dict.fromkeys(labels)) for labels, _, _ in self._paper_labels(keys, len(topic_lists))]
+
+    def _climb_codes(self, topic_lists, climb_ont):
+        """Function that returns the topics of the papers and their broader topics, in the order of climb(), as
+        (paper * number of topics + topic id) codes."""
+
+        size = len(self.topics)
+        broaders = self.broader_matrix()
+        indptr, indices = broaders.indptr, broaders.indices
+
+        # the topics of each paper are scanned first, in order
+        found = [paper * size + self.ids[topic] for paper, topics in enumerate(topic_lists)
+                 for topic in topics if topic in self.ids]
+        found = np.array(list(dict.fromkeys(found)), dtype=np.int64)
+        found_sorted = np.sort(found)
+        frontier = found
+        levels = []  # codes of the broader topics found at each level, in the order they are found
+        known = np.zeros(0, dtype=np.int64)
+        while len(frontier):
+            # the broaders of the frontier, by paper, then scanning order, then order of the ontology
+            papers, topics = frontier // size, frontier % size
+            starts = indptr[topics]
+            degrees = indptr[topics + 1] - starts
+            positions = np.repeat(starts - np.cumsum(degrees) + degrees, degrees) + np.arange(degrees.sum())
+            codes = np.repeat(papers, degrees) * size + indices[positions]
+            # the first occurrence of each broader topic of each paper, not found at a previous level
+            order = np.argsort(codes, kind='stable')
+            ordered = codes[order]
+            first = np.ones(len(codes), dtype=bool)
+            first[1:] = ordered[1:] != ordered[:-1]
+            first &= ~_contains(known, ordered)
+            codes = codes[np.sort(order[first])]
+            levels.append(codes)
+            known = np.sort(np.concatenate([known, codes]))
+            if climb_ont == 'first':
+                break
+            # the topics of the papers were already scanned
+            frontier = codes[~_contains(found_sorted, codes)]
+
+        keys = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+        return found, keys[np.argsort(keys // size, kind='stable')]
+
+    def _paper_labels(self, keys, papers):
+        """Function that yields the primary labels of the broader topics of each paper, with their range in keys."""
+        size = len(self.topics)
+        labels = [self.primary_labels[topic] for topic in (keys % size).tolist()]
+        start = 0
+        for end in np.cumsum(np.bincount(keys // size, minlength=papers)).tolist():
+            yield labels[start:end], start, end
+            start = end
+
+    def longest_distances(self, i):
+        """Function that returns the number of relationships of the longest path from a topic to each of its ancestors.
+
+        Args:
+            i (integer): the id of the topic.
+
+        Returns:
+            distances (dictionary): id of each ancestor -> longest distance.
+
+        Raises:
+            ValueError: if the broader relationships above the topic have a cycle, where no path is the longest.
+        """
+
+        if self.distances[i] is not None:
+            return self.distances[i]
+        # depth-first, so that the distances of the broaders of a topic are known before its own
+        stack = [i]
+        visiting = set()
+        while stack:
+            topic = stack[-1]
+            if self.distances[topic] is not None:
+                stack.pop()
+                continue
+            pending = [broader for broader in self.broaders[topic] if self.distances[broader] is None]
+            if pending and topic not in visiting:
+                visiting.add(topic)
+                for broader in pending:
+                    if broader in visiting:
+                        raise ValueError('the broader topics of {!r} form a cycle'.format(self.topics[i]))
+                stack.extend(pending)
+                continue
+            stack.pop()
+            visiting.discard(topic)
+            distances = {}
+            for broader in self.broaders[topic]:
+                distances.setdefault(broader, 1)
+                for ancestor, distance in self.distances[broader].items():
+                    if distances.get(ancestor, 0) <= distance:
+                        distances[ancestor] = distance + 1
+            self.distances[topic] = distances
+        return self.distances[i]
+
+    def network(self, topics):
+        """Function that links topics to their nearest ancestors among them, as misc.get_network does.
+
+        Args:
+            topics (list): the topics, all in the ontology.
+
+        Returns:
+            network (dictionary): {"nodes": nodes, "edges": edges}.
+        """
+
+        nodes = [{"id": "paper", "label": "paper"}]
+        nodes.extend({"id": "topic" + str(t_id), "label": topic} for t_id, topic in enumerate(topics))
+        # a topic listed twice is only looked up, and only linked to, at its last position
+        last = {topic: t_id for t_id, topic in enumerate(topics)}
+        columns = [(self.ids[topic], t_id) for topic, t_id in last.items() if topic in self.ids]
+        nearest = {}
+        for topic in last:
+            distances = self.longest_distances(self.ids[topic]) if topic in self.ids else {}
+            found = [(distances[i], t_id) for i, t_id in columns if i in distances]
+            if found:
+                nearest_min = min(distance for distance, _ in found)
+                kind = "hard" if nearest_min == 1 else "soft"
+                nearest[topic] = (kind, sorted(t_id for distance, t_id in found if distance == nearest_min))
+
+        edges = []
+        for topic in topics:
+            if topic in nearest:
+                kind, targets = nearest[topic]
+                edges.extend({"id": "edge", "source": topic, "target": topics[t_id], "kind": kind}
+                             for t_id in targets)
+            else:
+                edges.append({"id": "edge", "source": topic, "target": "paper", "kind": "conn"})
+        return {"nodes": nodes, "edges": edges}
+
+    def coverage(self, topics):
+        """Function that returns, for each topic, the share of the topics it is or is an ancestor of, as
+        misc.get_coverage does.
+
+        Args:
+            topics (list): the topics, all in the ontology.
+
+        Returns:
+            coverage (dictionary): topic -> coverage, rounded to 3 decimals.
+        """
+
+        ids = {self.ids[topic]: topic for topic in topics if topic in self.ids}
+        counts = dict.fromkeys(topics, 1)
+        for i, topic in ids.items():
+            for ancestor in self.ancestors[i].intersection(ids):
+                if ids[ancestor] != topic:
+                    counts[ids[ancestor]] += 1
+        # the ratios are rounded as numpy rounds them
+        return {topic: round(np.float64(count / len(topics)), 3) for topic, count in counts.items()}
+
+
+def _contains(sorted_codes, codes):
+    """Function that returns whether each code is in an array of sorted codes."""
+    positions = np.minimum(np.searchsorted(sorted_codes, codes), max(len(sorted_codes) - 1, 0))
+    return sorted_codes[positions] == codes if len(sorted_codes) else np.zeros(len(codes), dtype=bool)
+
+
+def _ancestor_sets(broaders):
+    """Function that returns the set of the ids of all the ancestors of each topic. The sets of the topics outside
+    of cycles are unions of the sets of their broaders, computed in topological order."""
+
+    narrowers = [[] for _ in broaders]
+    pending = [len(ids) for ids in broaders]
+    for i, ids in enumerate(broaders):
+        for broader in ids:
+            narrowers[broader].append(i)
+    ancestors = [None] * len(broaders)
+    ready = [i for i, count in enumerate(pending) if count == 0]
+    while ready:
+        i = ready.pop()
+        ancestors[i] = frozenset(broaders[i]).union(*(ancestors[broader] for broader in broaders[i]))
+        for narrower in narrowers[i]:
+            pending[narrower] -= 1
+            if pending[narrower] == 0:
+                ready.append(narrower)
+
+    # the topics in or below a cycle of broader relationships: search their ancestors one by one
+    for i in range(len(broaders)):
+        if ancestors[i] is None:
+            found = set()
+            stack = list(broaders[i])
+            while stack:
+                broader = stack.pop()
+                if broader not in found:
+                    found.add(broader)
+                    stack.extend(broaders[broader])
+            ancestors[i] = frozenset(found)
+    return ancestors
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick automaton over sequences of words.
+
+The automaton is built from phrases, i.e., tuples of words, and finds every occurrence of all of them in a list of
+tokens in a single pass over it. The syntactic index uses it to find the n-grams of a paper that are exactly a topic
+of the ontology, which then skip the fuzzy matching.
+"""
+
+from collections import deque
+
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton whose alphabet is the set of words of the phrases."""
+
+    def __init__(self, phrases):
+        """Function that builds the automaton.
+
+        Args:
+            phrases (iterable): (words, value) tuples, where words is a tuple of strings. The value is returned with
+            each occurrence of the phrase.
+        """
+        # state 0 is the root. For each state: transitions by word, failure link, and outputs as (length, value)
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+        for words, value in phrases:
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                following = self.goto[state].get(word)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][word] = following
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = following
+            self.outputs[state].append((len(words), value))
+
+        # failure links, breadth first so that the link of a state is set before its children's
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(word, 0)
+                # outputs of the longest proper suffix that is also a phrase
+                self.outputs[following] = self.outputs[following] + self.outputs[self.fail[following]]
+
+    def find(self, tokens):
+        """Function that finds the phrases occurring in a list of tokens.
+
+        Args:
+            tokens (list): the tokens.
+
+        Returns:
+            occurrences (list): (start, length, value) tuples, where start is the position of the first token of the
+            occurrence and length its number of tokens.
+        """
+
+        occurrences = []
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, value in outputs[state]:
+                occurrences.append((position - length + 1, length, value))
+        return occurrences
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Size-bounded memo of the n-gram matches, shared by the papers classified by the same modules.
+
+The same n-grams recur across the papers of a corpus, and their matches only depend on the n-gram and on the
+thresholds in use. The syntactic and semantic modules keep them in an LRUCache, keyed by the n-gram and the
+thresholds, and evict the least recently used ones once the cache is full. The cache counts its hits, misses and
+evictions, to tune its size.
+"""
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A mapping of bounded size that evicts the least recently used entries."""
+
+    def __init__(self, maxsize=100000):
+        """Function that initialises the cache.
+
+        Args:
+            maxsize (integer): maximum number of entries. With None, the cache is not bounded, with 0 it is disabled.
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Function that returns the entry of a key, or default if there is none, and counts a hit or a miss."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Function that stores an entry, evicting the least recently used ones if the cache is full."""
+        if self.maxsize == 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Function that removes every entry and resets the statistics."""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Function that returns the statistics of the cache.
+
+        Returns:
+            stats (dictionary): hits, misses, evictions, current size and maximum size.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries),
+                'maxsize': self.maxsize}
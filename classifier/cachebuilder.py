@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension of the cached model (token-to-cso-combined.json) with the n-grams of a corpus that it misses.
+
+The semantic modules can count the n-grams of the papers that are not in the cached model, see
+CSOClassifierSemantic.top_misses and cset.semantic.MISSES, and write_misses saves the most frequent ones. This
+module computes their entries offline, as the cached model was built: for each n-gram of the vocabulary of the word2vec
+model (model.p), the topics matching the n-gram and its most similar words (see classifier.embeddings). The n-grams
+are split among worker processes, and the entries are merged with the cached model into a new version of it,
+token-to-cso-combined-v<N>.json, which misc loads instead of the previous one. N-grams already computed in the overlay
+of the fallback are taken from it. N-grams that the word2vec model does not contain are left out, so that the semantic
+modules keep merging the topics of their tokens.
+
+    python -m classifier.cachebuilder misses.tsv --workers 4
+"""
+
+import argparse
+import json
+import math
+import os
+from multiprocessing import Pool, get_all_start_methods, get_context
+
+from classifier import misc
+from classifier.embeddings import EmbeddingFallback, EmbeddingIndex
+
+# fallback used by the workers, set before they are forked, or by their initializer
+_FALLBACK = None
+
+
+def write_misses(misses, path, top=None):
+    """Function that writes the most frequent n-grams missing from the cached model, one per line with its count.
+
+    Args:
+        misses (Counter): occurrences of the n-grams missing from the cached model, joined by '_'.
+        path (string): destination file.
+        top (integer): how many n-grams to write. None writes all of them.
+    """
+
+    with open(path, 'w') as f:
+        for gram, count in misses.most_common(top):
+            f.write('{}\t{}\n'.format(gram, count))
+
+
+def read_misses(path):
+    """Function that reads the n-grams written by write_misses.
+
+    Args:
+        path (string): file written by write_misses.
+
+    Returns:
+        grams (list): the n-grams, by decreasing number of occurrences.
+    """
+
+    with open(path) as f:
+        return [line.rstrip('\n').split('\t')[0] for line in f if line.strip()]
+
+
+def build_entries(grams, fallback, workers=1):
+    """Function that computes the entries of n-grams, as the cached model holds them.
+
+    Args:
+        grams (list): the n-grams, joined by '_'.
+        fallback (EmbeddingFallback): the cached model extended with the word2vec model.
+        workers (integer): number of processes computing the entries.
+
+    Returns:
+        entries (dictionary): n-gram -> list of {"topic", "sim_t", "wet", "sim_w"}, for the n-grams of the word2vec
+        model that are not in the cached model.
+    """
+
+    grams = [gram for gram in dict.fromkeys(grams) if gram not in fallback.model and gram in fallback.index]
+    known = {gram: fallback.overlay[gram] for gram in grams if gram in fallback.overlay}
+    grams = [gram for gram in grams if gram not in known]
+    if workers == 1 or len(grams) <= 1:
+        return dict(known, **_build_chunk(grams, fallback))
+
+    chunk_size = math.ceil(len(grams) / (workers * 4))
+    chunks = [grams[i:i + chunk_size] for i in range(0, len(grams), chunk_size)]
+    _set_fallback(fallback)
+    try:
+        if "fork" in get_all_start_methods():
+            # the workers are forked, so that they share the vectors and the ontology
+            pool = get_context("fork").Pool(workers)
+        else:
+            # elsewhere, each worker receives its own copy of them
+            pool = Pool(workers, initializer=_set_fallback, initargs=(fallback,))
+        with pool:
+            for entries in pool.map(_build_chunk, chunks):
+                known.update(entries)
+    finally:
+        _set_fallback(None)
+    return known
+
+
+def _set_fallback(fallback):
+    """Function that sets the fallback used by the workers."""
+    global _FALLBACK
+    _FALLBACK = fallback
+
+
+def _build_chunk(grams, fallback=None):
+    """Function that computes the entries of a chunk of n-grams, in a worker if fallback is None."""
+    fallback = _FALLBACK if fallback is None else fallback
+    worker = EmbeddingFallback({}, fallback.index, fallback.cso, topn=fallback.topn,
+                               min_similarity=fallback.min_similarity)
+    worker.compute(grams)
+    return worker.overlay
+
+
+def save_version(model, entries, path=None):
+    """Function that writes the cached model merged with new entries as its next version.
+
+    Args:
+        model (dictionary): the cached model.
+        entries (dictionary): the new entries.
+        path (string): destination file. If None, the next version of the cached model in the models folder.
+
+    Returns:
+        path (string): the file written.
+    """
+
+    if path is None:
+        path = misc.CACHED_MODEL_VERSION.format(misc.cached_model_version() + 1)
+    merged = dict(model)
+    merged.update(entries)
+    # written aside and renamed, so that the classifier never loads a partial version
+    with open(path + '.tmp', 'w') as f:
+        json.dump(merged, f)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__)
+    parser.add_argument('misses', help='file of the missing n-grams, see write_misses')
+    parser.add_argument('--top', type=int, default=None, help='only compute the n most frequent n-grams')
+    parser.add_argument('--workers', type=int, default=1, help='processes computing the entries')
+    parser.add_argument('--topn', type=int, default=10, help='similar words of each n-gram compared with the topics')
+    parser.add_argument('--min-similarity', type=float, default=0.94,
+                        help='minimum similarity between the words and the topics')
+    parser.add_argument('--overlay', default=misc.CACHED_MODEL_OVERLAY,
+                        help='overlay of the fallback whose entries are reused, if it exists')
+    parser.add_argument('--output', default=None, help='destination file, instead of the next version')
+    args = parser.parse_args()
+
+    grams = read_misses(args.misses)[:args.top]
+    cso = misc.load_ontology_compiled()
+    model = misc.load_token2cso_merger()
+    fallback = misc.load_embedding_fallback(cso, model, overlay_path=None)
+    fallback.topn, fallback.min_similarity = args.topn, args.min_similarity
+    if os.path.exists(args.overlay):
+        fallback.overlay = EmbeddingFallback(model, fallback.index, cso, overlay_path=args.overlay).overlay
+
+    entries = build_entries(grams, fallback, workers=args.workers)
+    path = save_version(model, entries, args.output)
+    print('{} of {} missing n-grams added to {}'.format(len(entries), len(grams), path))
+
+
+if __name__ == '__main__':
+    main()
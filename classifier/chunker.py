@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extraction of the concepts of a paper, i.e., its adjective-noun and noun spans.
+
+The semantic modules used to parse the POS tags of each paper with nltk.RegexpParser("DBW_CONCEPT:
+{<JJ.*>*<NN.*>+}"), building a parse tree, and then cleaned each word of the matching spans with four regular
+expressions. Here the tags are mapped to one letter each (J for JJ.*, N for NN.*, O otherwise) and the spans are
+found by a single compiled expression over those letters, which follows the leftmost, greedy matching of the
+RegexpParser. The words are cleaned with a translation table, and the result is the same string as before, including
+its leading space.
+"""
+
+import re
+from functools import lru_cache
+
+# Same grammar as "DBW_CONCEPT: {<JJ.*>*<NN.*>+}", over the letters of the tags
+CONCEPT_TAGS = re.compile('J*N+')
+# Characters replaced by a space in each word
+PUNCTUATION = str.maketrans(dict.fromkeys('=,…’\'+-–“”"/‘[]®™%', ' '))
+EDGE_DOTS = re.compile(r'\.$|^\.')
+DOTS = re.compile(r'\.+')
+SPACES = re.compile(r'\s+')
+_TAG_LETTERS = {}
+
+
+def tag_letter(tag):
+    """Function that returns the letter of a POS tag: J for the adjectives, N for the nouns, O otherwise."""
+    letter = _TAG_LETTERS.get(tag)
+    if letter is None:
+        letter = 'J' if tag.startswith('JJ') else 'N' if tag.startswith('NN') else 'O'
+        _TAG_LETTERS[tag] = letter
+    return letter
+
+
+@lru_cache(maxsize=65536)
+def clean_word(word):
+    """Function that cleans a word of a concept: punctuation replaced by spaces, without leading and trailing dots,
+    lowercase and stripped.
+
+    Args:
+        word (string): the text of the token.
+
+    Returns:
+        word (string): the cleaned word, which can be empty.
+    """
+
+    word = word.translate(PUNCTUATION)
+    if '.' in word:
+        word = EDGE_DOTS.sub('', word)
+    return word.lower().strip()
+
+
+def concept_text(words):
+    """Function that joins the words of a span into a concept, e.g. ['Neural', 'networks'] -> ' neural networks'.
+
+    Args:
+        words (iterable): the texts of the tokens of the span.
+
+    Returns:
+        concept (string): the concept, which starts with a space, as the nltk based extraction produced it.
+    """
+
+    concept = ''.join(' ' + clean_word(word) for word in words)
+    if '..' in concept:
+        concept = DOTS.sub('.', concept)
+    return SPACES.sub(' ', concept)
+
+
+def chunk(tagged):
+    """Function that finds the adjective-noun and noun spans of a tagged text.
+
+    Args:
+        tagged (list): (text, POS tag) pairs.
+
+    Returns:
+        spans (generator): for each span, the list of its (text, POS tag) pairs.
+    """
+
+    letters = ''.join(tag_letter(tag) for _, tag in tagged)
+    for match in CONCEPT_TAGS.finditer(letters):
+        yield tagged[match.start():match.end()]
+
+
+def extract_concepts(tagged):
+    """Function that extracts the concepts of a tagged text.
+
+    Args:
+        tagged (list): (text, POS tag) pairs.
+
+    Returns:
+        concepts (list): the concepts, as lowercase strings starting with a space.
+    """
+
+    return [concept_text(text for text, _ in span) for span in chunk(tagged)]
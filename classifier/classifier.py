@@ -1,11 +1,582 @@
+import gc
 import math
+import multiprocessing
+import queue
+from collections import Counter
 from functools import partial
 from multiprocessing.pool import Pool
 
-from classifier import misc
+from nltk import everygrams, ngrams
+
+from classifier import misc, scheduler
+from classifier.ancestors import AncestorIndex
+from classifier.cache import LRUCache
+from classifier.document import AnalyzedDocument, analyze_texts, paper_text
 from classifier.semanticmodule import CSOClassifierSemantic as sema
 from classifier.syntacticmodule import CSOClassifierSyntactic as synt
 
+# Classifiers that own a pool of workers, by id. Forked workers find their classifier here (see CSOClassifier.pool)
+_CLASSIFIERS = {}
+
+# Classifier shared by run_cso_classifier and the preloaded batch mode (see get_default_classifier)
+_DEFAULT_CLASSIFIER = None
+
+
+class CSOClassifier:
+    """A reusable CSO Classifier.
+
+    It loads the ontology, the cached model and the syntactic and semantic modules (including spaCy) once, and keeps
+    them, together with the indexes derived from them, for as many papers as needed. It can also own a pool of
+    worker processes, created on the first call to classify_many that needs it and reused by the following calls.
+
+    Example:
+        with CSOClassifier(workers=4) as classifier:
+            result = classifier.classify(paper)
+            results = classifier.classify_many(papers)
+    """
+
+    def __init__(self, modules="both", enhancement="first", workers=1, cso=None, model=None, cache_size=100000,
+                 nlp=None, batch_size=64, count_misses=False):
+        """Function that initialises the classifier and loads its resources.
+
+        Args:
+            modules (string): default modules, either "syntactic", "semantic" or "both". See run_cso_classifier.
+            enhancement (string): default enhancement, either "first", "all" or "no". See run_cso_classifier.
+            workers (integer): number of worker processes used by classify_many. With 1, papers are classified in
+            the current process.
+            cso (dictionary): the ontology. If None, it is loaded with the cached model.
+            model (dictionary): the cached model. If None, it is loaded with the ontology.
+            cache_size (integer): how many n-grams each module keeps the matches of, across papers. Each worker has
+            its own caches. None keeps all of them, 0 disables the caches.
+            nlp (Language): spaCy pipeline used to tag the papers. If None, en_core_web_sm is loaded.
+            batch_size (integer): number of papers sent to spaCy at once when classifying several papers.
+            count_misses (boolean): whether the semantic module counts the n-grams missing from the cached model, see
+            CSOClassifierSemantic.top_misses. Only the papers classified in the current process are counted.
+        """
+
+        check_parameters(modules, enhancement, workers)
+        self.modules = modules
+        self.enhancement = enhancement
+        self.workers = workers
+
+        if cso is None or model is None:
+            loaded_cso, loaded_model = misc.load_ontology_and_chached_model()
+            cso = loaded_cso if cso is None else cso
+            model = loaded_model if model is None else model
+        self.cso = cso
+        self.model = model
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+
+        self.synt_module = synt(cso, cache_size=cache_size)
+        self.sema_module = sema(model, cso, cache_size=cache_size, nlp=nlp, count_misses=count_misses)
+        self._pool = None
+        self._warm = set()  # indexes built by warm_up, see pool
+        self._pool_warm = set()  # indexes built when the workers of the pool were forked
+        # utilization of the workers during the last call to classify_many that used them, see scheduler.Utilization
+        self.utilization = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def classify(self, paper, modules=None, enhancement=None, document=None):
+        """Function that classifies a single paper.
+
+        Args:
+            paper (dictionary or string): the paper {"title": "","abstract": "","keywords": ""} or its full text.
+            modules (string): overrides the default modules of the classifier.
+            enhancement (string): overrides the default enhancement of the classifier.
+            document (AnalyzedDocument): the paper already analysed, see analyze_many. If None, it is analysed here.
+
+        Returns:
+            class_res (dictionary): {"syntactic": [...], "semantic": [...], "union": [...], "enhanced": [...]}.
+        """
+
+        modules = self.modules if modules is None else modules
+        enhancement = self.enhancement if enhancement is None else enhancement
+        check_parameters(modules, enhancement)
+        paper = prepare_paper(paper)
+
+        syntactic = list()
+        semantic = list()
+
+        # the paper is tokenized and tagged once for both modules
+        if document is None:
+            document = self.analyze(paper)
+        if modules == 'syntactic' or modules == 'both':
+            self.synt_module.set_paper(paper)
+            syntactic = self.synt_module.classify_syntactic(document)
+        if modules == 'semantic' or modules == 'both':
+            self.sema_module.set_paper(paper)
+            semantic = self.sema_module.classify_semantic(document)
+
+        return self.combine(syntactic, semantic, enhancement)
+
+    def combine(self, syntactic, semantic, enhancement):
+        """Function that combines the topics found by the modules and enhances them.
+
+        Args:
+            syntactic (list): the topics found by the syntactic module.
+            semantic (list): the topics found by the semantic module.
+            enhancement (string): either "first", "all" or "no". See run_cso_classifier.
+
+        Returns:
+            class_res (dictionary): {"syntactic": [...], "semantic": [...], "union": [...], "enhanced": [...]}.
+        """
+
+        # initializing variable that will contain output
+        class_res = dict()
+        class_res["syntactic"] = syntactic
+        class_res["semantic"] = semantic
+        class_res["union"] = list()
+        class_res["enhanced"] = list()
+
+        union = list(set(class_res["syntactic"] + class_res["semantic"]))
+        class_res["union"] = union
+
+        if enhancement == 'first':
+            enhanced = misc.climb_ontology(self.cso, union, "first")
+            union_topics = set(union)
+            class_res["enhanced"] = [x for x in enhanced if x not in union_topics]
+        elif enhancement == 'all':
+            enhanced = misc.climb_ontology(self.cso, union, "all")
+            union_topics = set(union)
+            class_res["enhanced"] = [x for x in enhanced if x not in union_topics]
+        elif enhancement == 'no':
+            pass
+
+        return class_res
+
+    def enhance_many(self, results, enhancement):
+        """Function that enhances the topics of many papers at once, as combine does for each of them. The broader
+        topics of all the papers are found together, see misc.get_broader_topics_batch.
+
+        Args:
+            results (list): the result of combine() for each paper, with enhancement "no". They are updated.
+            enhancement (string): either "first", "all" or "no". See run_cso_classifier.
+
+        Returns:
+            results (list): the results, with their enhanced topics.
+        """
+
+        if enhancement == 'no':
+            return results
+        unions = [class_res["union"] for class_res in results]
+        for class_res, enhanced in zip(results, misc.get_broader_topics_batch(self.cso, unions, enhancement)):
+            union_topics = set(class_res["union"])
+            class_res["enhanced"] = [x for x in enhanced if x not in union_topics]
+        return results
+
+    def analyze(self, paper):
+        """Function that prepares the analysis of a paper shared by the syntactic and semantic modules. spaCy only
+        runs when a module needs it.
+
+        Args:
+            paper (dictionary or string): the paper {"title": "","abstract": "","keywords": ""} or its full text.
+
+        Returns:
+            document (AnalyzedDocument): the analysed paper.
+        """
+        return AnalyzedDocument(paper_text(paper), self.sema_module.nlp)
+
+    def analyze_many(self, papers, modules=None, batch_size=None):
+        """Function that prepares the analysis of several papers. If the semantic module is used, the papers are
+        tagged by spaCy in batches, see classifier.document.analyze_texts.
+
+        Args:
+            papers (iterable): the papers, either dictionaries {"title": "","abstract": "","keywords": ""} or strings.
+            modules (string): the modules the analysis is for. If None, the default modules of the classifier.
+            batch_size (integer): number of papers sent to spaCy at once. If None, the batch size of the classifier.
+
+        Returns:
+            documents (generator): an AnalyzedDocument for each paper, in the same order.
+        """
+
+        modules = self.modules if modules is None else modules
+        batch_size = self.batch_size if batch_size is None else batch_size
+        texts = (paper_text(prepare_paper(paper)) for paper in papers)
+        if modules == 'semantic' or modules == 'both':
+            return analyze_texts(texts, self.sema_module.nlp, batch_size)
+        return (AnalyzedDocument(text, self.sema_module.nlp) for text in texts)
+
+    def classify_many(self, papers, modules=None, enhancement=None, workers=None):
+        """Function that classifies a set of papers, using the pool of workers if there is more than one worker.
+        The papers are packed into units of about the same estimated cost, see scheduler.pack, and the utilization of
+        the workers is kept in the utilization attribute of the classifier, a scheduler.Utilization.
+
+        Args:
+            papers (dictionary): contains the metadata of the papers, by id. See run_cso_classifier_batch_mode.
+            modules (string): overrides the default modules of the classifier.
+            enhancement (string): overrides the default enhancement of the classifier.
+            workers (integer): overrides the number of workers of the classifier. A pool of a different size
+            replaces the current one.
+
+        Returns:
+            class_res (dictionary): the result of classify() for each paper, by id.
+        """
+
+        modules = self.modules if modules is None else modules
+        enhancement = self.enhancement if enhancement is None else enhancement
+        workers = self.workers if workers is None else workers
+        check_parameters(modules, enhancement, workers)
+
+        if workers == 1 or len(papers) <= 1:
+            documents = self.analyze_many(papers.values(), modules)
+            class_res = {paper_id: self.classify(paper, modules, 'no', document)
+                         for (paper_id, paper), document in zip(papers.items(), documents)}
+            self.enhance_many(list(class_res.values()), enhancement)
+            return class_res
+
+        # units of about the same estimated cost, handed out to the workers as they become free
+        units = scheduler.pack(papers, workers * 4)
+        annotate = partial(_classify_unit, id(self), modules=modules, enhancement=enhancement)
+        utilization = scheduler.Utilization()
+        class_res = {}
+        for result, stats in self.pool(workers, modules, enhancement).imap_unordered(annotate, units):
+            class_res.update(result)
+            utilization.add(stats)
+        self.utilization = utilization.finish()
+
+        return {paper_id: class_res[paper_id] for paper_id in papers}
+
+    def classify_stream(self, papers, modules=None, enhancement=None, workers=None, chunk_size=None,
+                        max_in_flight=None):
+        """Function that classifies a stream of papers, yielding the results as soon as they are ready.
+
+        The papers are read in small chunks, and no more than max_in_flight chunks are submitted to the workers at
+        any time, so that memory stays flat whatever the size of the stream. With more than one worker, the chunks
+        are yielded in the order in which they complete.
+
+        Args:
+            papers (iterable): (id, paper) pairs, or a dictionary of papers by id. See run_cso_classifier_batch_mode.
+            modules (string): overrides the default modules of the classifier.
+            enhancement (string): overrides the default enhancement of the classifier.
+            workers (integer): overrides the number of workers of the classifier.
+            chunk_size (integer): number of papers sent to a worker at once. Default = the batch size of spaCy.
+            max_in_flight (integer): maximum number of chunks submitted and not yet yielded. Default = 2 * workers.
+
+        Yields:
+            (paper_id, result) (tuple): the id of a paper and the result of classify() for it.
+        """
+
+        modules = self.modules if modules is None else modules
+        enhancement = self.enhancement if enhancement is None else enhancement
+        workers = self.workers if workers is None else workers
+        check_parameters(modules, enhancement, workers)
+        chunk_size = self.batch_size if chunk_size is None else chunk_size
+        max_in_flight = 2 * workers if max_in_flight is None else max_in_flight
+
+        if isinstance(papers, dict):
+            papers = papers.items()
+        chunks = misc.chunks_of_stream(papers, chunk_size)
+
+        if workers == 1:
+            for chunk in chunks:
+                yield from self.classify_many(chunk, modules, enhancement, workers=1).items()
+            return
+
+        annotate = partial(_classify_chunk, id(self), modules=modules, enhancement=enhancement)
+        done = queue.Queue()
+        in_flight = 0
+        try:
+            for chunk in chunks:
+                while in_flight >= max_in_flight:
+                    result, in_flight = done.get(), in_flight - 1
+                    yield from _chunk_results(result)
+                # the pool is taken for each chunk, as another call may have replaced it
+                self.pool(workers, modules, enhancement).apply_async(annotate, (chunk,), callback=done.put,
+                                                                     error_callback=done.put)
+                in_flight += 1
+            while in_flight:
+                result, in_flight = done.get(), in_flight - 1
+                yield from _chunk_results(result)
+        finally:
+            # the results of a stream closed early are dropped, but its chunks are let finish so that the pool can
+            # be reused
+            while in_flight:
+                done.get()
+                in_flight -= 1
+
+    def classify_corpus(self, papers, modules=None, enhancement=None, workers=None):
+        """Function that classifies a corpus in two passes, matching each distinct n-gram only once.
+
+        Across a corpus, the distinct n-grams and concepts are a small fraction of all of them. Pass 1 analyses the
+        papers, keeping only their tokens and concepts, and collects the distinct n-grams, which are then matched
+        against the ontology and the model. Both steps run on the workers if there are more than one. Pass 2
+        classifies each paper from these matches, which fill the caches of the modules for the duration of the call,
+        so that the n-grams left out of pass 1 are also matched only once. The result is the same as with
+        classify_many.
+
+        Args:
+            papers (dictionary): contains the metadata of the papers, by id. See run_cso_classifier_batch_mode.
+            modules (string): overrides the default modules of the classifier.
+            enhancement (string): overrides the default enhancement of the classifier.
+            workers (integer): overrides the number of workers of the classifier.
+
+        Returns:
+            class_res (dictionary): the result of classify() for each paper, by id.
+        """
+
+        modules = self.modules if modules is None else modules
+        enhancement = self.enhancement if enhancement is None else enhancement
+        workers = self.workers if workers is None else workers
+        check_parameters(modules, enhancement, workers)
+        syntactic = modules == 'syntactic' or modules == 'both'
+        semantic = modules == 'semantic' or modules == 'both'
+
+        # pass 1: tokens and concepts of each paper, and distinct n-grams of the corpus
+        analysed = {}
+        for chunk in self._map('_analyze_chunk', [(unit, modules) for _, unit in scheduler.pack(papers, workers * 4)],
+                               workers, modules):
+            analysed.update(chunk)
+        analysed = {paper_id: analysed[paper_id] for paper_id in papers}
+
+        index = self.synt_module.get_index()
+        grams = Counter()
+        concept_grams = set()
+        for tokens, concepts in analysed.values():
+            for n in range(3, 0, -1):
+                grams.update(" ".join(gram) for gram in ngrams(tokens, n))
+            for concept in concepts:
+                concept_grams.update(everygrams(concept.split(), 1, 3))
+        # The syntactic module skips the positions already matched by a longer n-gram, so an n-gram seen once may
+        # never be needed: those are matched on demand in pass 2. N-grams that are exactly a topic have their own
+        # memo, see SyntacticIndex.match_topic
+        exact = index.matcher.exact if self.synt_module.exact_matching else {}
+        grams = {gram for gram, count in grams.items() if count > 1 and gram not in exact}
+
+        caches = self.synt_module.cache, self.sema_module.cache
+        self.synt_module.cache, self.sema_module.cache = LRUCache(None), LRUCache(None)
+        try:
+            # matching each distinct n-gram once
+            for items, method, cache in ((sorted(grams), '_match_grams', self.synt_module.cache),
+                                         (sorted(concept_grams), '_match_concepts', self.sema_module.cache)):
+                chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+                for chunk in self._map(method, [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)],
+                                       workers, modules):
+                    for key, value in chunk:
+                        cache.put(key, value)
+
+            # pass 2: topics of each paper. The semantic topics of all the papers are ranked together
+            if semantic:
+                semantic_topics = self.sema_module.classify_concepts_batch([concepts for _, concepts in
+                                                                            analysed.values()])
+            else:
+                semantic_topics = [list() for _ in analysed]
+            class_res = {}
+            for (paper_id, (tokens, concepts)), semantic_res in zip(analysed.items(), semantic_topics):
+                class_res[paper_id] = self.combine(self.synt_module.classify_tokens(tokens) if syntactic else list(),
+                                                   semantic_res, 'no')
+            self.enhance_many(list(class_res.values()), enhancement)
+        finally:
+            self.synt_module.cache, self.sema_module.cache = caches
+
+        return class_res
+
+    def _analyze_chunk(self, args):
+        """Function that returns the tokens and concepts of a chunk of papers, for pass 1 of classify_corpus."""
+        papers, modules = args
+        analysed = {}
+        for (paper_id, paper), document in zip(papers.items(), self.analyze_many(papers.values(), modules)):
+            if not document.text:
+                raise ValueError('Error: No paper text found: {}'.format(paper))
+            tokens = document.syntactic_tokens if modules in ('syntactic', 'both') else []
+            concepts = self.sema_module.extract_concepts(document) if modules in ('semantic', 'both') else []
+            analysed[paper_id] = (tokens, concepts)
+        return analysed
+
+    def _match_grams(self, grams):
+        """Function that returns the syntactic matches of n-grams, as keys and values of the syntactic cache."""
+        index = self.synt_module.get_index()
+        min_similarity, fuzzy = self.synt_module.min_similarity, self.synt_module.fuzzy_index
+        return [((gram, min_similarity, fuzzy), index.match(gram, min_similarity, fuzzy=fuzzy)) for gram in grams]
+
+    def _match_concepts(self, concept_grams):
+        """Function that returns the semantic matches of n-grams, as keys and values of the semantic cache."""
+        module = self.sema_module
+        return [((grams, module.merge_bigrams, module.min_similarity), module.lookup_gram(grams, module.min_similarity))
+                for grams in concept_grams]
+
+    def _map(self, method, chunks, workers, modules):
+        """Function that applies a method of the classifier to chunks, on the pool of workers if more than one. The
+        workers match the n-grams of the modules, and enhance nothing."""
+        if workers == 1 or len(chunks) <= 1:
+            return [getattr(self, method)(chunk) for chunk in chunks]
+        # one chunk at a time, so that a worker that is done with a chunk takes the next one
+        return list(self.pool(workers, modules, 'no').imap(partial(_call_chunk, id(self), method), chunks))
+
+    def pool(self, workers=None, modules=None, enhancement=None):
+        """Function that returns the pool of workers, creating it if needed.
+
+        Where the "fork" start method is available, the workers are forked from the current process and share the
+        loaded resources through copy-on-write memory. The indexes that the modules and enhancement use are built
+        beforehand, see warm_up. If they were not all built when the workers of the current pool were forked, the
+        pool is replaced, as each of its workers would otherwise build its own copy. The collector is frozen before
+        the workers are forked: otherwise it would touch the reference counts of the shared objects in each worker
+        and duplicate the memory pages holding them. Elsewhere, each worker loads its own copy of the resources.
+
+        Args:
+            workers (integer): number of workers. A pool of a different size replaces the current one. If None, the
+            number of workers of the classifier.
+            modules (string): the modules the workers are used for. If None, the default modules of the classifier.
+            enhancement (string): the enhancement the workers are used for. If None, the default enhancement of the
+            classifier.
+
+        Returns:
+            pool (Pool): the pool of workers.
+        """
+
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        if fork:
+            # the indexes are built once here, rather than in each worker on its first paper
+            self.warm_up(modules, enhancement)
+        if (workers is not None and workers != self.workers) or (fork and self._warm != self._pool_warm):
+            self.close()
+            self.workers = self.workers if workers is None else workers
+        if self._pool is None:
+            _CLASSIFIERS[id(self)] = self
+            if fork:
+                gc.collect()
+                gc.freeze()
+                try:
+                    self._pool = multiprocessing.get_context("fork").Pool(self.workers)
+                    self._pool_warm = set(self._warm)
+                finally:
+                    gc.unfreeze()
+            else:
+                self._pool = Pool(self.workers, initializer=_start_worker,
+                                  initargs=(id(self), self.modules, self.enhancement, self.cso, self.model,
+                                            self.cache_size, self.batch_size))
+        return self._pool
+
+    def warm_up(self, modules=None, enhancement=None):
+        """Function that builds the indexes that modules and enhancement use, which are otherwise built on the first
+        paper that needs them.
+
+        Args:
+            modules (string): either "syntactic", "semantic" or "both". If None, the default modules of the classifier.
+            enhancement (string): either "first", "all" or "no". If None, the default enhancement of the classifier.
+        """
+
+        modules = self.modules if modules is None else modules
+        enhancement = self.enhancement if enhancement is None else enhancement
+        if modules in ('syntactic', 'both'):
+            self.synt_module.get_index()
+            self._warm.add('syntactic')
+        if modules in ('semantic', 'both') and self.sema_module.prune_model:
+            self.sema_module.get_pruned_model(self.sema_module.min_similarity)
+            self._warm.add(('semantic', self.sema_module.min_similarity))
+        if enhancement != 'no':
+            AncestorIndex.for_ontology(self.cso)
+            self._warm.add('enhancement')
+
+    def cache_stats(self):
+        """Function that returns the statistics of the caches of the n-gram matches, in the current process.
+
+        Returns:
+            stats (dictionary): {"syntactic": {...}, "semantic": {...}}, see LRUCache.stats.
+        """
+        return {"syntactic": self.synt_module.cache.stats(), "semantic": self.sema_module.cache.stats()}
+
+    def close(self):
+        """Function that stops the pool of workers, if any."""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        _CLASSIFIERS.pop(id(self), None)
+
+
+def _start_worker(key, modules, enhancement, cso, model, cache_size, batch_size):
+    """Function that creates the classifier of a worker that was not forked from the process owning the pool."""
+    _CLASSIFIERS[key] = CSOClassifier(modules, enhancement, cso=cso, model=model, cache_size=cache_size,
+                                      batch_size=batch_size)
+
+
+def _call_chunk(key, method, chunk):
+    """Function that applies a method of the classifier to a chunk, in a worker."""
+    return getattr(_CLASSIFIERS[key], method)(chunk)
+
+
+def _classify_chunk(key, papers, modules, enhancement):
+    """Function that classifies a chunk of papers in a worker."""
+    return _CLASSIFIERS[key].classify_many(papers, modules, enhancement, workers=1)
+
+
+def _classify_unit(key, unit, modules, enhancement):
+    """Function that classifies a work unit of papers in a worker, see scheduler.run_unit."""
+    return scheduler.run_unit(partial(_CLASSIFIERS[key].classify_many, modules=modules, enhancement=enhancement,
+                                      workers=1), unit)
+
+
+def _chunk_results(result):
+    """Function that returns the results of a chunk classified by a worker, raising the error of the worker if any."""
+    if isinstance(result, BaseException):
+        raise result
+    return result.items()
+
+
+def get_default_classifier():
+    """Function that returns the classifier shared by the functions of this module, creating it if needed.
+
+    Returns:
+        classifier (CSOClassifier): the default classifier.
+    """
+
+    global _DEFAULT_CLASSIFIER
+    if _DEFAULT_CLASSIFIER is None:
+        _DEFAULT_CLASSIFIER = CSOClassifier()
+    return _DEFAULT_CLASSIFIER
+
+
+def check_parameters(modules, enhancement, workers=1):
+    """Function that checks the flags of the classifier.
+
+    Args:
+        modules (string): either "syntactic", "semantic" or "both".
+        enhancement (string): either "first", "all" or "no".
+        workers (integer): number of workers, at least 1.
+    """
+
+    if modules not in ["syntactic", "semantic", "both"]:
+        raise ValueError("Error: Field modules must be 'syntactic', 'semantic' or 'both'")
+
+    if enhancement not in ["first", "all", "no"]:
+        raise ValueError("Error: Field enhances must be 'first', 'all' or 'no'")
+
+    if type(workers) != int:
+        raise ValueError("Error: Number of workers must be integer")
+
+    if workers < 1:
+        raise ValueError("Error: Number of workers must be equal or greater than 1")
+
+
+def prepare_paper(paper):
+    """Function that selects title, abstract and keywords of a paper, without modifying it.
+
+    Args:
+        paper (dictionary or string): the paper {"title": "","abstract": "","keywords": ""} or its full text.
+
+    Returns:
+        paper (dictionary or string): the paper with only title, abstract and keywords, as strings.
+    """
+
+    if not isinstance(paper, dict):
+        return paper
+
+    # In this case we avoid computing other fields. We select only title, abstract and keywords
+    prepared = dict()
+    for field in ["title", "abstract", "keywords"]:
+        prepared[field] = paper[field] if field in paper and paper[field] is not None else ""
+    # just in case the value keywords contains an array of keywords
+    if isinstance(prepared["keywords"], list):
+        prepared["keywords"] = ', '.join(prepared["keywords"])
+    return prepared
+
 
 def run_cso_classifier(paper, modules="both", enhancement="first"):
     """Run the CSO Classifier.
@@ -34,47 +605,11 @@ def run_cso_classifier(paper, modules="both", enhancement="first"):
         fmodel (dictionary): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
     """
 
-    if modules not in ["syntactic", "semantic", "both"]:
-        raise ValueError("Error: Field modules must be 'syntactic', 'semantic' or 'both'")
-
-    if enhancement not in ["first", "all", "no"]:
-        raise ValueError("Error: Field enhances must be 'first', 'all' or 'no'")
+    return get_default_classifier().classify(paper, modules=modules, enhancement=enhancement)
 
-    # Loading ontology and model
-    cso, model = misc.load_ontology_and_chached_model()
 
-    # Passing parameters to the two classes (synt and sema)
-    synt_module = synt(cso, paper)
-    sema_module = sema(model, cso, paper)
-
-    # initializing variable that will contain output
-    class_res = dict()
-    class_res["syntactic"] = list()
-    class_res["semantic"] = list()
-    class_res["union"] = list()
-    class_res["enhanced"] = list()
-
-    if modules == 'syntactic' or modules == 'both':
-        class_res["syntactic"] = synt_module.classify_syntactic()
-    if modules == 'semantic' or modules == 'both':
-        class_res["semantic"] = sema_module.classify_semantic()
-
-    union = list(set(class_res["syntactic"] + class_res["semantic"]))
-    class_res["union"] = union
-
-    if enhancement == 'first':
-        enhanced = misc.climb_ontology(cso, union, "first")
-        class_res["enhanced"] = [x for x in enhanced if x not in union]
-    elif enhancement == 'all':
-        enhanced = misc.climb_ontology(cso, union, "all")
-        class_res["enhanced"] = [x for x in enhanced if x not in union]
-    elif enhancement == 'no':
-        pass
-
-    return class_res
-
-
-def run_cso_classifier_batch_mode(papers, workers=1, modules="both", enhancement="first"):
+def run_cso_classifier_batch_mode(papers, workers=1, modules="both", enhancement="first", preload=False,
+                                  corpus=False):
     """Run the CSO Classifier in *BATCH MODE* and with multiprocessing.
 
     It takes as input a set of papers, which include abstract, title, and keywords and for each one of them returns a
@@ -94,27 +629,33 @@ def run_cso_classifier_batch_mode(papers, workers=1, modules="both", enhancement
         enhancement (string): either "first", "all" or "no". With "first" the CSO classifier returns only the topics
         one level above. With "all" it returns all topics above the resulting topics. With "no" the CSO Classifier
         does not provide any enhancement.
+        preload (boolean): if True, the papers are classified by the default CSOClassifier of this process (see
+        get_default_classifier), which loads the ontology, the cached model and spaCy once and forks its workers
+        from it, sharing them through copy-on-write memory. Its pool of workers is kept for later calls. Otherwise,
+        each worker loads its own copy.
+        corpus (boolean): if True, the papers are classified in two passes, matching each distinct n-gram of the
+        corpus only once (see CSOClassifier.classify_corpus). The result is the same. With preload, the default
+        classifier is used, otherwise a classifier is loaded for this call.
 
     Returns:
         fcso (dictionary): contains the CSO Ontology.
         fmodel (dictionary): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
     """
 
-    if modules not in ["syntactic", "semantic", "both"]:
-        raise ValueError("Error: Field modules must be 'syntactic', 'semantic' or 'both'")
-
-    if enhancement not in ["first", "all", "no"]:
-        raise ValueError("Error: Field enhances must be 'first', 'all' or 'no'")
+    check_parameters(modules, enhancement, workers)
 
-    if workers < 1:
-        raise ValueError("Error: Number of workers must be equal or greater than 1")
-
-    if type(workers) != int:
-        raise ValueError("Error: Number of workers must be integer")
+    if corpus and preload:
+        return get_default_classifier().classify_corpus(papers, modules=modules, enhancement=enhancement,
+                                                        workers=workers)
+    if corpus:
+        with CSOClassifier(modules, enhancement, workers) as classifier:
+            return classifier.classify_corpus(papers)
+    if preload:
+        return get_default_classifier().classify_many(papers, modules=modules, enhancement=enhancement,
+                                                      workers=workers)
 
-    size_of_corpus = len(papers)
-    chunk_size = math.ceil(size_of_corpus / workers)
-    papers_list = list(misc.chunks(papers, chunk_size))
+    # one unit per worker, since each of them loads its own classifier, of about the same estimated cost
+    papers_list = [unit for _, unit in scheduler.pack(papers, workers)]
     annotate = partial(run_cso_classifier_batch_model_single_worker, modules=modules, enhancement=enhancement)
 
     with Pool(workers) as p:
@@ -122,10 +663,46 @@ def run_cso_classifier_batch_mode(papers, workers=1, modules="both", enhancement
 
     class_res = {k: v for d in result for k, v in d.items()}
 
-    return class_res
+    return {paper_id: class_res[paper_id] for paper_id in papers}
+
+
+def run_cso_classifier_stream(papers, workers=1, modules="both", enhancement="first", preload=False, chunk_size=64,
+                              max_in_flight=None):
+    """Run the CSO Classifier on a stream of papers, in *BATCH MODE* and with multiprocessing.
+
+    Unlike run_cso_classifier_batch_mode, it does not need all the papers in memory: they are read in small chunks,
+    at most max_in_flight chunks are being classified at any time, and the result of each paper is yielded as soon as
+    its chunk is classified, in the order in which the chunks complete.
+
+    Args:
+        papers (iterable): (id, paper) pairs, e.g. read from a file, or a dictionary of papers by id. See
+        run_cso_classifier_batch_mode.
+        workers (integer): number of workers. If 1 is in single thread, otherwise multithreaded
+        modules (string): either "syntactic", "semantic" or "both". See run_cso_classifier_batch_mode.
+        enhancement (string): either "first", "all" or "no". See run_cso_classifier_batch_mode.
+        preload (boolean): if True, the papers are classified by the default CSOClassifier of this process (see
+        get_default_classifier), whose pool of workers is kept for later calls. Otherwise, a classifier is loaded for
+        this call.
+        chunk_size (integer): number of papers sent to a worker at once.
+        max_in_flight (integer): maximum number of chunks being classified. Default = 2 * workers.
+
+    Yields:
+        (paper_id, result) (tuple): the id of a paper and its topics, as in run_cso_classifier_batch_mode.
+    """
+
+    check_parameters(modules, enhancement, workers)
 
+    if preload:
+        yield from get_default_classifier().classify_stream(papers, modules=modules, enhancement=enhancement,
+                                                            workers=workers, chunk_size=chunk_size,
+                                                            max_in_flight=max_in_flight)
+        return
+    with CSOClassifier(modules, enhancement, workers) as classifier:
+        yield from classifier.classify_stream(papers, chunk_size=chunk_size, max_in_flight=max_in_flight)
 
-def run_cso_classifier_batch_model_single_worker(papers, modules="both", enhancement="first"):
+
+def run_cso_classifier_batch_model_single_worker(papers, modules="both", enhancement="first", preloaded=False,
+                                                 batch_size=64):
     """Run the CSO Classifier in *BATCH MODE*.
 
     It takes as input a set of papers, which include abstract, title, and keywords and for each one of them returns a
@@ -146,66 +723,27 @@ def run_cso_classifier_batch_model_single_worker(papers, modules="both", enhance
         enhancement (string): either "first", "all" or "no". With "first" the CSO classifier returns only the topics
         one level above. With "all" it returns all topics above the resulting topics. With "no" the CSO Classifier
         does not provide any enhancement.
+        preloaded (boolean): if True, use the default CSOClassifier of this process (see get_default_classifier)
+        instead of loading the ontology, the cached model and spaCy again.
+        batch_size (integer): number of papers tagged by spaCy at once.
 
     Returns:
         fcso (dictionary): contains the CSO Ontology.
         fmodel (dictionary): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
     """
 
-    if modules not in ["syntactic", "semantic", "both"]:
-        raise ValueError("Error: Field modules must be 'syntactic', 'semantic' or 'both'")
-
-    if enhancement not in ["first", "all", "no"]:
-        raise ValueError("Error: Field enhances must be 'first', 'all' or 'no'")
-
-    # Loading ontology and model
-    cso, model = misc.load_ontology_and_chached_model()
+    check_parameters(modules, enhancement)
 
-    # Passing parameters to the two classes (synt and sema)
-    synt_module = synt(cso)
-    sema_module = sema(model, cso)
+    classifier = get_default_classifier() if preloaded else CSOClassifier(modules, enhancement)
 
     # initializing variable that will contain output
     class_res = dict()
 
-    for paper_id, paper_value in papers.items():
+    # the papers are tagged by spaCy in batches, as they are classified
+    documents = classifier.analyze_many(papers.values(), modules=modules, batch_size=batch_size)
+    for (paper_id, paper_value), document in zip(papers.items(), documents):
         print("Processing:", paper_id)
-
-        # In this case we avoid computing other fields. We select only title, abstract and keywords
-        paper = dict()
-
-        paper["title"] = paper_value["title"] if "title" in paper_value and not paper_value["title"] is None else ""
-        paper["abstract"] = paper_value["abstract"] if "abstract" in paper_value and not paper_value[
-                                                                                             "abstract"] is None else ""
-        paper["keywords"] = paper_value["keywords"] if "keywords" in paper_value and not paper_value[
-                                                                                             "keywords"] is None else ""
-        # just in case the value keywords contains an array of keywords
-        if isinstance(paper["keywords"], list):
-            paper["keywords"] = ', '.join(paper["keywords"])
-
-        class_res[paper_id] = dict()
-        class_res[paper_id]["syntactic"] = list()
-        class_res[paper_id]["semantic"] = list()
-        class_res[paper_id]["union"] = list()
-        class_res[paper_id]["enhanced"] = list()
-
-        if modules == 'syntactic' or modules == 'both':
-            synt_module.set_paper(paper)
-            class_res[paper_id]["syntactic"] = synt_module.classify_syntactic()
-        if modules == 'semantic' or modules == 'both':
-            sema_module.set_paper(paper)
-            class_res[paper_id]["semantic"] = sema_module.classify_semantic()
-
-        union = list(set(class_res[paper_id]["syntactic"] + class_res[paper_id]["semantic"]))
-        class_res[paper_id]["union"] = union
-
-        if enhancement == 'first':
-            enhanced = misc.climb_ontology(cso, union, "first")
-            class_res[paper_id]["enhanced"] = [x for x in enhanced if x not in union]
-        elif enhancement == 'all':
-            enhanced = misc.climb_ontology(cso, union, "all")
-            class_res[paper_id]["enhanced"] = [x for x in enhanced if x not in union]
-        elif enhancement == 'no':
-            pass
+        class_res[paper_id] = classifier.classify(paper_value, modules=modules, enhancement=enhancement,
+                                                  document=document)
 
     return class_res
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A paper analysed once and shared by the syntactic and semantic modules.
+
+The modules used to tokenize the same paper separately: the syntactic module with NLTK, the semantic module with the
+full spaCy pipeline, and the cset functions with one spaCy pipeline each for the clean and the tagged tokens. An
+AnalyzedDocument runs spaCy at most once per paper, when the first module needs it, and exposes the streams each
+module works on:
+    (i) tagged, the (text, POS tag) pairs used to extract the concepts of the semantic modules;
+    (ii) clean_tokens, the lowercase tokens without stopwords and punctuation used by cset.syntactic;
+    (iii) syntactic_tokens, the tokens used by the syntactic module of the classifier, which keeps its NLTK
+    tokenization so that its results do not change.
+Several papers can be analysed together with analyze_texts, which sends them through spaCy in batches.
+"""
+
+import re
+
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+
+# Tokenization of the syntactic module of the classifier
+SYNTACTIC_TOKEN = re.compile(r'[\w\-\(\)]*')
+_STOPWORDS = None
+
+
+def get_stopwords():
+    """Function that returns the English stopwords of NLTK, loaded once."""
+    global _STOPWORDS
+    if _STOPWORDS is None:
+        _STOPWORDS = frozenset(stopwords.words('english'))
+    return _STOPWORDS
+
+
+def paper_text(paper):
+    """Function that returns the text of a paper, as the modules of the classifier read it.
+
+    Args:
+        paper (either string or dictionary): the full text of the paper or a dictionary {"title": "","abstract":
+        "","keywords": ""}. Keywords can be a list.
+
+    Returns:
+        text (string): the text of the paper.
+    """
+
+    if isinstance(paper, str):
+        return paper.strip()
+    if isinstance(paper, dict):
+        keywords = paper.get('keywords')
+        if isinstance(keywords, list):
+            keywords = ', '.join(keywords)
+        field_text = (paper.get('title'), paper.get('abstract'), keywords)
+        return '. '.join((text for text in field_text if text))
+    raise TypeError('Pass paper as a string or dict that maps "title", "abstract", and "keywords" to strings')
+
+
+def syntactic_tokens(text):
+    """Function that tokenizes a text as the syntactic module of the classifier does: lowercase words, without
+    stopwords, tokenized again with NLTK once joined.
+
+    Args:
+        text (string): the text of the paper.
+
+    Returns:
+        tokens (list): the tokens.
+    """
+
+    words = SYNTACTIC_TOKEN.findall(text.lower())
+    stop = get_stopwords()
+    return word_tokenize(" ".join(w for w in words if w and w not in stop), preserve_line=True)
+
+
+def analyze_texts(texts, nlp, batch_size=64):
+    """Function that analyses texts in batches with nlp.pipe.
+
+    Args:
+        texts (iterable): the texts of the papers.
+        nlp (Language): spaCy pipeline including a tagger. Components that are not needed should be disabled.
+        batch_size (integer): number of texts in each batch.
+
+    Returns:
+        documents (generator): an AnalyzedDocument for each text, in the same order.
+    """
+
+    for doc, text in nlp.pipe(((text, text) for text in texts), as_tuples=True, batch_size=batch_size):
+        yield AnalyzedDocument(text, nlp, doc)
+
+
+class AnalyzedDocument:
+    """A paper tokenized and POS-tagged once."""
+
+    def __init__(self, text, nlp=None, doc=None):
+        """Function that initialises the document. The text is only analysed when one of its streams is needed.
+
+        Args:
+            text (string): the text of the paper.
+            nlp (Language): spaCy pipeline including a tagger, used to analyse the text.
+            doc (Doc): the text already analysed with spaCy, if available.
+        """
+        self.text = text
+        self.nlp = nlp
+        self._doc = doc
+        self._tagged = None
+        self._clean_tokens = None
+        self._syntactic_tokens = None
+
+    @property
+    def doc(self):
+        """The spaCy document of the text."""
+        if self._doc is None:
+            self._doc = self.nlp(self.text)
+        return self._doc
+
+    @property
+    def tagged(self):
+        """The (text, POS tag) pairs of the tokens that have a tag."""
+        if self._tagged is None:
+            self._tagged = [(token.text, token.tag_) for token in self.doc if token.tag_]
+        return self._tagged
+
+    @property
+    def clean_tokens(self):
+        """The lowercase tokens that are neither stopwords nor punctuation."""
+        if self._clean_tokens is None:
+            self._clean_tokens = [token.lower_ for token in self.doc if not (token.is_stop or token.is_punct)]
+        return self._clean_tokens
+
+    @property
+    def syntactic_tokens(self):
+        """The tokens of the syntactic module of the classifier, see syntactic_tokens()."""
+        if self._syntactic_tokens is None:
+            self._syntactic_tokens = syntactic_tokens(self.text)
+        return self._syntactic_tokens
+
+    def release(self):
+        """Function that frees the spaCy document, keeping the streams already computed."""
+        self._doc = None
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fallback to the word2vec model for the n-grams that are not in the cached model.
+
+The cached model (token-to-cso-combined.json) lists, for each token of the vocabulary of the word2vec model, the
+topics whose label is similar to the token or to its most similar words: each item holds the topic, the similarity
+between its label and the word (sim_t), the word (wet) and the similarity between the word and the token (sim_w, 1 for
+the token itself). An n-gram that is not in the cached model is only merged from its tokens, or dropped.
+
+EmbeddingIndex holds the vectors of the word2vec model in a contiguous float32 matrix with unit rows, so that the most
+similar words of a batch of words are found with blocked matrix products. EmbeddingFallback is the cached model
+extended with it: an n-gram of the vocabulary of the word2vec model that is not in the cached model gets its items
+computed as above, with the syntactic index of the ontology (see classifier.syntacticindex) comparing the words with
+the topics. The new items are kept in an overlay, which can be saved to a file and is read again by later processes,
+so that each n-gram is only computed once.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from classifier.syntacticindex import SyntacticIndex
+
+
+class EmbeddingIndex:
+    """The vectors of a word2vec model, to find the most similar words."""
+
+    def __init__(self, words, vectors):
+        """Function that initialises the index.
+
+        Args:
+            words (list): the words of the model.
+            vectors (array): their vectors, one row per word.
+        """
+        self.words = list(words)
+        self.rows = {word: row for row, word in enumerate(self.words)}
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.norms = np.linalg.norm(vectors, axis=1)
+        # rows of norm 1, so that their products are the cosine similarities
+        self.unit = vectors / np.where(self.norms > 0, self.norms, 1)[:, None]
+
+    @classmethod
+    def from_model(cls, model):
+        """Function that creates the index of a word2vec model.
+
+        Args:
+            model: a gensim Word2Vec or KeyedVectors model, as in model.p, or a dictionary from words to vectors.
+
+        Returns:
+            index (EmbeddingIndex): the index.
+        """
+
+        if isinstance(model, Mapping):
+            return cls(list(model), np.array(list(model.values())))
+        vectors = getattr(model, 'wv', model)
+        words = getattr(vectors, 'index_to_key', None) or getattr(vectors, 'index2word')
+        return cls(words, vectors.vectors)
+
+    def __contains__(self, word):
+        return word in self.rows
+
+    def __len__(self):
+        return len(self.words)
+
+    def most_similar(self, words, topn=10, block_size=16384):
+        """Function that returns the most similar words of each word, as gensim's most_similar does.
+
+        Args:
+            words (list): words of the model.
+            topn (integer): how many similar words to return for each word.
+            block_size (integer): rows of the matrix multiplied at once with the vectors of the words.
+
+        Returns:
+            similar (list): for each word, its (word, similarity) tuples by decreasing similarity, without itself.
+        """
+
+        if not words:
+            return []
+        rows = np.array([self.rows[word] for word in words])
+        queries = self.unit[rows]
+        topn = min(topn, len(self.words) - 1)
+        best_scores = np.full((len(rows), topn), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(rows), topn), -1, dtype=np.int64)
+        for start in range(0, len(self.words), block_size):
+            scores = queries @ self.unit[start:start + block_size].T
+            own = (rows >= start) & (rows < start + scores.shape[1])
+            scores[own, rows[own] - start] = -np.inf
+            k = min(topn, scores.shape[1])
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+            candidates = np.concatenate([best_rows, candidates + start], axis=1)
+            kept = np.argpartition(-scores, topn - 1, axis=1)[:, :topn]
+            best_scores = np.take_along_axis(scores, kept, axis=1)
+            best_rows = np.take_along_axis(candidates, kept, axis=1)
+
+        # the products of a block depend on how many words are queried together: the similarities of the words
+        # kept are computed again one by one, so that they do not depend on the batch
+        best_scores = np.where(best_rows >= 0, (self.unit[best_rows].astype(np.float64) *
+                                                queries[:, None, :].astype(np.float64)).sum(axis=2), -np.inf)
+        order = np.lexsort((best_rows, -best_scores), axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [[(self.words[row], float(score)) for row, score in zip(word_rows, word_scores) if row >= 0]
+                for word_rows, word_scores in zip(best_rows.tolist(), best_scores.tolist())]
+
+
+class EmbeddingFallback(Mapping):
+    """The cached model, extended with the word2vec model for the n-grams that it does not hold."""
+
+    def __init__(self, model, index, cso, topn=10, min_similarity=0.94, overlay_path=None):
+        """Function that initialises the fallback.
+
+        Args:
+            model (dictionary): the cached model.
+            index (EmbeddingIndex): the vectors of the word2vec model.
+            cso (dictionary): the ontology.
+            topn (integer): how many similar words of an n-gram are compared with the topics.
+            min_similarity (float): minimum similarity between a word and the label of a topic for the computed items.
+            The semantic module should not use a lower threshold.
+            overlay_path (string): file where the computed items are appended and read from, if any.
+        """
+        self.model = model
+        self.index = index
+        self.cso = cso
+        self.topn = topn
+        self.min_similarity = min_similarity
+        self.overlay_path = overlay_path
+        self.overlay = {}
+        self.computed = 0
+        if overlay_path is not None and os.path.exists(overlay_path):
+            with open(overlay_path) as f:
+                for line in f:
+                    gram, items = json.loads(line)
+                    self.overlay[gram] = items
+
+    def __contains__(self, gram):
+        if gram in self.model or gram in self.overlay:
+            return True
+        if gram in self.index:
+            self.compute([gram])
+            return True
+        return False
+
+    def __getitem__(self, gram):
+        if gram in self.model:
+            return self.model[gram]
+        if gram not in self.overlay:
+            if gram not in self.index:
+                raise KeyError(gram)
+            self.compute([gram])
+        return self.overlay[gram]
+
+    def __iter__(self):
+        yield from self.model
+        for gram in self.overlay:
+            if gram not in self.model:
+                yield gram
+
+    def __len__(self):
+        return len(self.model) + sum(1 for gram in self.overlay if gram not in self.model)
+
+    def compute(self, grams):
+        """Function that computes the items of the n-grams that are in the word2vec model but neither in the cached
+        model nor in the overlay, and adds them to the overlay. The similar words of all of them are found together.
+
+        Args:
+            grams (iterable): n-grams, joined by '_'.
+        """
+
+        grams = [gram for gram in dict.fromkeys(grams)
+                 if gram in self.index and gram not in self.overlay and gram not in self.model]
+        if not grams:
+            return
+        syntactic_index = SyntacticIndex.for_ontology(self.cso)
+        computed = {}
+        for gram, similar in zip(grams, self.index.most_similar(grams, topn=self.topn)):
+            items = []
+            for wet, sim_w in [(gram, 1)] + similar:
+                for topic, _, sim_t in syntactic_index.match(wet.replace('_', ' '), self.min_similarity):
+                    items.append({'topic': topic.replace(' ', '_'), 'sim_t': sim_t, 'wet': wet, 'sim_w': sim_w})
+            computed[gram] = items
+        self.overlay.update(computed)
+        self.computed += len(computed)
+        if self.overlay_path is not None:
+            with open(self.overlay_path, 'a') as f:
+                for gram, items in computed.items():
+                    f.write(json.dumps([gram, items]) + '\n')
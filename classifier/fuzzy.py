@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sub-linear fuzzy matching of n-grams against the CSO topics.
+
+The syntactic module keeps a topic when its Levenshtein ratio with an n-gram reaches the minimum similarity. The
+ratio is 1 - d / (len1 + len2), where d is the insertion/deletion distance between the two strings (the Levenshtein
+distance with substitutions counting as 2), which is a metric. Therefore:
+    (i) a topic can only match if d <= (1 - min_similarity) * (len1 + len2), which, together with the length bounds
+    of the syntactic index, gives a maximum distance for each n-gram;
+    (ii) when that maximum distance is 0, only the n-gram itself can match, which is a dictionary lookup;
+    (iii) otherwise, a BK-tree over the topics sharing the n-gram's first 4 characters returns the topics within the
+    maximum distance while visiting only part of them.
+The candidates are then checked with the same ratio as the brute-force comparison, so both return the same topics.
+"""
+
+import math
+
+from Levenshtein import ratio
+
+
+def distance(a, b):
+    """Function that returns the insertion/deletion distance between two strings.
+
+    It is derived from the ratio, which every version of python-Levenshtein computes from this distance: the
+    weights argument of Levenshtein.distance only exists from version 0.18 on.
+    """
+    size = len(a) + len(b)
+    return round((1 - ratio(a, b)) * size) if size else 0
+
+
+class BKTree:
+    """A Burkhard-Keller tree of labels under the insertion/deletion distance."""
+
+    def __init__(self):
+        # each node is [label, value, {distance: child node}]
+        self.root = None
+
+    def add(self, label, value):
+        """Function that adds a label, with an arbitrary value attached, to the tree."""
+        if self.root is None:
+            self.root = [label, value, {}]
+            return
+        node = self.root
+        while True:
+            d = distance(label, node[0])
+            if d in node[2]:
+                node = node[2][d]
+            else:
+                node[2][d] = [label, value, {}]
+                return
+
+    def search(self, label, radius):
+        """Function that returns the (label, value) pairs within a distance of radius from the given label."""
+        found = []
+        if self.root is None:
+            return found
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = distance(label, node[0])
+            if d <= radius:
+                found.append((node[0], node[1]))
+            low, high = d - radius, d + radius
+            stack.extend(child for edge, child in node[2].items() if low <= edge <= high)
+        return found
+
+
+class FuzzyMatcher:
+    """Index of the CSO topics that returns, for an n-gram, every topic whose ratio reaches a minimum similarity."""
+
+    def __init__(self, buckets):
+        """Function that builds the matcher.
+
+        Args:
+            buckets (dictionary): first 4 characters -> length -> list of (topic, primary label) tuples, as in
+            SyntacticIndex.
+        """
+        self.exact = {}
+        self.trees = {}
+        for stem, lengths in buckets.items():
+            tree = BKTree()
+            for topics in lengths.values():
+                for topic, primary_label in topics:
+                    self.exact[topic] = primary_label
+                    tree.add(topic, primary_label)
+            self.trees[stem] = tree
+
+    def match(self, gram, min_similarity):
+        """Function that returns the topics similar enough to an n-gram.
+
+        Args:
+            gram (string): the n-gram.
+            min_similarity (float): minimum Levenshtein similarity between the n-gram and the topics.
+
+        Returns:
+            matches (list): (topic, primary label, similarity) tuples.
+        """
+
+        tree = self.trees.get(gram[:4])
+        if tree is None:
+            return []
+        size = len(gram)
+        longest = math.ceil(size * (2 - min_similarity) / min_similarity) if min_similarity > 0 else math.inf
+        # distances are integers, the tolerance absorbs floating point errors: the ratio check below is what decides
+        radius = math.floor((1 - min_similarity) * (size + longest) + 1e-9)
+
+        if radius == 0:
+            # not even one edit is affordable, only the n-gram itself can match
+            m = ratio(gram, gram)
+            if gram in self.exact and m >= min_similarity:
+                return [(gram, self.exact[gram], m)]
+            return []
+
+        matches = []
+        for topic, primary_label in tree.search(gram, radius):
+            m = ratio(topic, gram)
+            if m >= min_similarity:
+                matches.append((topic, primary_label, m))
+        return matches
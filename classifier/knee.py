@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Selection of the number of topics kept by the semantic modules, at the knee of their decreasing scores.
+
+The semantic modules used to create one or two kneed.KneeLocator (version 0.3.1) per paper: first a concave one and,
+when it found no knee, a convex one. Each interpolates the scores, normalises them and looks for the local maxima of
+their difference curve with numpy and scipy, and the modules silenced its warnings with warnings.filterwarnings, for
+the whole process, at every paper. Scores are short, decreasing lists of integers, so this module follows the same
+steps on them directly: the interpolation of the scores at their own positions returns them unchanged, the normalised
+positions only depend on the number of scores, and every comparison and threshold of KneeLocator is kept, so the knee
+is the same. select_knees does the same for a batch of score lists with numpy, one array per length.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# When the knee is at most this position, the modules keep this many topics, or all those tied with the first one
+MIN_TOPICS = 5
+
+
+@lru_cache(maxsize=1024)
+def _positions(size):
+    """Function that returns the normalised positions of size scores and the mean of their differences, as
+    KneeLocator computes them."""
+    positions = np.linspace(1, size, size)
+    positions = (positions - min(positions)) / (max(positions) - min(positions))
+    return positions, np.diff(positions).mean()
+
+
+def find_knee(scores, curve='concave'):
+    """Function that returns the knee of decreasing scores, as kneed.KneeLocator(range(1, len(scores) + 1), scores,
+    curve=curve, direction='decreasing').knee.
+
+    Args:
+        scores (list): the scores, in decreasing order.
+        curve (string): either 'concave' or 'convex'.
+
+    Returns:
+        knee (integer): the position of the knee, starting from 1, or 0 if the difference curve has local maxima but
+        none of them is a knee. None if it has no local maxima.
+
+    Raises:
+        ValueError: if there are less than 2 scores, as KneeLocator does.
+    """
+
+    size = len(scores)
+    if size < 2:
+        raise ValueError('at least 2 scores are needed to find a knee')
+    highest, lowest = max(scores), min(scores)
+    if highest == lowest:
+        # the normalised scores are not defined, and neither are the local maxima
+        return None
+    positions, step = _positions(size)
+    span = float(highest - lowest)
+    difference = [(score - lowest) / span + float(position) for score, position in zip(scores, positions)]
+    if curve == 'convex':
+        difference = [1 - value for value in difference]
+
+    maxima = [i for i in range(1, size - 1) if difference[i - 1] < difference[i] > difference[i + 1]]
+    if not maxima:
+        return None
+    knee = 0
+    for i, maximum in enumerate(maxima):
+        following = maxima[i + 1] if i + 1 < len(maxima) else size
+        threshold = difference[maximum] - step
+        for j in range(maximum + 1, following):
+            if j < size - 1 and difference[j - 1] > difference[j] < difference[j + 1]:
+                # a local minimum resets the threshold
+                threshold = 0
+            if difference[j] < threshold or threshold < 0:
+                knee = maximum + 1
+    return knee
+
+
+def select_knee(scores):
+    """Function that returns how many topics the semantic modules keep, given their scores.
+
+    Args:
+        scores (list): the scores of the topics, in decreasing order.
+
+    Returns:
+        knee (integer): the number of topics to keep. It is the knee of the scores if it is after the 5th one.
+        Otherwise it is 5, or the number of topics tied with the first one if the first 5 are tied, and never more
+        than the number of topics.
+    """
+
+    knee = None
+    if len(scores) >= 2:
+        knee = find_knee(scores)
+        if knee is None:
+            knee = find_knee(scores, curve='convex')
+    return _fallback(knee or 0, scores)
+
+
+def _fallback(knee, scores):
+    if knee > MIN_TOPICS:
+        return knee
+    if len(scores) < MIN_TOPICS:
+        return len(scores)
+    if scores[0] == scores[MIN_TOPICS - 1]:
+        return sum(1 for score in scores if score == scores[0])
+    return MIN_TOPICS
+
+
+def select_knees(batch):
+    """Function that returns how many topics to keep for each list of scores of a batch, see select_knee().
+
+    The score lists of the same length are stacked into an array and processed together.
+
+    Args:
+        batch (list): lists of scores, each in decreasing order.
+
+    Returns:
+        knees (list): the number of topics to keep for each list of scores.
+    """
+
+    knees = [0] * len(batch)
+    by_size = {}
+    for i, scores in enumerate(batch):
+        if len(scores) >= 2:
+            by_size.setdefault(len(scores), []).append(i)
+    for size, rows in by_size.items():
+        scores = np.array([batch[i] for i in rows], dtype=np.float64)
+        concave = _find_knees(scores, 'concave')
+        convex = _find_knees(scores, 'convex')
+        for i, first, second in zip(rows, concave, convex):
+            knees[i] = int(first if first >= 0 else max(second, 0))
+    return [_fallback(knee, scores) for knee, scores in zip(knees, batch)]
+
+
+def _find_knees(scores, curve):
+    """Function that returns the knee of each row of an array of scores, see find_knee(), with -1 for None."""
+    rows, size = scores.shape
+    positions, step = _positions(size)
+    highest = scores.max(axis=1, keepdims=True)
+    lowest = scores.min(axis=1, keepdims=True)
+    span = np.where(highest > lowest, highest - lowest, 1)
+    difference = (scores - lowest) / span + positions
+    if curve == 'convex':
+        difference = 1 - difference
+
+    inner = difference[:, 1:-1]
+    maxima = np.zeros_like(difference, dtype=bool)
+    minima = np.zeros_like(difference, dtype=bool)
+    maxima[:, 1:-1] = (inner > difference[:, :-2]) & (inner > difference[:, 2:])
+    minima[:, 1:-1] = (inner < difference[:, :-2]) & (inner < difference[:, 2:])
+    maxima[(highest == lowest)[:, 0]] = False
+
+    # the last local maximum at or before each position, and whether a local minimum follows it up to the position
+    index = np.arange(size)
+    last_maximum = np.maximum.accumulate(np.where(maxima, index, -1), axis=1)
+    minima_seen = np.cumsum(minima, axis=1)
+    at_maximum = np.take_along_axis(minima_seen, np.maximum(last_maximum, 0), axis=1)
+    reset = minima_seen > at_maximum
+    threshold = np.take_along_axis(difference, np.maximum(last_maximum, 0), axis=1) - step
+    threshold = np.where(reset, 0, threshold)
+    declared = (last_maximum >= 0) & ~maxima & ((difference < threshold) | (threshold < 0))
+
+    knees = np.where(maxima.any(axis=1), 0, -1)
+    last_declared = np.where(declared, index, -1).max(axis=1)
+    found = last_declared >= 0
+    knees[found] = last_maximum[found, last_declared[found]] + 1
+    return knees
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Topics shared by the tokens of an n-gram, for the n-grams that are not in the cached model.
+
+When a bigram or trigram is not in the cached model, the semantic modules merge the topics of its tokens: a topic is
+kept if it occurs, over the lists of all the tokens, at least as many times as there are tokens, and the item of its
+last occurrence is returned. They used to rebuild the counts of every topic from the lists of the tokens at each
+occurrence of the n-gram. The merge index keeps, for each token, its topics with their number of occurrences and
+last item, so that the common case, distinct tokens whose lists do not repeat a topic, is the intersection of the
+topics of the tokens. The other cases are still counted, with the same result as before.
+"""
+
+from classifier.cache import LRUCache
+
+
+class MergeIndex:
+    """The topics of the tokens of the cached model, to merge them."""
+
+    def __init__(self, model, cache_size=100000):
+        """Function that initialises the index. The topics of a token are indexed when it is first merged.
+
+        Args:
+            model (dictionary): the cached model, i.e., token -> list of {"topic", "sim_t", "wet", "sim_w"}, or a
+            PrunedModel, whose items below its threshold are None.
+            cache_size (integer): how many tokens to keep the topics of. None keeps all of them.
+        """
+        self.model = model
+        self.profiles = LRUCache(cache_size)
+
+    def entries(self, token):
+        """Function that returns the (topic, item) pairs of a token, in the order of the model."""
+        if hasattr(self.model, 'merge_entries'):
+            return self.model.merge_entries(token)
+        return [(item["topic"], item) for item in self.model[token]] if token in self.model else []
+
+    def profile(self, token):
+        """Function that returns the topics of a token.
+
+        Args:
+            token (string): the token.
+
+        Returns:
+            topics (dictionary): topic -> (number of occurrences, last item), in order of first occurrence.
+            repeated (boolean): whether a topic occurs more than once.
+        """
+
+        result = self.profiles.get(token)
+        if result is None:
+            entries = self.entries(token)
+            topics = {}
+            for topic, item in entries:
+                count, _ = topics.get(topic, (0, None))
+                topics[topic] = (count + 1, item)
+            result = (topics, len(topics) < len(entries))
+            self.profiles.put(token, result)
+        return result
+
+    def shared(self, tokens):
+        """Function that merges the topics of the tokens of an n-gram.
+
+        Args:
+            tokens (tuple): the tokens of the n-gram.
+
+        Returns:
+            matches (list): the items of the topics occurring at least len(tokens) times over the lists of the tokens,
+            taken from their last occurrence and in order of first occurrence.
+        """
+
+        profiles = [self.profile(token) for token in tokens]
+        if len(set(tokens)) == len(tokens) and not any(repeated for _, repeated in profiles):
+            # each token counts a topic at most once: the topics are those of every token
+            first, *others = [topics for topics, _ in profiles]
+            last = profiles[-1][0]
+            return [last[topic][1] for topic in first if all(topic in topics for topics in others)]
+
+        counts = {}
+        items = {}
+        for topics, _ in profiles:
+            for topic, (count, item) in topics.items():
+                counts[topic] = counts.get(topic, 0) + count
+                items[topic] = item
+        return [items[topic] for topic, count in counts.items() if count >= len(tokens)]
@@ -9,26 +9,36 @@ This file mostly contains routines to deal with the Computer Science Ontology an
 """
 
 import csv as co
+import glob
 import json
 import os
 import pickle
+import re
 import sys
 from itertools import islice
 
 import networkx as nx
-import numpy as np
 import requests
 from hurry.filesize import size
 from webweb import Web
 
+from classifier.ancestors import AncestorIndex
+from classifier.embeddings import EmbeddingFallback, EmbeddingIndex
+from classifier.ontology import CompiledOntology, compile_ontology
+from classifier.tokenstore import TokenStore, build_token_store
+
 # some global variables
 dir = os.path.dirname(os.path.realpath(__file__))
 CSO_PATH = f"{dir}/models/cso.csv"
 CSO_PICKLE_PATH = f"{dir}/models/cso.p"
+CSO_COMPILED_PATH = f"{dir}/models/cso.bin"
 CSO_REMOTE_URL = "https://cso.kmi.open.ac.uk/download/cso.csv"
 MODEL_PICKLE_PATH = f"{dir}/models/model.p"
 MODEL_PICKLE_REMOTE_URL = "https://cso.kmi.open.ac.uk/download/model.p"
 CACHED_MODEL = f"{dir}/models/token-to-cso-combined.json"
+CACHED_MODEL_STORE = f"{dir}/models/token-to-cso-combined.bin"
+CACHED_MODEL_VERSION = f"{dir}/models/token-to-cso-combined-v{{}}.json"
+CACHED_MODEL_OVERLAY = f"{dir}/models/token-to-cso-overlay.jsonl"
 CACHED_MODEL_REMOTE_URL = "https://cso.kmi.open.ac.uk/download/token-to-cso-combined.json"
 
 
@@ -100,10 +110,43 @@ def load_cso():
 
 def load_token2cso_merger():
     # print("Loading Model to CSO Merger")
-    with open(CACHED_MODEL) as f:
+    with open(latest_cached_model()) as f:
         return json.load(f)
 
 
+def cached_model_version():
+    """Function that returns the latest version of the cached model built by classifier.cachebuilder.
+
+    Returns:
+        version (integer): the highest N of the token-to-cso-combined-vN.json files, or 0 if there are none.
+    """
+
+    versions = [re.fullmatch(r'token-to-cso-combined-v([0-9]+)\.json', os.path.basename(path))
+                for path in glob.glob(CACHED_MODEL_VERSION.format('*'))]
+    return max((int(version.group(1)) for version in versions if version), default=0)
+
+
+def latest_cached_model():
+    """Function that returns the file of the latest version of the cached model, the downloaded one if there is no
+    other version."""
+    version = cached_model_version()
+    return CACHED_MODEL_VERSION.format(version) if version else CACHED_MODEL
+
+
+def load_token2cso_store(cache_size=4096):
+    """Function that loads the cached model as a disk-backed token store.
+    Entries are decoded lazily, when a gram is looked up, and the most recently used ones are kept in memory.
+
+    Args:
+        cache_size (integer): how many decoded entries to keep in memory.
+
+    Returns:
+        fmodel (TokenStore): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
+    """
+    check_cached_model_store()
+    return TokenStore(CACHED_MODEL_STORE, cache_size=cache_size)
+
+
 def load_ontology_pickle():
     """Function that loads CSO. 
     This file has been serialised using Pickle allowing to be loaded quickly.
@@ -118,6 +161,20 @@ def load_ontology_pickle():
     return fcso
 
 
+def load_ontology_compiled():
+    """Function that loads the compiled version of CSO.
+    The file is memory-mapped rather than deserialised, so it is opened in milliseconds and shared by all processes.
+
+    Args:
+
+    Returns:
+        fcso (CompiledOntology): contains the CSO Ontology, with the same structure as the dictionary in cso.p.
+    """
+    check_compiled_ontology()
+    fcso = CompiledOntology(CSO_COMPILED_PATH)
+    return fcso
+
+
 def load_ontology_and_model():
     """Function that loads both CSO and Word2vec model. 
     Those two files have been serialised using Pickle allowing to be loaded quickly.
@@ -142,30 +199,48 @@ def load_ontology_and_model():
 
 def load_ontology_and_chached_model():
     """Function that loads both CSO and the cached Word2vec model. 
-    The ontology file has been serialised with Pickle. 
+    The ontology is the compiled, memory-mapped version of the pickle file (see load_ontology_compiled).
     The cached model is a json file (dictionary) containing all words in the corpus vocabulary with the corresponding CSO topics.
-    The latter has been created to speed up the process of retrieving CSO topics given a token in the metadata
+    The latter has been created to speed up the process of retrieving CSO topics given a token in the metadata.
+    It is loaded as a disk-backed token store (see load_token2cso_store).
     
 
     Args:
 
     Returns:
-        fcso (dictionary): contains the CSO Ontology.
-        fmodel (dictionary): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
+        fcso (CompiledOntology): contains the CSO Ontology.
+        fmodel (TokenStore): contains a cache of the model, i.e., each token is linked to the corresponding CSO topic.
     """
 
-    check_ontology()
-    check_cached_model()
-
-    fcso = pickle.load(open(CSO_PICKLE_PATH, "rb"))
-
-    with open(CACHED_MODEL) as f:
-        fmodel = json.load(f)
+    fcso = load_ontology_compiled()
+    fmodel = load_token2cso_store()
 
     print("Computer Science Ontology and cached model loaded.")
     return fcso, fmodel
 
 
+def load_embedding_fallback(cso, fmodel, overlay_path=CACHED_MODEL_OVERLAY):
+    """Function that extends the cached model with the Word2vec model, for the n-grams that the cached model does not
+    contain (see classifier.embeddings). The Word2vec model is loaded once and its vectors copied into a matrix.
+    The n-grams computed are appended to the overlay file, which is read again the next time.
+
+    Args:
+        cso (dictionary): contains the CSO Ontology.
+        fmodel (dictionary): contains the cached model.
+        overlay_path (string): file of the n-grams computed with the Word2vec model. None keeps them in memory only.
+
+    Returns:
+        fmodel (EmbeddingFallback): the cached model extended with the Word2vec model.
+    """
+
+    check_model()
+    with open(MODEL_PICKLE_PATH, "rb") as model_file:
+        index = EmbeddingIndex.from_model(pickle.load(model_file))
+
+    print("Word2vec model loaded as fallback of the cached model.")
+    return EmbeddingFallback(fmodel, index, cso, overlay_path=overlay_path)
+
+
 def check_ontology():
     """Function that checks if the ontology is available. 
     If not, it will check if a csv version exists and then it will create the pickle file.
@@ -186,6 +261,24 @@ def check_ontology():
             pickle.dump(cso, cso_file)
 
 
+def check_compiled_ontology():
+    """Function that checks if the compiled ontology is available and up to date.
+    If not, it will create it from the ontology pickle file.
+
+    """
+
+    check_ontology()
+
+    if not os.path.exists(CSO_COMPILED_PATH) or os.path.getmtime(CSO_COMPILED_PATH) < os.path.getmtime(CSO_PICKLE_PATH):
+        print("Compiled ontology file is missing or outdated.")
+
+        with open(CSO_PICKLE_PATH, 'rb') as cso_file:
+            cso = pickle.load(cso_file)
+
+        print("Creating compiled ontology file from", CSO_PICKLE_PATH)
+        compile_ontology(cso, CSO_COMPILED_PATH)
+
+
 def check_model():
     """Function that checks if the model is available. If not, it will attempt to download it from a remote location.
     Tipically hosted on the CSO Portal.
@@ -208,6 +301,21 @@ def check_cached_model():
         download_file(CACHED_MODEL_REMOTE_URL, CACHED_MODEL)
 
 
+def check_cached_model_store():
+    """Function that checks if the token store of the cached model is available and up to date.
+    If not, it will create it from the json file of the latest version of the cached model.
+
+    """
+
+    check_cached_model()
+    cached_model = latest_cached_model()
+
+    if not os.path.exists(CACHED_MODEL_STORE) or os.path.getmtime(CACHED_MODEL_STORE) < os.path.getmtime(cached_model):
+        print("Token store of the cached model is missing or outdated.")
+        print("Creating token store from", cached_model)
+        build_token_store(load_token2cso_merger(), CACHED_MODEL_STORE)
+
+
 def download_file(url, filename):
     """Function that downloads the model from the web.
 
@@ -262,6 +370,7 @@ def climb_ontology(cso, found_topics, climb_ont):
     """Function that climbs the ontology.
 
     This function might retrieve just the first broader topic or the whole branch up until root .
+    The broader topics are found with the ancestor index of the ontology, see classifier.ancestors.
 
     Args:
         found_topics (dictionary): It contains the topics found with string similarity.
@@ -272,36 +381,54 @@ def climb_ontology(cso, found_topics, climb_ont):
         found_topics (dictionary): containing the found topics with their similarity and the n-gram analysed.
     """
 
-    all_broaders = {}
-    inferred_topics = {}
-    num_narrower = 1
-
-    if climb_ont == 'first':
-        all_broaders = get_broader_of_topics(cso, found_topics, all_broaders)
-    elif climb_ont == 'all':
-        while True:
-            """
-            recursively adding new broaders based on the current list of topics. Broaders var increases each 
-            iteration. It stops when it does not change anymore.
-            """
-            all_broaders_back = all_broaders.copy()
-            all_broaders = get_broader_of_topics(cso, found_topics, all_broaders)
-            if all_broaders_back == all_broaders:  # no more broaders have been found
-                break
-    elif climb_ont == 'no':
-        return inferred_topics  # it is empty at this stage
-    else:
+    if climb_ont == 'no':
+        return {}
+    if climb_ont not in ('first', 'all'):
+        raise ValueError("Error: Field climb_ontology must be 'first', 'all' or 'no'")
+
+    # a search from the topics over the broader topics of the ontology, indexed once per process
+    return AncestorIndex.for_ontology(cso).climb(found_topics, climb_ont)
+
+
+def climb_ontology_batch(cso, found_topics_list, climb_ont):
+    """Function that climbs the ontology from the topics of many papers at once.
+    The broader topics of all the papers are found together, with sparse matrices, see AncestorIndex.climb_batch.
+
+    Args:
+        found_topics_list (list): the topics found in each paper.
+        cso (dictionary): the ontology previously loaded from the file.
+        climb_ont (string): either "first", "all" or "no", see climb_ontology.
+    Returns:
+        inferred_topics (list): for each paper, the broader topics found by climb_ontology, in the same order, each
+        with the list of its 'matched' counts.
+    """
+
+    if climb_ont == 'no':
+        return [{} for _ in found_topics_list]
+    if climb_ont not in ('first', 'all'):
         raise ValueError("Error: Field climb_ontology must be 'first', 'all' or 'no'")
 
-    for broader, narrower in all_broaders.items():
-        if len(narrower) >= num_narrower:
-            broader = get_primary_label(broader, cso['primary_labels'])
-            if broader not in inferred_topics:
-                inferred_topics[broader] = [{'matched': len(narrower), 'broader of': narrower}]
-            else:
-                inferred_topics[broader].append({'matched': len(narrower), 'broader of': narrower})
+    return AncestorIndex.for_ontology(cso).climb_batch(found_topics_list, climb_ont)
+
+
+def get_broader_topics_batch(cso, found_topics_list, climb_ont):
+    """Function that returns the broader topics found by climb_ontology for the topics of many papers at once, i.e.,
+    the keys of its result, without counting their matches.
 
-    return inferred_topics
+    Args:
+        found_topics_list (list): the topics found in each paper.
+        cso (dictionary): the ontology previously loaded from the file.
+        climb_ont (string): either "first", "all" or "no", see climb_ontology.
+    Returns:
+        broader_topics (list): for each paper, the list of the broader topics, in the order of climb_ontology.
+    """
+
+    if climb_ont == 'no':
+        return [[] for _ in found_topics_list]
+    if climb_ont not in ('first', 'all'):
+        raise ValueError("Error: Field climb_ontology must be 'first', 'all' or 'no'")
+
+    return AncestorIndex.for_ontology(cso).broader_topics_batch(found_topics_list, climb_ont)
 
 
 def get_broader_of_topics(cso, found_topics, all_broaders):
@@ -345,8 +472,31 @@ def chunks(data, size):
         yield {k: data[k] for k in islice(it, size)}
 
 
+def chunks_of_stream(pairs, size):
+    """Function that reads an iterable of (key, value) pairs in dictionaries of at most size items, without reading
+    ahead of the chunk being built.
+
+    Args:
+        pairs (iterable): the (key, value) pairs, e.g. (id, paper).
+        size (integer): maximum number of items of each chunk.
+
+    Yields:
+        chunk (dictionary): the next items.
+    """
+
+    it = iter(pairs)
+    while True:
+        chunk = dict(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def get_network(cso, found_topics):
     """Function that extracts the network from a given set of topics.
+    Each topic is linked to the found topics that are its nearest broaders, at the longest distance in the ontology,
+    see classifier.ancestors.
+
     Args:
         found_topics (list): It contains the list of identified topics.
         cso (dictionary): the ontology previously loaded from the file.
@@ -355,6 +505,36 @@ def get_network(cso, found_topics):
         network (dictionary): = {"nodes":nodes, "edges":edges} contains the list of nodes and edges of the extracetd network.
     """
 
+    return AncestorIndex.for_ontology(cso).network(get_ontology_topics(cso, found_topics))
+
+
+def get_networks(cso, found_topics_list):
+    """Function that extracts the network of each of many sets of topics, e.g., the topics of each paper of a corpus.
+    The longest distances between the topics and their broaders are computed once for all of them.
+
+    Args:
+        found_topics_list (list): the topics identified in each paper, see get_network.
+        cso (dictionary): the ontology previously loaded from the file.
+
+    Returns:
+        networks (list): the network of each set of topics, see get_network.
+    """
+
+    index = AncestorIndex.for_ontology(cso)
+    return [index.network(get_ontology_topics(cso, found_topics)) for found_topics in found_topics_list]
+
+
+def get_ontology_topics(cso, found_topics):
+    """Function that returns the identified topics that are in the ontology, reporting the others.
+
+    Args:
+        found_topics (list): It contains the list of identified topics, or a dictionary of lists of topics.
+        cso (dictionary): the ontology previously loaded from the file.
+
+    Returns:
+        topics (list): the topics in the ontology.
+    """
+
     if type(found_topics) is dict:
         list_of_topics = []
         for key, value in found_topics.items():
@@ -364,58 +544,13 @@ def get_network(cso, found_topics):
     elif type(found_topics) is list:
         list_of_topics = found_topics
 
-    from collections import deque
     topics = []
     for topic in list_of_topics:
         if topic in cso["topics"]:
             topics.append(topic)
         else:
             print("Asked to process '", topic, "', but I couldn't find it in the current version of the Ontology")
-
-    nodes = []
-    edges = []
-
-    nodes.append({"id": "paper", "label": "paper"})
-    t_id = 0
-    pos = {}
-    for topic in topics:
-        pos[topic] = t_id
-        pos[t_id] = topic
-        temp = {"id": "topic" + str(t_id), "label": topic}
-        nodes.append(temp)
-        t_id += 1
-
-    matrix = np.ones((len(topics), len(topics)), dtype=int) * 999
-    queue = deque()
-    for topic in topics:
-        queue.append({"t": topic, "d": 1})
-        while len(queue) > 0:
-            dequeued = queue.popleft()
-            if dequeued["t"] in cso["broaders"]:
-                broaders = cso["broaders"][dequeued["t"]]
-                for broader in broaders:
-                    if broader in pos:
-                        matrix[pos[topic]][pos[broader]] = dequeued["d"]
-                    queue.append({"t": broader, "d": dequeued["d"] + 1})
-
-    for topic in topics:
-        nearest_min = matrix[pos[topic]].min()
-        nearest_pos = np.where(matrix[pos[topic]] == nearest_min)[0]
-
-        if (nearest_min == 1):
-            for near in nearest_pos:
-                edge = {"id": "edge", "source": topic, "target": pos[near], "kind": "hard"}
-                edges.append(edge)
-        elif (nearest_min > 1 and nearest_min < 999):
-            for near in nearest_pos:
-                edge = {"id": "edge", "source": topic, "target": pos[near], "kind": "soft"}
-                edges.append(edge)
-        else:
-            edge = {"id": "edge", "source": topic, "target": "paper", "kind": "conn"}
-            edges.append(edge)
-
-    network = {"nodes": nodes, "edges": edges}
-    return network
+    return topics
 
 
 def plot_network(network):
@@ -493,7 +628,8 @@ def plot_network2(network):
 
 def get_coverage(cso, found_topics):
     """Function that for a given topics, it returns its coverage.
-    This coverage is computed based on how many its descendants have been identified.
+    This coverage is computed based on how many its descendants have been identified, from the ancestors of each
+    topic, see classifier.ancestors.
     
     Args:
         found_topics (list): It contains the list of identified topics.
@@ -503,53 +639,26 @@ def get_coverage(cso, found_topics):
         coverage (dictionary): = {"topic":percentage value} contains all found topics with their percentage of coverage.
     """
 
-    coverage = {}
+    return _coverage(AncestorIndex.for_ontology(cso), get_ontology_topics(cso, found_topics))
 
-    if type(found_topics) is dict:
-        list_of_topics = []
-        for key, value in found_topics.items():
-            list_of_topics += value
 
-        list_of_topics = list(set(list_of_topics))
-    elif type(found_topics) is list:
-        list_of_topics = found_topics
+def get_coverages(cso, found_topics_list):
+    """Function that returns the coverage of each of many sets of topics, e.g., the topics of each paper of a corpus.
 
-    t_id = 0
-    pos = {}
-    topics = []
-    for topic in list_of_topics:
-        if topic in cso["topics"]:
-            topics.append(topic)
-            pos[topic] = t_id
-            pos[t_id] = topic
-            t_id += 1
-        else:
-            print("Asked to process '", topic, "', but I couldn't find it in the current version of the Ontology")
+    Args:
+        found_topics_list (list): the topics identified in each paper, see get_coverage.
+        cso (dictionary): the ontology previously loaded from the file.
+
+    Returns:
+        coverages (list): the coverage of each set of topics, see get_coverage.
+    """
 
-    matrix = np.zeros((len(topics), len(topics)), dtype=int)
-    np.fill_diagonal(matrix, 1)
+    index = AncestorIndex.for_ontology(cso)
+    return [_coverage(index, get_ontology_topics(cso, found_topics)) for found_topics in found_topics_list]
 
-    from collections import deque
-    queue = deque()
-    for topic in topics:
-        queue.append(topic)
-        while len(queue) > 0:
-            dequeued = queue.popleft()
-            if dequeued in cso["broaders"]:
-                broaders = cso["broaders"][dequeued]
-                for broader in broaders:
-                    if broader in pos:
-                        matrix[pos[topic]][pos[broader]] = 1  # dequeued["d"]
-                    queue.append(broader)
-
-    dividend = len(topics)  # or np.sum(matrix)
-
-    if (dividend > 0):
-        general_coverage = np.sum(matrix, axis=0)
-
-        for topic in topics:
-            coverage[topic] = round(general_coverage[pos[topic]] / dividend, 3)
-    else:
-        print("I was about to perform a divide by zero operation")
 
-    return coverage
+def _coverage(index, topics):
+    if len(topics) == 0:
+        print("I was about to perform a divide by zero operation")
+        return {}
+    return index.coverage(topics)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read-only binary tables opened with mmap.
+
+A table file starts with a magic number and a small JSON header describing named arrays. Each array is stored
+little-endian and 8-byte aligned, so it can be exposed either as a numpy array or as a plain memoryview without
+copying anything into the Python heap. String tables are stored as a byte blob plus offsets, and come with an
+open-addressing hash index (crc32, linear probing) so that a string can be mapped to its id in O(1).
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'CSOTBL01'
+ALIGN = 8
+
+# numpy dtype -> memoryview typecode, for fast scalar access
+TYPECODES = {'<i4': 'i', '<i8': 'q', '|u1': 'B', '<f8': 'd'}
+
+
+def write_tables(path, kind, meta, arrays):
+    """Function that writes a set of named arrays to a table file. The file is written to a temporary location and
+    then moved in place, so readers never see a partially written file.
+
+    Args:
+        path (string): destination of the table file.
+        kind (string): what the file contains, e.g., "ontology". It is checked when the file is opened.
+        meta (dictionary): any JSON-serialisable metadata to keep in the header.
+        arrays (dictionary): name -> numpy array.
+    """
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        dtype = array.dtype.newbyteorder('<')
+        if dtype.str not in TYPECODES:
+            raise TypeError('Unsupported dtype for {}: {}'.format(name, dtype.str))
+        layout[name] = [offset, dtype.str, int(array.size)]
+        offset += _padded(array.nbytes)
+
+    header = json.dumps({'kind': kind, 'meta': meta, 'arrays': layout}).encode('utf-8')
+    data_start = _padded(len(MAGIC) + 8 + len(header))
+
+    tmp_path = '{}.tmp{}'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for name, array in arrays.items():
+            # written from the buffer of the array, without a copy, which matters for arrays mapped from a file
+            data = np.ascontiguousarray(array, dtype=layout[name][1])
+            f.write(data.data)
+            f.write(b'\0' * (_padded(data.nbytes) - data.nbytes))
+    os.replace(tmp_path, path)
+
+
+def _padded(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class MappedTables:
+    """A table file opened with mmap. Arrays are views on the mapped file: nothing is read until it is touched."""
+
+    def __init__(self, path, kind=None):
+        """Function that opens a table file.
+
+        Args:
+            path (string): location of the table file.
+            kind (string): if given, the kind the file is expected to contain.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a table file'.format(path))
+        header_size, = struct.unpack('<Q', self._mmap[len(MAGIC):len(MAGIC) + 8])
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_size].decode('utf-8'))
+        if kind is not None and header['kind'] != kind:
+            raise ValueError('{} contains "{}", expected "{}"'.format(path, header['kind'], kind))
+        self.kind = header['kind']
+        self.meta = header['meta']
+        self._layout = header['arrays']
+        self._data_start = _padded(header_start + header_size)
+        self._buffer = memoryview(self._mmap)
+
+    def __contains__(self, name):
+        return name in self._layout
+
+    def array(self, name):
+        """Function that returns a named array as a read-only numpy array backed by the mapped file."""
+        offset, dtype, count = self._layout[name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=self._data_start + offset)
+
+    def view(self, name):
+        """Function that returns a named array as a memoryview, which is faster than numpy for scalar access."""
+        offset, dtype, count = self._layout[name]
+        start = self._data_start + offset
+        size = np.dtype(dtype).itemsize
+        return self._buffer[start:start + count * size].cast(TYPECODES[dtype])
+
+
+def build_string_table(strings):
+    """Function that builds the arrays of a string table.
+
+    Args:
+        strings (list): unique strings, the position of each one is its id.
+
+    Returns:
+        arrays (dictionary): "offsets", "data" and "slots" arrays, see StringTable.
+    """
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype='<i8')
+    data = np.frombuffer(b''.join(encoded), dtype='|u1')
+
+    size = 1
+    while size < 2 * len(encoded):
+        size *= 2
+    mask = size - 1
+    slots = [-1] * size
+    for i, key in enumerate(encoded):
+        slot = zlib.crc32(key) & mask
+        while slots[slot] >= 0:
+            slot = (slot + 1) & mask
+        slots[slot] = i
+
+    return {'offsets': offsets, 'data': data, 'slots': np.array(slots, dtype='<i4')}
+
+
+class StringTable:
+    """Interned strings stored in a table file, addressable both by id and by value."""
+
+    def __init__(self, tables, prefix):
+        """Function that initialises a string table from the arrays named "<prefix>.offsets", "<prefix>.data" and
+        "<prefix>.slots".
+
+        Args:
+            tables (MappedTables): the opened table file.
+            prefix (string): the name of the string table.
+        """
+        self._offsets = tables.view(prefix + '.offsets')
+        self._data = tables.view(prefix + '.data')
+        self._slots = tables.view(prefix + '.slots')
+        self._mask = len(self._slots) - 1
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+    def find(self, string):
+        """Function that returns the id of a string, or -1 if the string is not in the table."""
+        key = string.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            i = self._slots[slot]
+            if i < 0:
+                return -1
+            if self._data[self._offsets[i]:self._offsets[i + 1]] == key:
+                return i
+            slot = (slot + 1) & self._mask
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled, memory-mappable version of the Computer Science Ontology.
+
+The pickled ontology (cso.p) turns every label and relationship into Python objects, so each process that loads it
+pays for building and holding millions of small strings and lists. The compiled format stores the same content as
+interned topic ids: a string table with all labels, one membership flag per label and mapping, and CSR-style
+adjacency arrays (indptr/indices) for the broader, narrower and same-as relationships. The file is opened with mmap,
+so loading it takes milliseconds and its pages are shared by every process on the machine.
+
+CompiledOntology offers a read-only mapping facade with the same keys and values as the dictionary returned by
+misc.load_cso(), so code written against cso['broaders'][topic], topic in cso['topics'] and the like keeps working.
+"""
+
+import hashlib
+from collections.abc import Mapping
+
+import numpy as np
+
+from classifier.mmapstore import MappedTables, StringTable, build_string_table, write_tables
+
+KIND = 'ontology'
+FORMAT_VERSION = 1
+
+# name -> kind of values, in the order of the dictionary returned by misc.load_cso()
+FIELDS = {
+    'topics': 'flag',
+    'broaders': 'list',
+    'narrowers': 'list',
+    'same_as': 'list',
+    'primary_labels': 'label',
+    'topics_wu': 'label',
+    'primary_labels_wu': 'label',
+}
+
+
+def compile_ontology(cso, path):
+    """Function that compiles the ontology into a memory-mappable file.
+
+    Args:
+        cso (dictionary): the ontology, as returned by misc.load_cso().
+        path (string): destination of the compiled file.
+    """
+
+    # Interning all labels. Topics go first so that their ids are compact.
+    ids = {}
+    for field in FIELDS:
+        for key, value in cso[field].items():
+            ids.setdefault(key, len(ids))
+            if FIELDS[field] == 'label':
+                ids.setdefault(value, len(ids))
+            elif FIELDS[field] == 'list':
+                for item in value:
+                    ids.setdefault(item, len(ids))
+
+    arrays = {}
+    for name, array in build_string_table(list(ids)).items():
+        arrays['strings.' + name] = array
+
+    for field, kind in FIELDS.items():
+        mapping = cso[field]
+        keys = np.array([ids[key] for key in mapping], dtype='<i4')
+        flags = np.zeros(len(ids), dtype='|u1')
+        flags[keys] = 1
+        arrays[field + '.keys'] = keys
+        arrays[field + '.flags'] = flags
+        if kind == 'label':
+            values = np.full(len(ids), -1, dtype='<i4')
+            values[keys] = [ids[value] for value in mapping.values()]
+            arrays[field + '.values'] = values
+        elif kind == 'list':
+            lengths = np.zeros(len(ids), dtype='<i8')
+            lengths[keys] = [len(value) for value in mapping.values()]
+            indptr = np.zeros(len(ids) + 1, dtype='<i8')
+            indptr[1:] = np.cumsum(lengths)
+            indices = np.zeros(indptr[-1], dtype='<i4')
+            for key, value in mapping.items():
+                start = indptr[ids[key]]
+                indices[start:start + len(value)] = [ids[item] for item in value]
+            arrays[field + '.indptr'] = indptr
+            arrays[field + '.indices'] = indices
+
+    fingerprint = hashlib.sha1()
+    for name, array in arrays.items():
+        fingerprint.update(name.encode('utf-8'))
+        fingerprint.update(np.ascontiguousarray(array).tobytes())
+
+    meta = {'version': FORMAT_VERSION, 'fingerprint': fingerprint.hexdigest()[:16], 'size': len(ids)}
+    write_tables(path, KIND, meta, arrays)
+
+
+class CompiledOntology(Mapping):
+    """The ontology opened from a compiled file.
+
+    It behaves like the dictionary returned by misc.load_cso(): cso['topics'], cso['broaders'], cso['narrowers'],
+    cso['same_as'], cso['primary_labels'], cso['topics_wu'] and cso['primary_labels_wu'] are read-only mappings with
+    the same keys and values. Values are built on access, so callers must not rely on mutating them.
+    """
+
+    def __init__(self, path):
+        """Function that opens a compiled ontology.
+
+        Args:
+            path (string): location of the file created with compile_ontology().
+        """
+        self.path = path
+        self.tables = MappedTables(path, kind=KIND)
+        if self.tables.meta['version'] != FORMAT_VERSION:
+            raise ValueError('{} has format version {}, expected {}'.format(path, self.tables.meta['version'],
+                                                                           FORMAT_VERSION))
+        self.fingerprint = self.tables.meta['fingerprint']
+        self.strings = StringTable(self.tables, 'strings')
+        self._fields = {}
+        for field, kind in FIELDS.items():
+            if kind == 'flag':
+                self._fields[field] = _FlagMapping(self, field)
+            elif kind == 'label':
+                self._fields[field] = _LabelMapping(self, field)
+            else:
+                self._fields[field] = _ListMapping(self, field)
+
+    def __reduce__(self):
+        # Processes receive the path and map the file themselves, instead of a copy of its content
+        return self.__class__, (self.path,)
+
+    def __getitem__(self, field):
+        return self._fields[field]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def find(self, label):
+        """Function that returns the id of a label, or -1 if the label does not appear in the ontology."""
+        if not isinstance(label, str):
+            return -1
+        return self.strings.find(label)
+
+    def label(self, i):
+        """Function that returns the label with the given id."""
+        return self.strings[i]
+
+    def array(self, name):
+        """Function that returns one of the raw arrays, e.g., "broaders.indptr", as a read-only numpy array."""
+        return self.tables.array(name)
+
+
+class _OntologyMapping(Mapping):
+    """Read-only view of one of the fields of a compiled ontology."""
+
+    def __init__(self, ontology, field):
+        self._ontology = ontology
+        self._strings = ontology.strings
+        self._keys = ontology.tables.view(field + '.keys')
+        self._flags = ontology.tables.view(field + '.flags')
+
+    def id_of(self, key):
+        """Function that returns the id of a key, or -1 if the key is not in this mapping."""
+        i = self._ontology.find(key)
+        if i < 0 or not self._flags[i]:
+            return -1
+        return i
+
+    def __contains__(self, key):
+        return self.id_of(key) >= 0
+
+    def __getitem__(self, key):
+        i = self.id_of(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._value(i)
+
+    def __iter__(self):
+        for i in self._keys:
+            yield self._strings[i]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _FlagMapping(_OntologyMapping):
+    """A mapping whose values are all True, e.g., cso['topics']."""
+
+    def _value(self, i):
+        return True
+
+
+class _LabelMapping(_OntologyMapping):
+    """A mapping from labels to labels, e.g., cso['primary_labels']."""
+
+    def __init__(self, ontology, field):
+        super().__init__(ontology, field)
+        self._values = ontology.tables.view(field + '.values')
+
+    def value_id(self, i):
+        """Function that returns the id of the value of the key with id i."""
+        return self._values[i]
+
+    def _value(self, i):
+        return self._strings[self._values[i]]
+
+
+class _ListMapping(_OntologyMapping):
+    """A mapping from labels to lists of labels, e.g., cso['broaders']."""
+
+    def __init__(self, ontology, field):
+        super().__init__(ontology, field)
+        self._indptr = ontology.tables.view(field + '.indptr')
+        self._indices = ontology.tables.view(field + '.indices')
+
+    def value_ids(self, i):
+        """Function that returns the ids of the values of the key with id i."""
+        return self._indices[self._indptr[i]:self._indptr[i + 1]]
+
+    def _value(self, i):
+        return [self._strings[j] for j in self.value_ids(i)]
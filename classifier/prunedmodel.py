@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+View of the cached model compiled for a minimum similarity.
+
+The semantic modules read the topics of each n-gram in the cached model and keep only those whose similarity is at
+least min_similarity and which are in the ontology, dropping most of them, for every paper. The pruned model does it
+once per threshold: each token keeps the items above the threshold, and only the topic of the others, which still
+count when the topics of several tokens are merged (see classifier.mergeindex). Topics that are not in the ontology
+are dropped, and the primary labels of the remaining ones are resolved. Every token of the cached model is kept, so
+that the n-grams that are in the model are still told from those whose tokens are merged.
+
+Pruned models of a token store and a compiled ontology are saved next to the token store, as a token store named after
+both fingerprints and the threshold, so they are compiled once per version of the model, of the ontology and
+threshold.
+"""
+
+import glob
+import os
+from collections.abc import Mapping
+
+from classifier.mergeindex import MergeIndex
+from classifier.tokenstore import TokenStore, build_token_store
+
+FORMAT_VERSION = 1
+
+# Key of the primary labels in a saved pruned model. Tokens never contain a NUL character
+PRIMARY_LABELS_KEY = '\0primary_labels'
+
+# Pruned model last returned by PrunedModel.for_model, by id of the model and the ontology, and by threshold
+_PRUNED = {}
+
+
+class PrunedModel(Mapping):
+    """The cached model, with only the topics above a minimum similarity. Maps each token to its matching items."""
+
+    def __init__(self, entries, primary_labels, min_similarity, fingerprint=None):
+        """Function that initialises the pruned model. Use build() or for_model() to create one.
+
+        Args:
+            entries (dictionary): token -> list of the items above the threshold and of the topics (as strings) of the
+            items below it, in the order of the cached model.
+            primary_labels (dictionary): primary label of each topic with items above the threshold and in a cluster.
+            min_similarity (float): the threshold.
+            fingerprint (string): fingerprints of the model and ontology the pruned model was compiled from, if known.
+        """
+        self.entries = entries
+        self.primary_labels = primary_labels
+        self.min_similarity = min_similarity
+        self.fingerprint = fingerprint
+        self.merge_index = MergeIndex(self)
+
+    @classmethod
+    def build(cls, model, cso, min_similarity):
+        """Function that compiles the pruned model of a cached model.
+
+        Args:
+            model (dictionary): the cached model, i.e., token -> list of {"topic", "sim_t", "wet", "sim_w"}.
+            cso (dictionary): the ontology.
+            min_similarity (float): minimum similarity between the tokens and the topics.
+
+        Returns:
+            pruned (PrunedModel): the pruned model.
+        """
+
+        entries = _PrunedEntries(model, cso, min_similarity)
+        pruned = {token: entries[token] for token in model}
+        return cls(pruned, entries.primary_labels(), min_similarity, fingerprint=cls.fingerprint_of(model, cso))
+
+    @classmethod
+    def for_model(cls, model, cso, min_similarity):
+        """Function that returns the pruned model of a cached model, compiling it only if needed.
+
+        The pruned model of the last model, ontology and threshold is kept in the process, see clear_cache. For a
+        token store and a compiled ontology, it is written next to the token store, replacing those of the previous
+        versions of either, and read from there, by this process and later ones.
+
+        Args:
+            model (dictionary): the cached model.
+            cso (dictionary): the ontology.
+            min_similarity (float): minimum similarity between the tokens and the topics.
+
+        Returns:
+            pruned (PrunedModel): the pruned model.
+        """
+
+        key = (id(model), id(cso), min_similarity)
+        if key in _PRUNED and _PRUNED[key][0] is model and _PRUNED[key][1] is cso:
+            return _PRUNED[key][2]
+
+        path = cls.path_for(model, cso, min_similarity)
+        if path is None:
+            pruned = cls.build(model, cso, min_similarity)
+        else:
+            if not os.path.exists(path):
+                # the entries are pruned and encoded one at a time as they are written (see build_token_store), and
+                # then read back from the file, so that they never all sit on the heap; only their tokens do
+                _save(_PrunedEntries(model, cso, min_similarity), path)
+                _remove_stale(path, cls.fingerprint_of(model, cso))
+            pruned = cls.load(path, min_similarity, cls.fingerprint_of(model, cso))
+
+        # only the pruned model of the last model, ontology and threshold is kept, so that the previous ones can be
+        # freed; the semantic modules keep their own
+        _PRUNED.clear()
+        _PRUNED[key] = (model, cso, pruned)
+        return pruned
+
+    @staticmethod
+    def clear_cache():
+        """Function that forgets the pruned model kept by for_model."""
+        _PRUNED.clear()
+
+    @staticmethod
+    def fingerprint_of(model, cso):
+        """Function that returns the fingerprints of a model and an ontology, or None if either has none."""
+        model_fingerprint = getattr(model, 'fingerprint', None)
+        cso_fingerprint = getattr(cso, 'fingerprint', None)
+        if model_fingerprint is None or cso_fingerprint is None:
+            return None
+        return '{}-{}'.format(model_fingerprint, cso_fingerprint)
+
+    @classmethod
+    def path_for(cls, model, cso, min_similarity):
+        """Function that returns where the pruned model of a model is saved, or None if it is not saved."""
+        fingerprint = cls.fingerprint_of(model, cso)
+        path = getattr(model, 'path', None)
+        if fingerprint is None or path is None:
+            return None
+        return os.path.join(os.path.dirname(path), 'token-to-cso-pruned-v{}-{}-{}.bin'.format(
+            FORMAT_VERSION, fingerprint, min_similarity))
+
+    @classmethod
+    def load(cls, path, min_similarity, fingerprint=None):
+        """Function that opens a pruned model saved with save(). Its entries are decoded when they are looked up."""
+        entries = TokenStore(path)
+        return cls(entries, entries[PRIMARY_LABELS_KEY], min_similarity, fingerprint)
+
+    def save(self, path):
+        """Function that saves the pruned model as a token store. The file is moved in place once written."""
+        _save(_SavedEntries(self.entries, self.primary_labels), path)
+
+    def __contains__(self, token):
+        return token in self.entries and token != PRIMARY_LABELS_KEY
+
+    def __getitem__(self, token):
+        return [item for item in self.entries[token] if not isinstance(item, str)]
+
+    def __iter__(self):
+        for token in self.entries:
+            if token != PRIMARY_LABELS_KEY:
+                yield token
+
+    def __len__(self):
+        return len(self.entries) - (PRIMARY_LABELS_KEY in self.entries)
+
+    def merge_entries(self, token):
+        """Function that returns the (topic, item) pairs of a token, where item is None below the threshold."""
+        if token not in self.entries:
+            return []
+        return [(item, None) if isinstance(item, str) else (item["topic"], item) for item in self.entries[token]]
+
+    def shared(self, tokens):
+        """Function that returns the items above the threshold of the topics shared by the tokens of an n-gram."""
+        return [item for item in self.merge_index.shared(tokens) if item is not None]
+
+
+class _SavedEntries(Mapping):
+    """The entries of a pruned model followed by its primary labels, as they are written in the token store."""
+
+    def __init__(self, entries, primary_labels):
+        self.entries = entries
+        self.primary_labels = primary_labels
+
+    def __getitem__(self, token):
+        return self.primary_labels if token == PRIMARY_LABELS_KEY else self.entries[token]
+
+    def __iter__(self):
+        yield from self.entries
+        yield PRIMARY_LABELS_KEY
+
+    def __len__(self):
+        return len(self.entries) + 1
+
+
+class _PrunedEntries(Mapping):
+    """The entries of a pruned model, pruned from the cached model when they are read, followed by its primary
+    labels, which are complete once all the entries have been read."""
+
+    def __init__(self, model, cso, min_similarity):
+        self.model = model
+        self.topics = cso['topics_wu']
+        self.all_primary_labels = cso['primary_labels_wu']
+        self.min_similarity = min_similarity
+        self.primary = {}
+
+    def __getitem__(self, token):
+        if token == PRIMARY_LABELS_KEY:
+            return self.primary_labels()
+        entry = []
+        for item in self.model[token]:
+            topic = item["topic"]
+            if topic not in self.topics:
+                continue
+            if item["sim_t"] >= self.min_similarity:
+                entry.append(item)
+                if topic not in self.primary:
+                    self.primary[topic] = self.all_primary_labels.get(topic, topic)
+            else:
+                entry.append(topic)
+        return entry
+
+    def primary_labels(self):
+        return {topic: label for topic, label in self.primary.items() if label != topic}
+
+    def __iter__(self):
+        yield from self.model
+        yield PRIMARY_LABELS_KEY
+
+    def __len__(self):
+        return len(self.model) + 1
+
+
+def _save(entries, path):
+    """Function that writes entries as a token store, moving the file in place once written."""
+    tmp_path = '{}.tmp{}'.format(path, os.getpid())
+    # build_token_store reads the values in the order of the keys, so the primary labels, last, are complete
+    build_token_store(entries, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale(path, fingerprint):
+    """Function that removes the pruned models saved next to path for other versions of the model or ontology."""
+    current = 'token-to-cso-pruned-v{}-{}-'.format(FORMAT_VERSION, fingerprint)
+    for stale in glob.glob(os.path.join(os.path.dirname(path), 'token-to-cso-pruned-v*.bin')):
+        if not os.path.basename(stale).startswith(current):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
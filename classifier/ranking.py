@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ranking of the topics found by the semantic module, for a batch of papers at once.
+
+For each paper, the semantic module keeps a dictionary per topic found, scores each topic as the number of its
+matches times the number of distinct n-grams matching it, raises the topics matched by an identical n-gram to the
+highest score of the paper, keeps the highest score of each primary label, and sorts the primary labels by decreasing
+score, the first found first among equal scores. RankingBatch does the same for many papers with numpy: the matches
+of each distinct n-gram are numbered once, the occurrences of the n-grams in the papers are expanded into arrays of
+(paper, topic) pairs, and their counts, scores, maxima and order are computed in bulk.
+"""
+
+import numpy as np
+
+
+class RankingBatch:
+    """The matches of the n-grams of a batch of papers, to rank their topics together."""
+
+    def __init__(self, size):
+        """Function that initialises the batch.
+
+        Args:
+            size (integer): number of papers of the batch.
+        """
+        self.size = size
+        self.topic_ids = {}
+        self.gram_ids = {}
+        # topics, identical flags and n-gram of the matches of each key, see add_matches
+        self.key_topics = []
+        self.key_syntactic = []
+        self.key_grams = []
+        self.key_offsets = [0]
+        # occurrences of the keys in the papers
+        self.papers = []
+        self.keys = []
+
+    def add_matches(self, gram, matches):
+        """Function that numbers the matches of an n-gram.
+
+        Args:
+            gram (string): the n-gram the matches are reported under.
+            matches (list): (topic, syntactic) tuples, where syntactic is True if the n-gram is identical to the
+            topic, i.e., if its sim_w is 1.
+
+        Returns:
+            key (integer): the key of the matches, for add(), or None if there are no matches.
+        """
+
+        if not matches:
+            return None
+        for topic, syntactic in matches:
+            self.key_topics.append(self.topic_ids.setdefault(topic, len(self.topic_ids)))
+            self.key_syntactic.append(syntactic)
+        self.key_grams.append(self.gram_ids.setdefault(gram, len(self.gram_ids)))
+        self.key_offsets.append(len(self.key_topics))
+        return len(self.key_grams) - 1
+
+    def add(self, paper, key):
+        """Function that records the matches of an n-gram, numbered by add_matches, as found in a paper."""
+        self.papers.append(paper)
+        self.keys.append(key)
+
+    def rank(self, primary_label):
+        """Function that ranks the topics of each paper, as CSOClassifierSemantic.rank_concepts does.
+
+        Args:
+            primary_label (function): returns the primary label of a topic.
+
+        Returns:
+            rankings (list): for each paper, the (primary label, score) tuples of its topics, by decreasing score.
+        """
+
+        if not self.papers:
+            return [[] for _ in range(self.size)]
+        n_topics, n_grams = len(self.topic_ids), len(self.gram_ids)
+
+        # one entry per match, in the order they were found
+        offsets = np.array(self.key_offsets, dtype=np.int64)
+        keys = np.array(self.keys, dtype=np.int64)
+        lengths = offsets[keys + 1] - offsets[keys]
+        starts = np.repeat(offsets[keys] - np.cumsum(lengths) + lengths, lengths)
+        positions = starts + np.arange(len(starts))
+        topics = np.array(self.key_topics, dtype=np.int64)[positions]
+        syntactic = np.array(self.key_syntactic, dtype=bool)[positions]
+        papers = np.repeat(np.array(self.papers, dtype=np.int64), lengths)
+        grams = np.repeat(np.array(self.key_grams, dtype=np.int64)[keys], lengths)
+
+        # (paper, topic) pairs, with the position of their first match
+        pairs, first, pair_of_match = np.unique(papers * n_topics + topics, return_index=True, return_inverse=True)
+        pair_of_match = pair_of_match.reshape(-1)
+        times = np.bincount(pair_of_match, minlength=len(pairs))
+        distinct_grams = np.bincount(np.unique(pair_of_match * n_grams + grams) // n_grams, minlength=len(pairs))
+        identical = np.bincount(pair_of_match, weights=syntactic, minlength=len(pairs)) > 0
+        pair_paper = pairs // n_topics
+
+        scores = times * distinct_grams
+        highest = np.zeros(self.size, dtype=np.int64)
+        np.maximum.at(highest, pair_paper, scores)
+        scores = np.where(identical, highest[pair_paper], scores)
+
+        # highest score of each primary label, which ranks where its first topic was found
+        label_ids = {}
+        topic_labels = np.array([label_ids.setdefault(primary_label(topic), len(label_ids))
+                                 for topic in self.topic_ids], dtype=np.int64)
+        labels = list(label_ids)
+        pair_label = topic_labels[pairs % n_topics]
+        paper_labels, label_of_pair = np.unique(pair_paper * len(labels) + pair_label, return_inverse=True)
+        label_of_pair = label_of_pair.reshape(-1)
+        label_scores = np.zeros(len(paper_labels), dtype=np.int64)
+        np.maximum.at(label_scores, label_of_pair, scores)
+        label_first = np.full(len(paper_labels), len(papers), dtype=np.int64)
+        np.minimum.at(label_first, label_of_pair, first)
+
+        label_paper = paper_labels // len(labels)
+        order = np.lexsort((label_first, -label_scores, label_paper))
+        ends = np.cumsum(np.bincount(label_paper, minlength=self.size)).tolist()
+        ranked_labels = (paper_labels[order] % len(labels)).tolist()
+        ranked_scores = label_scores[order].tolist()
+        rankings = []
+        start = 0
+        for end in ends:
+            rankings.append([(labels[label], score) for label, score in
+                             zip(ranked_labels[start:end], ranked_scores[start:end])])
+            start = end
+        return rankings
+
+
+def rank_batch(matches, primary_label):
+    """Function that ranks the topics found in a batch of papers, see RankingBatch.
+
+    Args:
+        matches (list): for each paper, the (gram, topic, syntactic) tuple of each of its matches, in the order they
+        were found.
+        primary_label (function): returns the primary label of a topic.
+
+    Returns:
+        rankings (list): for each paper, the (primary label, score) tuples of its topics, by decreasing score.
+    """
+
+    batch = RankingBatch(len(matches))
+    for paper, paper_matches in enumerate(matches):
+        for gram, topic, syntactic in paper_matches:
+            batch.add(paper, batch.add_matches(gram, [(topic, syntactic)]))
+    return batch.rank(primary_label)
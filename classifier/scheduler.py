@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scheduling of the papers of a batch on the workers, by their estimated cost.
+
+Splitting the papers by count gives each worker the same number of papers, but the length of the abstracts varies by
+orders of magnitude, and so does the time it takes to classify them: a worker that gets most of the long papers keeps
+the others idle at the end of the batch. The cost of a paper is estimated from the length of its text and the number
+of its n-grams, the papers are packed into work units of about the same cost, and the units are handed out to the
+workers as they become free, the most expensive first. Utilization measures how long each worker was busy during the
+batch.
+"""
+
+import heapq
+import os
+import time
+
+from classifier.document import paper_text
+
+# Cost of a paper regardless of its length (spaCy call, ranking and enhancement), in n-grams
+PAPER_COST = 50
+
+# Cost of a character of text (tokenization and tagging), in n-grams
+CHARACTER_COST = 0.1
+
+
+def paper_cost(paper):
+    """Function that estimates the time it takes to classify a paper, from the length of its text and the number of
+    its n-grams.
+
+    Args:
+        paper (either string or dictionary): the full text of the paper or a dictionary {"title": "","abstract":
+        "","keywords": ""}.
+
+    Returns:
+        cost (float): the estimated cost, in n-grams matched.
+    """
+
+    text = paper_text(paper) if paper else ''
+    words = len(text.split())
+    # the 1-, 2- and 3-grams of the syntactic module, also an upper bound for those of the concepts
+    grams = sum(max(0, words - n + 1) for n in range(1, 4))
+    return PAPER_COST + CHARACTER_COST * len(text) + grams
+
+
+def pack(papers, units, cost=paper_cost):
+    """Function that packs papers into work units of about the same cost.
+
+    Each paper, from the most expensive, goes to the unit with the lowest cost so far. A paper that costs more than
+    the average unit gets a unit of its own.
+
+    Args:
+        papers (dictionary): the papers, by id.
+        units (integer): number of work units.
+        cost (function): estimates the cost of a paper.
+
+    Returns:
+        units (list): (cost, papers) for each non-empty unit, by decreasing cost, with the papers of each unit in
+        their original order.
+    """
+
+    costs = {paper_id: cost(paper) for paper_id, paper in papers.items()}
+    heap = [(0, unit, []) for unit in range(max(1, min(units, len(papers))))]
+    for paper_id in sorted(costs, key=costs.get, reverse=True):
+        unit_cost, unit, paper_ids = heapq.heappop(heap)
+        paper_ids.append(paper_id)
+        heapq.heappush(heap, (unit_cost + costs[paper_id], unit, paper_ids))
+
+    order = {paper_id: position for position, paper_id in enumerate(papers)}
+    packed = [(unit_cost, {paper_id: papers[paper_id] for paper_id in sorted(paper_ids, key=order.get)})
+              for unit_cost, _, paper_ids in heap if paper_ids]
+    packed.sort(key=lambda unit: unit[0], reverse=True)
+    return packed
+
+
+def run_unit(function, unit):
+    """Function that applies a function to the papers of a unit, measuring the worker time it takes.
+
+    Args:
+        function (function): takes the papers of the unit.
+        unit (tuple): (cost, papers), see pack.
+
+    Returns:
+        result: what the function returns.
+        stats (tuple): (process id, start, end, cost, number of papers), for Utilization.
+    """
+
+    cost, papers = unit
+    start = time.monotonic()
+    result = function(papers)
+    return result, (os.getpid(), start, time.monotonic(), cost, len(papers))
+
+
+class Utilization:
+    """Utilization of the workers during a batch, from the statistics of its units (see run_unit)."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.end = self.start
+        self.workers = {}
+
+    def add(self, stats):
+        """Function that records the statistics of a unit.
+
+        Args:
+            stats (tuple): (process id, start, end, cost, number of papers), see run_unit.
+        """
+
+        pid, start, end, cost, papers = stats
+        worker = self.workers.setdefault(pid, {'units': 0, 'papers': 0, 'cost': 0, 'busy': 0.0, 'last': start})
+        worker['units'] += 1
+        worker['papers'] += papers
+        worker['cost'] += cost
+        worker['busy'] += end - start
+        worker['last'] = max(worker['last'], end)
+
+    def finish(self):
+        """Function that ends the batch.
+
+        Returns:
+            utilization (Utilization): itself.
+        """
+
+        self.end = time.monotonic()
+        return self
+
+    def stats(self):
+        """Function that returns the utilization of each worker.
+
+        Returns:
+            stats (dictionary): {"elapsed": seconds, "workers": [...]}, with for each worker the number of units,
+            papers and their estimated cost, the busy seconds, the share of the batch it was busy ("utilization") and
+            the seconds it stayed idle at the end of the batch ("tail").
+        """
+
+        elapsed = self.end - self.start
+        workers = []
+        for pid, worker in sorted(self.workers.items()):
+            workers.append({'pid': pid, 'units': worker['units'], 'papers': worker['papers'],
+                            'cost': round(worker['cost']), 'busy': round(worker['busy'], 3),
+                            'utilization': round(worker['busy'] / elapsed, 3) if elapsed > 0 else 1.0,
+                            'tail': round(max(0.0, self.end - worker['last']), 3)})
+        return {'elapsed': round(elapsed, 3), 'workers': workers}
+
+    def report(self):
+        """Function that formats the utilization of each worker, one per line.
+
+        Returns:
+            report (string): the report.
+        """
+
+        stats = self.stats()
+        lines = ['{:>8} {:>6} {:>7} {:>10} {:>8} {:>6} {:>7}'.format('pid', 'units', 'papers', 'cost', 'busy', 'util',
+                                                                      'tail')]
+        for worker in stats['workers']:
+            lines.append('{pid:>8} {units:>6} {papers:>7} {cost:>10} {busy:>8.3f} {utilization:>6.1%} '
+                         '{tail:>7.3f}'.format(**worker))
+        lines.append('elapsed {:.3f} s'.format(stats['elapsed']))
+        return '\n'.join(lines)
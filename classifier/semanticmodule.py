@@ -7,14 +7,20 @@ Created on Thu Nov 22 11:38:18 2018
 """
 import logging
 import os
-import re
-import warnings
+from collections import Counter
 
-import nltk
 import spacy
-from kneed import KneeLocator
 from nltk import everygrams
 
+from classifier import chunker
+from classifier.cache import LRUCache
+from classifier.document import AnalyzedDocument, analyze_texts, paper_text
+from classifier.embeddings import EmbeddingFallback
+from classifier.knee import select_knee, select_knees
+from classifier.mergeindex import MergeIndex
+from classifier.prunedmodel import PrunedModel
+from classifier.ranking import RankingBatch
+
 logger = logging.getLogger(__name__)
 log_level = os.getenv('LOG_LEVEL', 'DEBUG')
 logger.setLevel(getattr(logging, log_level))
@@ -22,14 +28,18 @@ logger.setLevel(getattr(logging, log_level))
 
 class CSOClassifierSemantic:
 
-    def __init__(self, model=None, cso=None, paper=None):
+    def __init__(self, model=None, cso=None, paper=None, cache_size=100000, nlp=None, count_misses=False):
         """Function that initialises an object of class CSOClassifierSemantic and all its members.
 
         Args:
-            model (dictionary): word2vec model.
+            model (dictionary): word2vec model, i.e., the cached model, or an EmbeddingFallback extending it.
             cso (dictionary): Computer Science Ontology
             paper (dictionary): paper{"title":"...","abstract":"...","keywords":"..."} the paper.
-
+            cache_size (integer): how many n-grams to keep the matches of, across papers. None keeps all of them,
+            0 disables the cache.
+            nlp (Language): spaCy pipeline used to tag the papers. If None, en_core_web_sm is loaded without its
+            parser and named entity recognizer, as only the POS tags are used.
+            count_misses (boolean): whether to count the n-grams missing from the cached model, see top_misses.
 
         """
 
@@ -44,7 +54,16 @@ class CSOClassifierSemantic:
             self.set_paper(paper)  # Initialises the paper
         self.ngrammerger = model  # contains the cached model
         self.merge_bigrams = True  # Allows to combine the topics of mutiple tokens, when analysing 2-grams or 3-grams
-        self.nlp = spacy.load('en_core_web_sm')
+        self.min_similarity = 0.94  # minimum similarity between the n-grams and the topics of the model
+        self.cache = LRUCache(cache_size)  # matches of the n-grams, by n-gram and thresholds
+        self.merge_index = MergeIndex(model)  # topics of the tokens, to merge the n-grams that are not in the model
+        # Reads the model through its view pruned for min_similarity, see PrunedModel. The view only covers the
+        # cached model, not the n-grams computed by a fallback to the word2vec model
+        self.prune_model = not isinstance(model, EmbeddingFallback)
+        self.pruned_models = {}  # pruned views of the model, by threshold, see get_pruned_model
+        # occurrences of the n-grams missing from the cached model, see top_misses. None when they are not counted
+        self.misses = Counter() if count_misses else None
+        self.nlp = spacy.load('en_core_web_sm', disable=['parser', 'ner']) if nlp is None else nlp
 
 
     def set_paper(self, paper):
@@ -66,9 +85,10 @@ class CSOClassifierSemantic:
             self.paper = '. '.join((text for text in field_text if text))
         else:
             raise TypeError('Pass paper as a string or dict that maps "title", "abstract", and "keywords" to strings')
-        assert self.paper, 'No paper text found: {}'.format(paper)
+        if not self.paper:
+            raise ValueError('Error: No paper text found: {}'.format(paper))
 
-    def classify_semantic(self):
+    def classify_semantic(self, document=None):
         """Function that classifies the paper on a semantic level. This semantic module follows four steps: 
             (i) entity extraction, 
             (ii) CSO concept identification, 
@@ -76,7 +96,8 @@ class CSOClassifierSemantic:
             (iv) concept selection.
 
         Args:
-            processed_embeddings (dictionary): This dictionary saves the matches between word embeddings and terms in CSO. It is useful when processing in batch mode.
+            document (AnalyzedDocument): the paper already analysed, shared with the syntactic module. If None, the
+            paper set with set_paper is analysed.
 
         Returns:
             final_topics (list): list of identified topics.
@@ -84,30 +105,107 @@ class CSOClassifierSemantic:
 
         ##################### Tokenizer with spaCy.io
 
-        doc = self.nlp(self.paper)
-        pos_tags = [(token.text, token.tag_) for token in doc if token.tag_]
+        if document is None:
+            document = AnalyzedDocument(self.paper, self.nlp)
+
+        return self.classify_concepts(self.extract_concepts(document))
+
+    def classify_semantic_batch(self, papers, batch_size=64):
+        """Function that classifies several papers on a semantic level, tagging them with spaCy in batches.
+
+        Args:
+            papers (iterable): the papers, either strings or dictionaries {"title": "","abstract": "","keywords": ""}.
+            batch_size (integer): number of papers sent to spaCy at once.
+
+        Returns:
+            topics (list): for each paper, the list of identified topics. See classify_semantic.
+        """
+
+        texts = (paper_text(paper) for paper in papers)
+        return self.classify_concepts_batch([self.extract_concepts(document)
+                                             for document in analyze_texts(texts, self.nlp, batch_size)])
+
+    def extract_concepts(self, document):
+        """Function that extracts the concepts of a paper, i.e., its adjective-noun and noun spans.
 
-        ##################### Applying grammar
+        Args:
+            document (AnalyzedDocument): the analysed paper.
+
+        Returns:
+            concepts (list): the concepts, as lowercase strings.
+        """
 
         # Find adjective-noun or noun spans: JJ.* matches JJ, JJR, and JJS; NN.* matches NN, NNP, NNS
-        GRAMMAR = "DBW_CONCEPT: {<JJ.*>*<NN.*>+}"
-        grammar_parser = nltk.RegexpParser(GRAMMAR)
-
-        pos_tags_with_grammar = grammar_parser.parse(pos_tags)
-        concepts = []
-        for node in pos_tags_with_grammar:
-            if isinstance(node, nltk.tree.Tree) and node.label() == 'DBW_CONCEPT':  # if matches our grammar
-                concept = ''
-                for leaf in node.leaves():
-                    # leaf is an (orth, POS) pair
-                    concept_chunk = leaf[0]
-                    concept_chunk = re.sub('[\=\,\…\’\'\+\-\–\“\”\"\/\‘\[\]\®\™\%]', ' ', concept_chunk)
-                    concept_chunk = re.sub('\.$|^\.', '', concept_chunk)
-                    concept_chunk = concept_chunk.lower().strip()
-                    concept += ' ' + concept_chunk
-                concept = re.sub('\.+', '.', concept)
-                concept = re.sub('\s+', ' ', concept)
-                concepts.append(concept)
+        return chunker.extract_concepts(document.tagged)
+
+    def classify_concepts(self, concepts):
+        """Function that identifies, ranks and selects the topics of the concepts extracted from a paper.
+
+        Args:
+            concepts (list): the concepts of the paper, see extract_concepts.
+
+        Returns:
+            final_topics (list): list of identified topics.
+        """
+
+        sort_t = self.rank_concepts(concepts)
+
+        ##################### Pruning
+
+        # the topics up to the knee of the scores, or the top 5, see classifier.knee
+        knee = select_knee([score for _, score in sort_t])
+        return [self.cso["topics_wu"][topic] for topic, _ in sort_t[:knee]]
+
+    def classify_concepts_batch(self, concepts_batch):
+        """Function that identifies, ranks and selects the topics of the concepts of several papers. The topics of all
+        the papers are ranked together, see classifier.ranking.
+
+        Args:
+            concepts_batch (list): for each paper, its concepts, see extract_concepts.
+
+        Returns:
+            topics (list): for each paper, the list of identified topics. See classify_concepts.
+        """
+
+        min_similarity = self.min_similarity
+        if isinstance(self.ngrammerger, EmbeddingFallback):
+            # the n-grams missing from the cached model are computed together
+            self.ngrammerger.compute("_".join(grams) for concepts in concepts_batch for concept in concepts
+                                     for grams in everygrams(concept.split(), 1, 3))
+        batch = RankingBatch(len(concepts_batch))
+        keys = {}  # key of the matches of each n-gram of the batch
+        missing = set()  # n-grams of the batch missing from the cached model, if they are counted
+        count_misses = self.misses is not None
+        for paper, concepts in enumerate(concepts_batch):
+            for concept in concepts:
+                for grams in everygrams(concept.split(), 1, 3):
+                    if grams in keys:
+                        key = keys[grams]
+                    else:
+                        gram, list_of_matched_topics, is_missing = self.lookup_gram(grams, min_similarity)
+                        key = keys[grams] = batch.add_matches(gram, [(topic_item["topic"], topic_item["sim_w"] == 1)
+                                                                     for topic_item in list_of_matched_topics])
+                        if is_missing and count_misses:
+                            missing.add(grams)
+                    if count_misses and grams in missing:
+                        self.misses["_".join(grams)] += 1
+                    if key is not None:
+                        batch.add(paper, key)
+
+        primary_labels = self.get_primary_labels(min_similarity)
+        rankings = batch.rank(lambda topic: self.get_primary_label(topic, primary_labels))
+        knees = select_knees([[score for _, score in sort_t] for sort_t in rankings])
+        return [[self.cso["topics_wu"][topic] for topic, _ in sort_t[:knee]] for sort_t, knee in zip(rankings, knees)]
+
+    def rank_concepts(self, concepts):
+        """Function that identifies and ranks the topics of the concepts extracted from a paper.
+
+        Args:
+            concepts (list): the concepts of the paper, see extract_concepts.
+
+        Returns:
+            sort_t (list): (topic, score) tuples of the primary labels of the identified topics, by decreasing score.
+        """
 
         ##################### Core analysis
 
@@ -115,39 +213,16 @@ class CSOClassifierSemantic:
         found_topics = {}  # to store the matched topics
         successful_grams = {}  # to store the successful grams
 
-        min_similarity = 0.94  #
+        min_similarity = self.min_similarity
 
         # finding matches
         for concept in concepts:
             evgrams = everygrams(concept.split(), 1, 3)  # list of unigrams, bigrams, trigrams
             for grams in evgrams:
-                gram = "_".join(grams)
-
-                #### Finding similar words contained in the model
-
-                list_of_matched_topics = []
-
-                if gram in self.ngrammerger:
-                    list_of_matched_topics = self.ngrammerger[gram]
-
-                else:
-
-                    if len(grams) > 1 and self.merge_bigrams:
-                        temp_list_of_matches = {}
-                        list_of_merged_topics = {}
-                        for gram in grams:
-                            if gram in self.ngrammerger:
-                                list_of_matched_topics_t = self.ngrammerger[gram]
-                                for topic_item in list_of_matched_topics_t:
-                                    temp_list_of_matches[topic_item["topic"]] = topic_item
-                                    try:
-                                        list_of_merged_topics[topic_item["topic"]] += 1
-                                    except KeyError:
-                                        list_of_merged_topics[topic_item["topic"]] = 1
-
-                        for topic_x, value in list_of_merged_topics.items():
-                            if value >= len(grams):
-                                list_of_matched_topics.append(temp_list_of_matches[topic_x])
+                # matches of the n-gram in the model above the thresholds, kept in the cache across papers
+                gram, list_of_matched_topics, missing = self.lookup_gram(grams, min_similarity)
+                if missing and self.misses is not None:
+                    self.misses["_".join(grams)] += 1
 
                 for topic_item in list_of_matched_topics:
 
@@ -156,42 +231,40 @@ class CSOClassifierSemantic:
                     wet = topic_item["wet"]
                     sim = topic_item["sim_w"]
 
-                    if m >= min_similarity and topic in self.cso["topics_wu"]:
-
-                        if topic in found_topics:
-                            # tracking this match
-                            found_topics[topic]["times"] += 1
+                    if topic in found_topics:
+                        # tracking this match
+                        found_topics[topic]["times"] += 1
 
-                            found_topics[topic]["gram_similarity"].append(sim)
+                        found_topics[topic]["gram_similarity"].append(sim)
 
-                            # tracking the matched gram
-                            if gram in found_topics[topic]["grams"]:
-                                found_topics[topic]["grams"][gram] += 1
-                            else:
-                                found_topics[topic]["grams"][gram] = 1
+                        # tracking the matched gram
+                        if gram in found_topics[topic]["grams"]:
+                            found_topics[topic]["grams"][gram] += 1
+                        else:
+                            found_topics[topic]["grams"][gram] = 1
 
-                            # tracking the most similar gram to the topic
-                            if m > found_topics[topic]["embedding_similarity"]:
-                                found_topics[topic]["embedding_similarity"] = m
-                                found_topics[topic]["embedding_matched"] = wet
+                        # tracking the most similar gram to the topic
+                        if m > found_topics[topic]["embedding_similarity"]:
+                            found_topics[topic]["embedding_similarity"] = m
+                            found_topics[topic]["embedding_matched"] = wet
 
-                        else:
-                            # creating new topic in the result set
-                            found_topics[topic] = {'grams': {gram: 1},
-                                                   'embedding_matched': wet,
-                                                   'embedding_similarity': m,
-                                                   'gram_similarity': [sim],
-                                                   'times': 1,
-                                                   'topic': topic}
-
-                        if sim == 1:
-                            found_topics[topic]["syntactic"] = True
-
-                        # reporting successful grams: it is the inverse of found_topics["topic"]["grams"]
-                        if gram in successful_grams:
-                            successful_grams[gram].append(topic)
-                        else:
-                            successful_grams[gram] = [topic]
+                    else:
+                        # creating new topic in the result set
+                        found_topics[topic] = {'grams': {gram: 1},
+                                               'embedding_matched': wet,
+                                               'embedding_similarity': m,
+                                               'gram_similarity': [sim],
+                                               'times': 1,
+                                               'topic': topic}
+
+                    if sim == 1:
+                        found_topics[topic]["syntactic"] = True
+
+                    # reporting successful grams: it is the inverse of found_topics["topic"]["grams"]
+                    if gram in successful_grams:
+                        successful_grams[gram].append(topic)
+                    else:
+                        successful_grams[gram] = [topic]
 
         ##################### Ranking
 
@@ -209,8 +282,9 @@ class CSOClassifierSemantic:
 
         # Selection of unique topics  
         unique_topics = {}
+        primary_labels = self.get_primary_labels(min_similarity)
         for tp, topic in found_topics.items():
-            prim_label = self.get_primary_label(tp, self.cso["primary_labels_wu"])
+            prim_label = self.get_primary_label(tp, primary_labels)
             if prim_label == 'network_structures':
                 print('Here I found you:', tp)
             if prim_label in unique_topics:
@@ -223,53 +297,129 @@ class CSOClassifierSemantic:
         sort_t = sorted(unique_topics.items(), key=lambda v: v[1], reverse=True)
         # sort_t = sorted(found_topics.items(), key=lambda k: k[1]['score'], reverse=True)
 
-        # perform 
-        vals = []
-        for tp in sort_t:
-            vals.append(tp[1])  # in 0, there is the topic, in 1 there is the info
+        return sort_t
 
-        #### suppressing some warnings that can be raised by the kneed library
-        warnings.filterwarnings("ignore")
-        try:
-            x = range(1, len(vals) + 1)
-            kn = KneeLocator(x, vals, direction='decreasing')
-            if kn.knee is None:
-                # print("I performed a different identification of knee")
-                kn = KneeLocator(x, vals, curve='convex', direction='decreasing')
-        except ValueError:
-            pass
+    def match_gram(self, grams, min_similarity):
+        """Function that returns the topics of the model matching an n-gram, with a similarity of at least
+        min_similarity, using the cache of the n-grams already matched.
+        If the n-gram is not in the model and merge_bigrams is set, it returns the topics shared by all its tokens.
 
-        ##################### Pruning
+        Args:
+            grams (tuple): the tokens of the n-gram.
+            min_similarity (float): minimum similarity between the n-gram and the topics.
 
-        try:
-            knee = int(kn.knee)
-        except TypeError:
-            knee = 0
-        except UnboundLocalError:
-            knee = 0
-
-        if knee > 5:
-            try:
-                knee += 0
-            except TypeError:
-                print("ERROR: ", kn.knee, " ", knee, " ", len(sort_t))
+        Returns:
+            gram (string): the n-gram the matches are reported under. When the topics of the tokens are merged, it
+            is the last token.
+            list_of_matched_topics (list): the matched topic items of the model.
+        """
+
+        gram, list_of_matched_topics, _ = self.lookup_gram(grams, min_similarity)
+        return gram, list_of_matched_topics
+
+    def lookup_gram(self, grams, min_similarity):
+        """Function that returns the matches of an n-gram, see match_gram, and whether the n-gram is missing from the
+        cached model, be its topics merged from its tokens or dropped. Both are kept in the cache, so that the misses
+        of the n-grams already matched are counted without looking them up in the model again.
+
+        Args:
+            grams (tuple): the tokens of the n-gram.
+            min_similarity (float): minimum similarity between the n-gram and the topics.
+
+        Returns:
+            gram (string): the n-gram the matches are reported under, see match_gram.
+            list_of_matched_topics (list): the matched topic items of the model.
+            missing (boolean): whether the n-gram is missing from the cached model.
+        """
+
+        key = (grams, self.merge_bigrams, min_similarity)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        gram = "_".join(grams)
+        list_of_matched_topics = []
+
+        if self.prune_model:
+            # the pruned model only holds the topics above the threshold and in the ontology, but all the n-grams of
+            # the cached model
+            pruned = self.get_pruned_model(min_similarity)
+            missing = gram not in pruned
+            if not missing:
+                list_of_matched_topics = pruned[gram]
+            elif len(grams) > 1 and self.merge_bigrams:
+                list_of_matched_topics = pruned.shared(grams)
+                gram = grams[-1]  # the merged matches are reported under the last token, as they always were
 
         else:
-            try:
-                if sort_t[0][1] == sort_t[4][1]:
-                    top = sort_t[0][1]
-                    test_topics = [item[1] for item in sort_t if item[1] == top]
-                    knee = len(test_topics)
+            if isinstance(self.ngrammerger, EmbeddingFallback):
+                # the n-grams computed by the fallback are still missing from the cached model
+                missing = gram not in self.ngrammerger.model
+            else:
+                missing = gram not in self.ngrammerger
+            if gram in self.ngrammerger:
+                list_of_matched_topics = self.ngrammerger[gram]
+
+            elif len(grams) > 1 and self.merge_bigrams:
+                list_of_matched_topics = self.merge_index.shared(grams)
+                gram = grams[-1]  # the merged matches are reported under the last token, as they always were
+
+            list_of_matched_topics = [topic_item for topic_item in list_of_matched_topics
+                                      if topic_item["sim_t"] >= min_similarity and
+                                      topic_item["topic"] in self.cso["topics_wu"]]
+        result = (gram, list_of_matched_topics, missing)
+        self.cache.put(key, result)
+        return result
 
-                else:
-                    knee = 5
-            except IndexError:
-                knee = len(sort_t)
+    def top_misses(self, top=None, clear=False):
+        """Function that returns the n-grams most often missing from the cached model, in the papers classified so far
+        by this process, if the module was created with count_misses. classifier.cachebuilder adds them to the cached
+        model.
+
+        Args:
+            top (integer): how many n-grams to return. None returns all of them.
+            clear (boolean): whether to reset the counts once returned, so that they do not grow over a long run.
 
-        final_topics = []
-        final_topics = [self.cso["topics_wu"][sort_t[i][0]] for i in range(0, knee)]
+        Returns:
+            misses (list): (n-gram, number of occurrences) tuples, by decreasing number of occurrences.
+        """
+        if self.misses is None:
+            raise ValueError('Error: the missing n-grams are not counted, create the module with count_misses=True')
+        top_misses = self.misses.most_common(top)
+        if clear:
+            self.misses.clear()
+        return top_misses
+
+    def get_pruned_model(self, min_similarity):
+        """Function that returns the view of the model pruned for a minimum similarity, compiling it if needed.
+
+        Args:
+            min_similarity (float): minimum similarity between the n-grams and the topics.
+
+        Returns:
+            pruned (PrunedModel): the pruned model.
+        """
+
+        pruned = self.pruned_models.get(min_similarity)
+        if pruned is None or pruned[0] is not self.ngrammerger:
+            pruned = self.pruned_models[min_similarity] = (self.ngrammerger, PrunedModel.for_model(
+                self.ngrammerger, self.cso, min_similarity))
+        return pruned[1]
+
+    def get_primary_labels(self, min_similarity):
+        """Function that returns the primary labels of the topics of the model, resolved when the model was pruned
+        for min_similarity if it is.
+
+        Args:
+            min_similarity (float): minimum similarity between the n-grams and the topics.
+
+        Returns:
+            primary_labels (dictionary): the primary labels of the topics belonging to clusters.
+        """
 
-        return final_topics
+        if self.prune_model:
+            return self.get_pruned_model(min_similarity).primary_labels
+        return self.cso["primary_labels_wu"]
 
     def get_primary_label(self, topic, primary_labels):
         """Function that returns the primary (preferred) label for a topic. If this topic belongs to 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index of the ontology topics used by the syntactic module.
+
+The syntactic module compares each n-gram of a paper with the topics that start with the same 4 characters. The
+index groups the topics by those 4 characters once per ontology, instead of once per paper, and further by length:
+the Levenshtein ratio of two strings can never exceed 2 * min(len) / (len1 + len2), so only the topics whose length
+is close enough to the n-gram's can reach the minimum similarity. The primary label of each topic is resolved when
+the index is built.
+
+The index also holds a FuzzyMatcher (see classifier.fuzzy), which finds the matching topics without comparing the
+n-gram with every candidate, and an Aho-Corasick automaton over the words of the topics (see classifier.automaton),
+which finds the n-grams of a paper that are exactly a topic. The matches of those n-grams only depend on the topic, so
+they are computed once and reused.
+
+Indexes built from a compiled ontology are saved next to it, in a file named after the ontology's fingerprint, so
+they are built once per version of the ontology.
+"""
+
+import glob
+import math
+import os
+import pickle
+from collections import defaultdict
+
+from Levenshtein import ratio
+
+from classifier.automaton import PhraseAutomaton
+from classifier.fuzzy import FuzzyMatcher
+
+FORMAT_VERSION = 3
+
+# The syntactic modules match n-grams of up to 3 tokens
+MAX_WORDS = 3
+
+# Index of the last ontology in this process, by id of the ontology it was built from
+_INDEXES = {}
+
+
+class SyntacticIndex:
+    """Topics of the ontology grouped by their first 4 characters and by length."""
+
+    def __init__(self, stems, buckets, matcher=None, automaton=None, fingerprint=None):
+        """Function that initialises the index. Use build() or for_ontology() to create one.
+
+        Args:
+            stems (dictionary): first 4 characters -> list of topics, in the order of the ontology.
+            buckets (dictionary): first 4 characters -> length -> list of (topic, primary label) tuples.
+            matcher (FuzzyMatcher): fuzzy matcher over the same topics. If None, it is built from buckets.
+            automaton (PhraseAutomaton): automaton over the words of the topics. If None, it is built from stems.
+            fingerprint (string): fingerprint of the ontology the index was built from, if known.
+        """
+        self.stems = stems
+        self.buckets = buckets
+        self.matcher = FuzzyMatcher(buckets) if matcher is None else matcher
+        if automaton is None:
+            phrases = ((tuple(topic.split(' ')), topic) for topics in stems.values() for topic in topics)
+            automaton = PhraseAutomaton((words, topic) for words, topic in phrases if len(words) <= MAX_WORDS)
+        self.automaton = automaton
+        self.fingerprint = fingerprint
+        # matches of the topics found exactly in papers, by (topic, min_similarity, fuzzy)
+        self.topic_matches = {}
+
+    @classmethod
+    def build(cls, cso):
+        """Function that builds the index of an ontology.
+
+        Args:
+            cso (dictionary): the ontology.
+
+        Returns:
+            index (SyntacticIndex): the index.
+        """
+
+        stems = defaultdict(list)
+        buckets = defaultdict(lambda: defaultdict(list))
+        primary_labels = cso['primary_labels']
+        for topic in cso['topics'].keys():
+            stems[topic[:4]].append(topic)
+            buckets[topic[:4]][len(topic)].append((topic, primary_labels.get(topic, topic)))
+
+        buckets = {stem: dict(lengths) for stem, lengths in buckets.items()}
+        return cls(dict(stems), buckets, fingerprint=getattr(cso, 'fingerprint', None))
+
+    @classmethod
+    def for_ontology(cls, cso):
+        """Function that returns the index of an ontology, building it only if needed.
+
+        The index of the last ontology is kept in the process; the modules also keep the index of their own
+        ontology. For a compiled ontology, it is also saved next to the ontology file, replacing the indexes of its
+        previous versions, and loaded from there by later processes.
+
+        Args:
+            cso (dictionary): the ontology.
+
+        Returns:
+            index (SyntacticIndex): the index.
+        """
+
+        if id(cso) in _INDEXES and _INDEXES[id(cso)][0] is cso:
+            return _INDEXES[id(cso)][1]
+
+        path = cls.path_for(cso)
+        index = None
+        if path is not None and os.path.exists(path):
+            index = cls.load(path)
+        if index is None:
+            index = cls.build(cso)
+            if path is not None:
+                index.save(path)
+                # the indexes of the previous versions of the ontology
+                for stale in glob.glob(os.path.join(os.path.dirname(path), 'cso-syntactic-v*.p')):
+                    if stale != path:
+                        try:
+                            os.remove(stale)
+                        except OSError:
+                            pass
+
+        # only the index of the last ontology is kept, so that the previous ones can be freed
+        _INDEXES.clear()
+        _INDEXES[id(cso)] = (cso, index)
+        return index
+
+    @staticmethod
+    def path_for(cso):
+        """Function that returns where the index of an ontology is saved, or None if it is not saved."""
+        fingerprint = getattr(cso, 'fingerprint', None)
+        path = getattr(cso, 'path', None)
+        if fingerprint is None or path is None:
+            return None
+        return os.path.join(os.path.dirname(path), 'cso-syntactic-v{}-{}.p'.format(FORMAT_VERSION, fingerprint))
+
+    @classmethod
+    def load(cls, path):
+        """Function that loads an index saved with save()."""
+        with open(path, 'rb') as f:
+            stems, buckets, matcher, automaton, fingerprint = pickle.load(f)
+        return cls(stems, buckets, matcher, automaton, fingerprint)
+
+    def save(self, path):
+        """Function that saves the index. The file is moved in place once written."""
+        tmp_path = '{}.tmp{}'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((self.stems, self.buckets, self.matcher, self.automaton, self.fingerprint), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def candidates(self, gram, min_similarity):
+        """Function that returns the topics that can be similar enough to an n-gram.
+
+        They are the topics starting with the same 4 characters as the n-gram, whose length allows a Levenshtein ratio
+        of at least min_similarity. The bounds are rounded outwards, so no topic that could match is left out.
+
+        Args:
+            gram (string): the n-gram.
+            min_similarity (float): minimum Levenshtein similarity between the n-gram and the topics.
+
+        Returns:
+            candidates (list): (topic, primary label) tuples.
+        """
+
+        lengths = self.buckets.get(gram[:4])
+        if not lengths:
+            return []
+        if min_similarity <= 0:
+            return [topic for topics in lengths.values() for topic in topics]
+        size = len(gram)
+        shortest = math.floor(size * min_similarity / (2 - min_similarity))
+        longest = math.ceil(size * (2 - min_similarity) / min_similarity)
+        candidates = []
+        for length in range(shortest, longest + 1):
+            if length in lengths:
+                candidates.extend(lengths[length])
+        return candidates
+
+    def match(self, gram, min_similarity, fuzzy=True):
+        """Function that returns the topics whose Levenshtein ratio with an n-gram is at least min_similarity, among
+        the topics starting with the same 4 characters.
+
+        Args:
+            gram (string): the n-gram.
+            min_similarity (float): minimum Levenshtein similarity between the n-gram and the topics.
+            fuzzy (boolean): if True, use the fuzzy matcher. Otherwise, compare the n-gram with every candidate.
+            Both return the same topics.
+
+        Returns:
+            matches (list): (topic, primary label, similarity) tuples.
+        """
+
+        if fuzzy and min_similarity > 0:
+            return self.matcher.match(gram, min_similarity)
+
+        matches = []
+        for topic, primary_label in self.candidates(gram, min_similarity):
+            m = ratio(topic, gram)
+            if m >= min_similarity:
+                matches.append((topic, primary_label, m))
+        return matches
+
+    def exact_grams(self, tokens):
+        """Function that finds the n-grams of a list of tokens that are exactly a topic, in one pass over the tokens.
+
+        Args:
+            tokens (list): the tokens of the paper.
+
+        Returns:
+            exact (dictionary): (n, position of the n-gram) -> topic, for n up to 3.
+        """
+        return {(length, start): topic for start, length, topic in self.automaton.find(tokens)}
+
+    def match_topic(self, topic, min_similarity, fuzzy=True):
+        """Function that returns the matches of an n-gram that is exactly a topic, as match() would. They are
+        computed once per topic and threshold.
+
+        Args:
+            topic (string): the n-gram, which is a topic.
+            min_similarity (float): minimum Levenshtein similarity between the n-gram and the topics.
+            fuzzy (boolean): if True, use the fuzzy matcher.
+
+        Returns:
+            matches (list): (topic, primary label, similarity) tuples.
+        """
+        key = (topic, min_similarity, fuzzy)
+        matches = self.topic_matches.get(key)
+        if matches is None:
+            matches = self.topic_matches[key] = self.match(topic, min_similarity, fuzzy)
+        return matches
@@ -7,14 +7,15 @@ Created on Thu Nov 22 09:09:10 2018
 """
 import logging
 import os
-from collections import defaultdict
+from collections import Counter, defaultdict
 
-import Levenshtein.StringMatcher as ls
 from nltk import ngrams
-from nltk.corpus import stopwords
-from nltk.tokenize import RegexpTokenizer
 from nltk.tokenize import word_tokenize
 
+from classifier.cache import LRUCache
+from classifier.document import syntactic_tokens
+from classifier.syntacticindex import SyntacticIndex
+
 logger = logging.getLogger(__name__)
 log_level = os.getenv('LOG_LEVEL', 'DEBUG')
 logger.setLevel(getattr(logging, log_level))
@@ -23,12 +24,14 @@ logger.setLevel(getattr(logging, log_level))
 class CSOClassifierSyntactic:
     """ An simple abstraction layer for using CSO classifier """
 
-    def __init__(self, cso=None, paper=None):
+    def __init__(self, cso=None, paper=None, cache_size=100000):
         """Function that initialises an object of class CSOClassifierSyntactic and all its members.
 
         Args:
             cso (dictionary): Computer Science Ontology
             paper (dictionary): paper{"title":"...","abstract":"...","keywords":"..."} the paper.
+            cache_size (integer): how many n-grams to keep the matches of, across papers. None keeps all of them,
+            0 disables the cache.
 
         """
         # Initialise variables to store CSO data - loads into memory 
@@ -39,7 +42,13 @@ class CSOClassifierSyntactic:
         if cso is None:
             cso = {}
         self.cso = cso
+        self.index = None  # index of the topics in CSO, built on first use (see get_index)
         self.min_similarity = 0.94
+        self.fuzzy_index = True  # Uses the fuzzy matcher of the index instead of comparing n-grams with every topic
+        self.exact_matching = True  # Finds the n-grams that are exactly a topic first, they skip the fuzzy matching
+        # n-grams of the last paper: 'grams' analysed, 'exact' matches, 'cached' matches and 'fuzzy' comparisons
+        self.stats = Counter()
+        self.cache = LRUCache(cache_size)  # matches of the n-grams, by n-gram and thresholds
 
     def set_paper(self, paper):
         """Function that initializes the paper variable in the class.
@@ -60,7 +69,8 @@ class CSOClassifierSyntactic:
             self.paper = '. '.join((text for text in field_text if text))
         else:
             raise TypeError('Pass paper as a string or dict that maps "title", "abstract", and "keywords" to strings')
-        assert self.paper, 'No paper text found'
+        if not self.paper:
+            raise ValueError('Error: No paper text found: {}'.format(paper))
 
     def set_min__similarity(self, msm):
         """Function that sets a different value for the similarity.
@@ -70,7 +80,18 @@ class CSOClassifierSyntactic:
         """
         self.min_similarity = msm
 
-    def classify_syntactic(self):
+    def get_index(self):
+        """Function that returns the index of the topics in CSO used to find the candidates of each n-gram.
+        It is built once per ontology, see SyntacticIndex.for_ontology.
+
+        Returns:
+            index (SyntacticIndex): the index of the topics.
+        """
+        if self.index is None:
+            self.index = SyntacticIndex.for_ontology(self.cso)
+        return self.index
+
+    def classify_syntactic(self, document=None):
         """Function that classifies a single paper. If you have a collection of papers, 
             you must call this function for each paper and organise the result.
            Initially, it cleans the paper file, removing stopwords (English ones) and punctuation.
@@ -80,32 +101,42 @@ class CSOClassifierSyntactic:
            broader topics until root is reached.
 
         Args:
-
+            document (AnalyzedDocument): the paper already analysed, shared with the semantic module. If None, the
+            paper set with set_paper is tokenized.
 
         Returns:
             found_topics (dictionary): containing the found topics with their similarity and the n-gram analysed.
         """
 
         # pre-processing
-        paper = self.paper.lower()
-        tokenizer = RegexpTokenizer(r'[\w\-\(\)]*')
-        tokens = tokenizer.tokenize(paper)
-        filtered_words = [w for w in tokens if w not in stopwords.words('english')]
-        paper = " ".join(filtered_words)
+        tokens = syntactic_tokens(self.paper) if document is None else document.syntactic_tokens
+
+        return self.classify_tokens(tokens)
+
+    def classify_tokens(self, tokens):
+        """Function that classifies a paper already tokenized, see classify_syntactic.
+
+        Args:
+            tokens (list): the tokens of the paper, see classifier.document.syntactic_tokens.
+
+        Returns:
+            topics (list): the found topics.
+        """
 
         # analysing similarity with terms in the ontology
-        extracted_topics = self.statistic_similarity(paper, self.min_similarity)
+        extracted_topics = self.statistic_similarity(" ".join(tokens), self.min_similarity, tokens)
         topics = self.strip_explanation(extracted_topics)
 
         return topics
 
-    def statistic_similarity(self, paper, min_similarity):
+    def statistic_similarity(self, paper, min_similarity, tokens=None):
         """Function that splits the paper text in n-grams (unigrams,bigrams,trigrams)
         and with a Levenshtein it check the similarity for each of them with the topics in the ontology.
 
         Args:
             paper (string): The paper to analyse. At this stage it is a string.
             min_similarity (integer): minimum Levenshtein similarity between the n-gram and the topics within the CSO. 
+            tokens (list): the tokens of the paper, if already known. Otherwise, the paper is tokenized.
 
         Returns:
             found_topics (dictionary): containing the found topics with their similarity and the n-gram analysed.
@@ -114,27 +145,39 @@ class CSOClassifierSyntactic:
         # analysing grams
         found_topics = defaultdict(list)
         matches = set()
-        tokens = word_tokenize(paper, preserve_line=True)
-        # TODO: this is constant; factor out
-        topic_stems = defaultdict(list)
-        for k in self.cso['topics'].keys():
-            topic_stems[k[:4]].append(k)
+        if tokens is None:
+            tokens = word_tokenize(paper, preserve_line=True)
+        index = self.get_index()
+        self.stats = Counter()
+        # n-grams that are exactly a topic, found in one pass over the tokens
+        exact = index.exact_grams(tokens) if self.exact_matching else {}
 
         for n in range(3, 0, -1):
             for i, grams in enumerate(ngrams(tokens, n)):
                 if i in matches:
                     continue
                 gram = " ".join(grams)
-                try:
-                    topic_block = topic_stems[gram[:4]]
-                except KeyError:
-                    continue
-                for topic in topic_block:
-                    m = ls.StringMatcher(None, topic, gram).ratio()
-                    if m >= min_similarity:
-                        topic = self.get_primary_label(topic, self.cso['primary_labels'])
-                        found_topics[topic].append({'matched': gram, 'similarity': m})
-                        matches.add(i)
+                self.stats['grams'] += 1
+                if (n, i) in exact:
+                    # the n-gram is a topic, its matches are computed once per topic
+                    found = index.match_topic(exact[n, i], min_similarity, fuzzy=self.fuzzy_index)
+                    self.stats['exact'] += 1
+                else:
+                    key = (gram, min_similarity, self.fuzzy_index)
+                    found = self.cache.get(key)
+                    if found is None:
+                        # topics with the same first 4 characters and a Levenshtein ratio of at least min_similarity
+                        found = index.match(gram, min_similarity, fuzzy=self.fuzzy_index)
+                        self.cache.put(key, found)
+                        self.stats['fuzzy'] += 1
+                    else:
+                        self.stats['cached'] += 1
+                for topic, primary_label, m in found:
+                    found_topics[primary_label].append({'matched': gram, 'similarity': m})
+                    matches.add(i)
+        logger.debug('%d of %d n-grams skipped the fuzzy matching (%d exact, %d cached)',
+                     self.stats['exact'] + self.stats['cached'], self.stats['grams'], self.stats['exact'],
+                     self.stats['cached'])
 
         # idx = 0
         # trigrams = ngrams(word_tokenize(paper, preserve_line=True), 3)
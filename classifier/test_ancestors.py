@@ -0,0 +1,225 @@
+import json
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from classifier import misc
+from classifier.ancestors import AncestorIndex
+from classifier.test_ontology import CSO
+
+
+def reference_climb(cso, found_topics, climb_ont):
+    # misc.climb_ontology before the ancestor index
+    all_broaders = {}
+    inferred_topics = {}
+    if climb_ont == 'first':
+        all_broaders = misc.get_broader_of_topics(cso, found_topics, all_broaders)
+    else:
+        while True:
+            all_broaders_back = all_broaders.copy()
+            all_broaders = misc.get_broader_of_topics(cso, found_topics, all_broaders)
+            if all_broaders_back == all_broaders:
+                break
+    for broader, narrower in all_broaders.items():
+        broader = misc.get_primary_label(broader, cso['primary_labels'])
+        if broader not in inferred_topics:
+            inferred_topics[broader] = [{'matched': len(narrower), 'broader of': narrower}]
+        else:
+            inferred_topics[broader].append({'matched': len(narrower), 'broader of': narrower})
+    return inferred_topics
+
+
+# misc.get_network and misc.get_coverage before the ancestor index
+def reference_network(cso, found_topics):
+    if type(found_topics) is dict:
+        list_of_topics = []
+        for key, value in found_topics.items():
+            list_of_topics += value
+
+        list_of_topics = list(set(list_of_topics))
+    elif type(found_topics) is list:
+        list_of_topics = found_topics
+
+    topics = []
+    for topic in list_of_topics:
+        if topic in cso["topics"]:
+            topics.append(topic)
+        else:
+            print("Asked to process '", topic, "', but I couldn't find it in the current version of the Ontology")
+
+    nodes = []
+    edges = []
+
+    nodes.append({"id": "paper", "label": "paper"})
+    t_id = 0
+    pos = {}
+    for topic in topics:
+        pos[topic] = t_id
+        pos[t_id] = topic
+        temp = {"id": "topic" + str(t_id), "label": topic}
+        nodes.append(temp)
+        t_id += 1
+
+    matrix = np.ones((len(topics), len(topics)), dtype=int) * 999
+    queue = deque()
+    for topic in topics:
+        queue.append({"t": topic, "d": 1})
+        while len(queue) > 0:
+            dequeued = queue.popleft()
+            if dequeued["t"] in cso["broaders"]:
+                broaders = cso["broaders"][dequeued["t"]]
+                for broader in broaders:
+                    if broader in pos:
+                        matrix[pos[topic]][pos[broader]] = dequeued["d"]
+                    queue.append({"t": broader, "d": dequeued["d"] + 1})
+
+    for topic in topics:
+        nearest_min = matrix[pos[topic]].min()
+        nearest_pos = np.where(matrix[pos[topic]] == nearest_min)[0]
+
+        if (nearest_min == 1):
+            for near in nearest_pos:
+                edge = {"id": "edge", "source": topic, "target": pos[near], "kind": "hard"}
+                edges.append(edge)
+        elif (nearest_min > 1 and nearest_min < 999):
+            for near in nearest_pos:
+                edge = {"id": "edge", "source": topic, "target": pos[near], "kind": "soft"}
+                edges.append(edge)
+        else:
+            edge = {"id": "edge", "source": topic, "target": "paper", "kind": "conn"}
+            edges.append(edge)
+
+    network = {"nodes": nodes, "edges": edges}
+    return network
+
+
+def reference_coverage(cso, found_topics):
+    coverage = {}
+
+    if type(found_topics) is dict:
+        list_of_topics = []
+        for key, value in found_topics.items():
+            list_of_topics += value
+
+        list_of_topics = list(set(list_of_topics))
+    elif type(found_topics) is list:
+        list_of_topics = found_topics
+
+    t_id = 0
+    pos = {}
+    topics = []
+    for topic in list_of_topics:
+        if topic in cso["topics"]:
+            topics.append(topic)
+            pos[topic] = t_id
+            pos[t_id] = topic
+            t_id += 1
+        else:
+            print("Asked to process '", topic, "', but I couldn't find it in the current version of the Ontology")
+
+    matrix = np.zeros((len(topics), len(topics)), dtype=int)
+    np.fill_diagonal(matrix, 1)
+
+    queue = deque()
+    for topic in topics:
+        queue.append(topic)
+        while len(queue) > 0:
+            dequeued = queue.popleft()
+            if dequeued in cso["broaders"]:
+                broaders = cso["broaders"][dequeued]
+                for broader in broaders:
+                    if broader in pos:
+                        matrix[pos[topic]][pos[broader]] = 1  # dequeued["d"]
+                    queue.append(broader)
+
+    dividend = len(topics)  # or np.sum(matrix)
+
+    if (dividend > 0):
+        general_coverage = np.sum(matrix, axis=0)
+
+        for topic in topics:
+            coverage[topic] = round(general_coverage[pos[topic]] / dividend, 3)
+    else:
+        print("I was about to perform a divide by zero operation")
+
+    return coverage
+
+
+def random_ontology(seed, size=60):
+    rng = random.Random(seed)
+    topics = ['topic {}'.format(i) for i in range(size)]
+    broaders = {}
+    for i, topic in enumerate(topics):
+        # mostly towards lower numbers, with a few cycles and repeated broaders
+        candidates = topics[:i] if i and rng.random() < 0.95 else topics
+        if rng.random() < 0.8:
+            broaders[topic] = [rng.choice(candidates) for _ in range(rng.randint(1, 3))]
+    primary_labels = {topic: rng.choice(topics) for topic in rng.sample(topics, size // 5)}
+    return {'topics': dict.fromkeys(topics, True), 'broaders': broaders, 'primary_labels': primary_labels}, topics
+
+
+def test_climb_matches_the_fixed_point():
+    for seed in range(100):
+        cso, topics = random_ontology(seed)
+        rng = random.Random(seed)
+        for _ in range(10):
+            found = [rng.choice(topics + ['unknown']) for _ in range(rng.randint(0, 8))]
+            for climb in ('first', 'all'):
+                expected = reference_climb(cso, found, climb)
+                assert json.dumps(misc.climb_ontology(cso, found, climb)) == json.dumps(expected)
+
+
+def test_ancestor_sets():
+    index = AncestorIndex.for_ontology(CSO)
+    assert index is AncestorIndex.for_ontology(CSO)
+    # only the last ontology is kept
+    AncestorIndex.for_ontology(random_ontology(0)[0])
+    assert AncestorIndex.for_ontology(CSO) is not index
+    assert {index.topics[i] for i in index.closure(['computer science'])} == {
+        'artificial intelligence', 'machine learning', 'neural networks', 'deep learning'}
+    assert index.closure(['deep learning', 'unknown']) == set()
+
+    cso, topics = random_ontology(0)
+    index = AncestorIndex.build(cso)
+    for topic in topics:
+        expected = set(reference_climb(cso, [topic], 'all'))
+        found = {index.primary_labels[i] for i in index.closure([topic])}
+        assert found == expected
+
+
+def test_network_and_coverage_match_the_matrices():
+    for seed in range(50):
+        cso, topics = random_ontology(seed)
+        # the matrices were filled along every path, which never ends on a cycle
+        cso['broaders'] = {topic: [broader for broader in broaders if int(broader.split()[1]) < int(topic.split()[1])]
+                           for topic, broaders in cso['broaders'].items()}
+        rng = random.Random(seed)
+        papers = [[rng.choice(topics[:30] + ['unknown']) for _ in range(rng.randint(0, 8))] for _ in range(10)]
+        networks, coverages = misc.get_networks(cso, papers), misc.get_coverages(cso, papers)
+        for found, network, coverage in zip(papers, networks, coverages):
+            assert json.dumps(network) == json.dumps(reference_network(cso, found))
+            assert json.dumps(coverage) == json.dumps(reference_coverage(cso, found))
+            assert network == misc.get_network(cso, found) and coverage == misc.get_coverage(cso, found)
+
+
+def test_longest_distances_reject_cycles():
+    cso = {'broaders': {'a': ['b'], 'b': ['c'], 'c': ['a']}, 'primary_labels': {}}
+    index = AncestorIndex.build(cso)
+    with pytest.raises(ValueError):
+        index.longest_distances(index.ids['a'])
+
+
+def test_climb_batch_matches_climb():
+    for seed in range(30):
+        cso, topics = random_ontology(seed)
+        index = AncestorIndex.build(cso)
+        rng = random.Random(seed)
+        papers = [[rng.choice(topics + ['unknown']) for _ in range(rng.randint(0, 8))] for _ in range(20)]
+        for climb in ('first', 'all'):
+            expected = [{label: [match['matched'] for match in matches]
+                         for label, matches in index.climb(found, climb).items()} for found in papers]
+            assert json.dumps(index.climb_batch(papers, climb)) == json.dumps(expected)
+            assert index.broader_topics_batch(papers, climb) == [list(inferred) for inferred in expected]
+    assert AncestorIndex.build(CSO).climb_batch([[], ['unknown']], 'all') == [{}, {}]
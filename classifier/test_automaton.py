@@ -0,0 +1,32 @@
+import random
+
+from classifier.automaton import PhraseAutomaton
+from classifier.syntacticmodule import CSOClassifierSyntactic
+from classifier.test_ontology import CSO
+
+
+def test_automaton_finds_every_occurrence():
+    rng = random.Random(0)
+    words = ['a', 'b', 'c', 'd']
+    phrases = {tuple(rng.choice(words) for _ in range(rng.randint(1, 3))) for _ in range(30)}
+    automaton = PhraseAutomaton((phrase, ' '.join(phrase)) for phrase in phrases)
+    for _ in range(100):
+        tokens = [rng.choice(words) for _ in range(rng.randint(0, 20))]
+        expected = {(start, n, ' '.join(tokens[start:start + n]))
+                    for n in range(1, 4) for start in range(len(tokens) - n + 1)
+                    if tuple(tokens[start:start + n]) in phrases}
+        assert set(automaton.find(tokens)) == expected
+
+
+def test_exact_matching_finds_the_same_topics():
+    paper = 'neural network models for deep learning and machine learnings in computer science'
+    module = CSOClassifierSyntactic(CSO)
+    module.exact_matching = False
+    expected = module.statistic_similarity(paper, 0.94)
+    assert module.stats['exact'] == 0
+    module.exact_matching = True
+    found = module.statistic_similarity(paper, 0.94)
+    assert {topic: len(matched) for topic, matched in found.items()} == \
+           {topic: len(matched) for topic, matched in expected.items()}
+    assert module.stats['exact'] == 3
+    assert module.stats['exact'] + module.stats['cached'] + module.stats['fuzzy'] == module.stats['grams']
@@ -0,0 +1,31 @@
+from classifier.cache import LRUCache
+from classifier.syntacticmodule import CSOClassifierSyntactic
+from classifier.test_ontology import CSO
+
+
+def test_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.get('b') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2}
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert len(cache) == 0
+
+
+def test_syntactic_matches_are_cached_across_papers():
+    paper = 'neural networks for deep learnings and machine learnings'
+    module = CSOClassifierSyntactic(CSO)
+    first = module.statistic_similarity(paper, 0.94)
+    hits = module.cache.hits
+    second = module.statistic_similarity(paper, 0.94)
+    assert second == first
+    assert module.stats['cached'] == module.stats['grams'] - module.stats['exact'] > 0
+    assert module.cache.hits - hits == module.stats['cached']
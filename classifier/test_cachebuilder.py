@@ -0,0 +1,74 @@
+import json
+from collections import Counter
+from multiprocessing import get_context
+
+import pytest
+
+from classifier.cachebuilder import build_entries, read_misses, save_version, write_misses
+from classifier.embeddings import EmbeddingFallback, EmbeddingIndex
+from classifier.semanticmodule import CSOClassifierSemantic
+from classifier.test_embeddings import vectors
+from classifier.test_ontology import CSO
+from classifier.test_prunedmodel import random_model
+
+CACHED = {'machine_learning': [{'topic': 'machine_learning', 'sim_t': 1, 'wet': 'machine_learning', 'sim_w': 1}]}
+
+
+def test_misses_are_counted_per_occurrence():
+    concepts = [['token_1 token_12 token_13', 'token_12'], ['token_13 token_2', 'token_12']]
+    for prune_model in (True, False):
+        module = CSOClassifierSemantic(random_model(), CSO, nlp=object(), count_misses=True)
+        module.prune_model = prune_model
+        for paper in concepts:
+            module.classify_concepts(paper)
+        assert module.top_misses(2) == [('token_12', 3), ('token_13', 2)]
+        per_paper = module.top_misses(clear=True)
+        assert not module.misses
+        # the n-grams are now in the cache of the module
+        module.classify_concepts_batch(concepts)
+        assert module.top_misses() == per_paper
+        assert {gram for gram, _ in per_paper} == {'token_12', 'token_13', 'token_1_token_12', 'token_12_token_13',
+                                                   'token_1_token_12_token_13', 'token_13_token_2'}
+
+
+def test_misses_are_only_counted_on_request():
+    module = CSOClassifierSemantic(random_model(), CSO, nlp=object())
+    module.classify_concepts(['token_1 token_12 token_13'])
+    assert module.misses is None
+    with pytest.raises(ValueError):
+        module.top_misses()
+
+
+def test_misses_are_written_and_read(tmp_path):
+    path = str(tmp_path / 'misses.tsv')
+    write_misses(Counter({'deep_learnings': 3, 'cooking': 5, 'graphs': 1}), path, top=2)
+    assert read_misses(path) == ['cooking', 'deep_learnings']
+
+
+def test_entries_are_built_in_parallel_as_the_fallback_computes_them(tmp_path):
+    index = EmbeddingIndex.from_model(vectors(size=40))
+    grams = ['deep_learnings', 'machine_learning', 'not_a_word', 'cooking'] + ['word_{}'.format(i) for i in range(20)]
+    fallback = EmbeddingFallback(CACHED, index, CSO, topn=3)
+    expected = {gram: fallback[gram] for gram in grams if gram in index and gram not in CACHED}
+
+    for workers in (1, 2):
+        fallback = EmbeddingFallback(CACHED, index, CSO, topn=3)
+        assert build_entries(grams, fallback, workers=workers) == expected
+
+    path = save_version(CACHED, expected, str(tmp_path / 'token-to-cso-combined-v1.json'))
+    with open(path) as f:
+        merged = json.load(f)
+    assert merged == dict(CACHED, **expected)
+    module = CSOClassifierSemantic(merged, CSO, nlp=object(), count_misses=True)
+    module.classify_concepts(['deep learnings'])
+    assert 'deep_learnings' not in module.misses
+
+
+def test_entries_are_built_without_fork(monkeypatch):
+    # the workers then receive the fallback through their initializer
+    monkeypatch.setattr('classifier.cachebuilder.get_all_start_methods', lambda: ['spawn'])
+    monkeypatch.setattr('classifier.cachebuilder.Pool', get_context('spawn').Pool)
+    index = EmbeddingIndex.from_model(vectors(size=40))
+    grams = ['deep_learnings', 'cooking'] + ['word_{}'.format(i) for i in range(10)]
+    expected = build_entries(grams, EmbeddingFallback(CACHED, index, CSO, topn=3))
+    assert build_entries(grams, EmbeddingFallback(CACHED, index, CSO, topn=3), workers=2) == expected
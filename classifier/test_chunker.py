@@ -0,0 +1,31 @@
+import random
+import re
+
+import nltk
+
+from classifier.chunker import extract_concepts
+
+
+def nltk_concepts(tagged):
+    # the extraction the semantic modules used before the chunker
+    concepts = []
+    for node in nltk.RegexpParser("DBW_CONCEPT: {<JJ.*>*<NN.*>+}").parse(tagged):
+        if isinstance(node, nltk.tree.Tree) and node.label() == 'DBW_CONCEPT':
+            concept = ''
+            for leaf in node.leaves():
+                concept_chunk = re.sub(r'[\=\,\…\’\'\+\-\–\“\”\"\/\‘\[\]\®\™\%]', ' ', leaf[0])
+                concept_chunk = re.sub(r'\.$|^\.', '', concept_chunk)
+                concept += ' ' + concept_chunk.lower().strip()
+            concept = re.sub(r'\.+', '.', concept)
+            concepts.append(re.sub(r'\s+', ' ', concept))
+    return concepts
+
+
+def test_chunker_matches_regexp_parser():
+    rng = random.Random(0)
+    tags = ['JJ', 'JJR', 'JJS', 'NN', 'NNS', 'NNP', 'NNPS', 'VB', 'IN', 'DT', '.', ',', 'NFP', 'HYPH']
+    words = ['Neural', 'network', '.net', 'e.g.', 'A...B', '%', '-', 'state-of-the-art', '“Deep”', "it's", '..',
+             'x.\n', ' ', 'C++', 'Q&A', '[1]', 'data™']
+    for _ in range(500):
+        tagged = [(rng.choice(words), rng.choice(tags)) for _ in range(rng.randint(0, 20))]
+        assert extract_concepts(tagged) == nltk_concepts(tagged)
@@ -0,0 +1,129 @@
+import nltk
+import pytest
+import spacy
+from spacy.language import Language
+
+from classifier.classifier import CSOClassifier
+from classifier.test_ontology import CSO
+
+
+def has_stopwords():
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        return False
+    return True
+
+
+@Language.component('noun_tagger')
+def noun_tagger(doc):
+    # tags alphabetic tokens as nouns, enough for the grammar of the semantic module
+    for token in doc:
+        token.tag_ = 'NN' if token.is_alpha else ''
+    return doc
+
+
+def item(topic, sim_t=1.0, wet=None, sim_w=1.0):
+    return {'topic': topic, 'sim_t': sim_t, 'wet': wet or topic, 'sim_w': sim_w}
+
+
+MODEL = {
+    'neural_network': [item('neural_networks')],
+    'deep': [item('deep_learning', 0.95, 'deep', 0.9), item('machine_learning', 0.96, 'deep', 0.8)],
+    'learning': [item('deep_learning', 0.97, 'learning', 0.9), item('machine_learning', 0.99)],
+    'intelligence': [item('artificial_intelligence', 0.94, 'intelligence', 0.7)],
+}
+
+PAPERS = {
+    1: {'title': 'Neural network models', 'abstract': 'Deep learning of artificial intelligence.', 'keywords': ''},
+    2: {'title': 'Computer science', 'abstract': 'Deep learning and machine learnings.', 'keywords': ['AI']},
+    3: {'title': 'Learning deep networks', 'abstract': None, 'keywords': ['neural network']},
+}
+
+
+@pytest.fixture
+def classifier():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('noun_tagger')
+    with CSOClassifier(enhancement='all', cso=CSO, model=MODEL, nlp=nlp) as classifier:
+        yield classifier
+
+
+@pytest.mark.skipif(not has_stopwords(), reason='requires the NLTK stopwords')
+@pytest.mark.parametrize('workers', [1, 2])
+def test_corpus_mode_matches_per_paper_mode(classifier, workers):
+    expected = classifier.classify_many(PAPERS)
+    assert classifier.classify_corpus(PAPERS, workers=workers) == expected
+
+
+def test_corpus_mode_matches_per_paper_mode_semantic(classifier):
+    expected = classifier.classify_many(PAPERS, modules='semantic')
+    assert any(result['semantic'] for result in expected.values())
+    assert classifier.classify_corpus(PAPERS, modules='semantic', workers=2) == expected
+
+
+@pytest.mark.parametrize('enhancement', ['first', 'all'])
+def test_batch_enhancement_matches_per_paper_enhancement(classifier, enhancement):
+    expected = {paper_id: classifier.classify(paper, modules='semantic', enhancement=enhancement)
+                for paper_id, paper in PAPERS.items()}
+    assert any(result['enhanced'] for result in expected.values())
+    assert classifier.classify_many(PAPERS, modules='semantic', enhancement=enhancement) == expected
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stream_matches_batch_and_reads_ahead_boundedly(classifier, workers):
+    papers = {paper_id * 10 + copy: paper for paper_id, paper in PAPERS.items() for copy in range(5)}
+    expected = classifier.classify_many(papers, modules='semantic')
+    read = []
+
+    def stream():
+        for paper_id, paper in papers.items():
+            read.append(paper_id)
+            yield paper_id, paper
+
+    results = classifier.classify_stream(stream(), modules='semantic', workers=workers, chunk_size=2, max_in_flight=2)
+    paper_id, result = next(results)
+    # the chunks in flight, and the next one waiting for a free slot
+    assert len(read) <= 2 * 3
+    assert result == expected[paper_id]
+    assert dict([(paper_id, result)] + list(results)) == expected
+    if workers == 1:
+        assert list(classifier.classify_stream(papers, modules='semantic', workers=1)) == list(expected.items())
+
+
+def test_pooled_batch_keeps_the_order_and_reports_utilization(classifier):
+    papers = {paper_id * 10 + copy: dict(paper, abstract=(paper['abstract'] or '') * copy)
+              for paper_id, paper in PAPERS.items() for copy in range(4)}
+    expected = classifier.classify_many(papers, modules='semantic', workers=1)
+    result = classifier.classify_many(papers, modules='semantic', workers=2)
+    assert list(result.items()) == list(expected.items())
+    stats = classifier.utilization.stats()
+    assert sum(worker['papers'] for worker in stats['workers']) == len(papers)
+    assert all(0 <= worker['utilization'] <= 1 for worker in stats['workers'])
+
+
+def test_corpus_mode_rejects_papers_without_text(classifier):
+    # as the per-paper modes do
+    papers = dict(PAPERS, empty={'title': '', 'abstract': None})
+    with pytest.raises(ValueError, match='No paper text found'):
+        classifier.classify_corpus(papers, modules='semantic')
+    with pytest.raises(ValueError, match='No paper text found'):
+        classifier.classify_many(papers, modules='semantic')
+    with pytest.raises(ValueError, match='No paper text found'):
+        classifier.classify(papers['empty'], modules='semantic')
+    with pytest.raises(ValueError, match='No paper text found'):
+        classifier.synt_module.set_paper(papers['empty'])
+
+
+def test_pool_is_forked_with_the_indexes_of_the_call():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('noun_tagger')
+    with CSOClassifier(modules='syntactic', enhancement='no', cso=CSO, model=MODEL, nlp=nlp) as classifier:
+        classifier.pool(2)
+        assert not classifier.sema_module.pruned_models
+        result = classifier.classify_many(PAPERS, modules='semantic', enhancement='all', workers=2)
+        # the pruned model was built here, and the workers forked again, rather than built in each worker
+        assert classifier.sema_module.min_similarity in classifier.sema_module.pruned_models
+        assert ('semantic', classifier.sema_module.min_similarity) in classifier._pool_warm
+        assert 'enhancement' in classifier._pool_warm
+        assert result == classifier.classify_many(PAPERS, modules='semantic', enhancement='all', workers=1)
@@ -0,0 +1,32 @@
+import spacy
+
+from classifier.document import AnalyzedDocument, analyze_texts, paper_text
+
+
+def test_paper_text_joins_fields():
+    paper = {'title': 'A title', 'abstract': '', 'keywords': ['neural networks', 'deep learning']}
+    assert paper_text(paper) == 'A title. neural networks, deep learning'
+    assert paper_text('  Full text ') == 'Full text'
+
+
+def test_document_is_analysed_once():
+    nlp = spacy.blank('en')
+    calls = []
+
+    def analyse(text):
+        calls.append(text)
+        return nlp(text)
+
+    document = AnalyzedDocument('The quick brown fox jumped over the lazy neural network.', analyse)
+    assert document.clean_tokens == ['quick', 'brown', 'fox', 'jumped', 'lazy', 'neural', 'network']
+    assert document.tagged == []
+    assert len(calls) == 1
+
+
+def test_batched_analysis_matches_single_documents():
+    nlp = spacy.blank('en')
+    texts = ['Neural networks for image retrieval.', 'A survey of quantum computing.', 'Graph databases.']
+    documents = list(analyze_texts(texts, nlp, batch_size=2))
+    assert [document.text for document in documents] == texts
+    assert [document.clean_tokens for document in documents] == \
+        [AnalyzedDocument(text, nlp).clean_tokens for text in texts]
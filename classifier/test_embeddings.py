@@ -0,0 +1,64 @@
+import numpy as np
+
+from classifier.cache import LRUCache
+from classifier.embeddings import EmbeddingFallback, EmbeddingIndex
+from classifier.semanticmodule import CSOClassifierSemantic
+from classifier.test_ontology import CSO
+
+WORDS = ['machine_learning', 'deep_learning', 'neural_networks', 'learning', 'neural', 'networks', 'graphs',
+         'computer_science', 'cooking', 'gardening', 'deep_learnings']
+
+
+def vectors(seed=0, size=len(WORDS)):
+    rng = np.random.RandomState(seed)
+    return {word: rng.normal(size=8) for word in (WORDS + ['word_{}'.format(i) for i in range(size)])[:size]}
+
+
+def test_most_similar_matches_brute_force():
+    words = vectors(size=200)
+    index = EmbeddingIndex.from_model(words)
+    matrix = np.array(list(words.values()))
+    matrix = matrix / np.linalg.norm(matrix, axis=1)[:, None]
+    queries = ['machine_learning', 'word_50', 'word_188']
+    for block_size in (7, 64, 1000):
+        found = index.most_similar(queries, topn=10, block_size=block_size)
+        for word, similar in zip(queries, found):
+            scores = matrix @ matrix[index.rows[word]]
+            scores[index.rows[word]] = -np.inf
+            expected = [index.words[row] for row in np.argsort(-scores)[:10]]
+            assert [other for other, _ in similar] == expected
+            assert np.allclose([score for _, score in similar], np.sort(scores)[::-1][:10], atol=1e-5)
+
+
+def test_fallback_computes_missing_grams_once(tmp_path):
+    path = str(tmp_path / 'overlay.jsonl')
+    cached = {'machine_learning': [{'topic': 'machine_learning', 'sim_t': 1, 'wet': 'machine_learning', 'sim_w': 1}]}
+    fallback = EmbeddingFallback(cached, EmbeddingIndex.from_model(vectors()), CSO, topn=3, overlay_path=path)
+
+    assert fallback['machine_learning'] == cached['machine_learning']
+    assert 'cooking_recipes' not in fallback
+    items = fallback['deep_learnings']
+    assert items[0] == {'topic': 'deep_learning', 'sim_t': items[0]['sim_t'], 'wet': 'deep_learnings', 'sim_w': 1}
+    assert items[0]['sim_t'] >= 0.94
+    assert all(item['topic'] in CSO['topics_wu'] for item in items)
+    assert 'deep_learnings' in fallback and fallback.computed == 1
+
+    reloaded = EmbeddingFallback(cached, EmbeddingIndex.from_model(vectors()), CSO, topn=3, overlay_path=path)
+    assert reloaded['deep_learnings'] == items
+    reloaded.compute(['deep_learnings', 'machine_learning', 'cooking'])
+    assert reloaded.computed == 1
+    assert all(item['wet'] != 'cooking' for item in reloaded['cooking'])
+
+
+def test_semantic_module_uses_the_fallback():
+    cached = {'machine_learning': [{'topic': 'machine_learning', 'sim_t': 1, 'wet': 'machine_learning', 'sim_w': 1}]}
+    fallback = EmbeddingFallback(cached, EmbeddingIndex.from_model(vectors()), CSO, topn=3)
+    module = CSOClassifierSemantic(fallback, CSO, nlp=object())
+    assert not module.prune_model
+    assert module.match_gram(('deep', 'learnings'), 0.94) == ('deep_learnings', fallback['deep_learnings'])
+
+    concepts = [['machine learning', 'deep learnings'], ['cooking']]
+    expected = [module.classify_concepts(paper) for paper in concepts]
+    assert expected[0] == ['machine learning', 'deep learning']
+    module.cache = LRUCache(0)
+    assert module.classify_concepts_batch(concepts) == expected
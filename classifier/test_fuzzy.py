@@ -0,0 +1,65 @@
+import pickle
+import random
+
+import Levenshtein
+
+from classifier.fuzzy import BKTree, FuzzyMatcher, distance
+from classifier.syntacticindex import SyntacticIndex
+
+
+def random_topics(rng, count):
+    return {''.join(rng.choice('ab ') for _ in range(rng.randint(4, 30))): True for _ in range(count)}
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(1)
+    labels = list(random_topics(rng, 500))
+    tree = BKTree()
+    for label in labels:
+        tree.add(label, label.upper())
+    for _ in range(100):
+        query = ''.join(rng.choice('ab ') for _ in range(rng.randint(4, 30)))
+        for radius in (0, 1, 3):
+            found = sorted(tree.search(query, radius))
+            assert found == sorted((label, label.upper()) for label in labels if distance(query, label) <= radius)
+
+
+def test_fuzzy_matcher_matches_brute_force():
+    rng = random.Random(0)
+    index = SyntacticIndex.build({'topics': random_topics(rng, 2000), 'primary_labels': {}})
+    matcher = pickle.loads(pickle.dumps(index.matcher))
+    assert isinstance(matcher, FuzzyMatcher)
+    for _ in range(500):
+        gram = ''.join(rng.choice('ab ') for _ in range(rng.randint(4, 30)))
+        for min_similarity in (0.5, 0.9, 0.94, 0.96, 1):
+            expected = {(topic, topic, Levenshtein.ratio(topic, gram)) for topic in index.stems.get(gram[:4], [])
+                        if Levenshtein.ratio(topic, gram) >= min_similarity}
+            assert set(matcher.match(gram, min_similarity)) == expected
+            assert set(index.match(gram, min_similarity, fuzzy=False)) == expected
+
+
+def indel_distance(a, b):
+    # dynamic programming over insertions and deletions only
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], previous if x == y else min(row[j], row[j - 1]) + 1
+    return row[-1]
+
+
+def test_matching_only_uses_the_pinned_levenshtein_api(monkeypatch):
+    # python-Levenshtein 0.12, pinned in requirements.txt, only takes the two strings
+    import classifier.fuzzy as fuzzy
+    monkeypatch.setattr(fuzzy, 'ratio', lambda a, b: Levenshtein.ratio(a, b))
+    rng = random.Random(2)
+    labels = list(random_topics(rng, 300)) + ['', 'a']
+    for _ in range(300):
+        a, b = rng.choice(labels), rng.choice(labels)
+        assert distance(a, b) == indel_distance(a, b)
+    tree = BKTree()
+    for label in labels:
+        tree.add(label, None)
+    query = labels[0]
+    assert sorted(label for label, _ in tree.search(query, 2)) == sorted(
+        label for label in labels if indel_distance(query, label) <= 2)
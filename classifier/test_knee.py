@@ -0,0 +1,71 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from classifier.knee import select_knee, select_knees
+
+# scores and the number of topics kept by the semantic module with kneed 0.3.1
+CASES = [
+    ([], 0), ([3], 1), ([4, 4], 2), ([9, 3, 1], 3), ([6, 6, 6, 6, 6, 6, 2], 6),
+    ([40, 30, 12, 11, 10, 9, 9, 8, 8, 7, 2, 1], 5),
+    ([100, 50, 25, 12, 6, 3, 2, 1, 1, 1, 1, 1, 1, 1, 1, 1], 5),
+    ([12, 11, 11, 9, 9, 9, 8, 8, 7, 5, 4, 4, 4, 3, 3], 8),
+    ([12, 12, 12, 11, 10, 10, 8, 7, 7, 5, 5, 3, 2, 1, 1, 1], 11),
+    ([11, 10, 10, 8, 7, 7, 7, 6, 5, 3, 2, 2, 2, 1, 1], 7),
+    ([12, 10, 9, 8, 7, 7, 6, 6, 6, 5, 5, 3, 3, 1], 13),
+]
+
+
+def kneed_selection(scores):
+    # the selection of the semantic module with kneed
+    from kneed import KneeLocator
+    try:
+        x = range(1, len(scores) + 1)
+        kn = KneeLocator(x, scores, direction='decreasing')
+        if kn.knee is None:
+            kn = KneeLocator(x, scores, curve='convex', direction='decreasing')
+        knee = int(kn.knee) if kn.knee is not None else 0
+    except ValueError:
+        knee = 0
+    if knee > 5:
+        return knee
+    if len(scores) < 5:
+        return len(scores)
+    return len([score for score in scores if score == scores[0]]) if scores[0] == scores[4] else 5
+
+
+def random_scores(rng):
+    return sorted((rng.randint(1, rng.choice([4, 12, 50])) for _ in range(rng.randint(0, 40))), reverse=True)
+
+
+def test_knee_selection():
+    assert [select_knee(scores) for scores, _ in CASES] == [knee for _, knee in CASES]
+    assert select_knees([scores for scores, _ in CASES]) == [knee for _, knee in CASES]
+
+
+def test_batch_selection_matches_single_selection():
+    rng = random.Random(0)
+    batch = [random_scores(rng) for _ in range(2000)]
+    assert select_knees(batch) == [select_knee(scores) for scores in batch]
+
+
+def test_knee_selection_matches_recorded_kneed_selection():
+    # the random cases of test_knee_selection_matches_kneed, with the selection of kneed 0.3.1 recorded
+    with open(Path(__file__).with_name('test_knee_kneed.json')) as f:
+        cases = json.load(f)
+    rng = random.Random(1)
+    assert [scores for scores, _ in cases] == [random_scores(rng) for _ in cases]
+    assert [select_knee(scores) for scores, _ in cases] == [knee for _, knee in cases]
+    assert select_knees([scores for scores, _ in cases]) == [knee for _, knee in cases]
+
+
+def test_knee_selection_matches_kneed():
+    kneed = pytest.importorskip('kneed')
+    if getattr(kneed, '__version__', '0.3.1') != '0.3.1':
+        pytest.skip('the semantic modules used kneed 0.3.1')
+    rng = random.Random(1)
+    for _ in range(500):
+        scores = random_scores(rng)
+        assert select_knee(scores) == kneed_selection(scores)
@@ -0,0 +1,28 @@
+import random
+
+from classifier.mergeindex import MergeIndex
+
+
+def merged_topics(model, tokens):
+    # the merge the semantic modules did before the index
+    temp_list_of_matches = {}
+    list_of_merged_topics = {}
+    for token in tokens:
+        if token in model:
+            for topic_item in model[token]:
+                temp_list_of_matches[topic_item["topic"]] = topic_item
+                list_of_merged_topics[topic_item["topic"]] = list_of_merged_topics.get(topic_item["topic"], 0) + 1
+    return [temp_list_of_matches[topic] for topic, count in list_of_merged_topics.items() if count >= len(tokens)]
+
+
+def test_merge_index_matches_counting():
+    rng = random.Random(0)
+    topics = ['topic_{}'.format(i) for i in range(8)]
+    # some lists repeat a topic, which the counting merge also takes into account
+    model = {'token_{}'.format(i): [{'topic': rng.choice(topics), 'sim_t': rng.random(), 'wet': 'w', 'sim_w': 1}
+                                    for _ in range(rng.randint(1, 6))]
+             for i in range(10)}
+    index = MergeIndex(model, cache_size=4)
+    for _ in range(500):
+        tokens = tuple('token_{}'.format(rng.randrange(12)) for _ in range(rng.randint(2, 3)))
+        assert index.shared(tokens) == merged_topics(model, tokens)
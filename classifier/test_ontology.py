@@ -0,0 +1,55 @@
+import pickle
+
+from classifier import misc
+from classifier.ontology import CompiledOntology, compile_ontology
+
+CSO = {
+    'topics': {'computer science': True, 'machine learning': True, 'neural networks': True,
+               'neural network': True, 'deep learning': True, 'artificial intelligence': True},
+    'broaders': {'computer science': ['artificial intelligence'],
+                 'artificial intelligence': ['machine learning'],
+                 'machine learning': ['neural networks', 'deep learning'],
+                 'neural networks': ['deep learning']},
+    'narrowers': {'artificial intelligence': ['computer science'],
+                  'machine learning': ['artificial intelligence'],
+                  'neural networks': ['machine learning'],
+                  'deep learning': ['machine learning', 'neural networks']},
+    'same_as': {'neural networks': ['neural network']},
+    'primary_labels': {'neural network': 'neural networks', 'neural networks': 'neural networks'},
+    'topics_wu': {'computer_science': 'computer science', 'machine_learning': 'machine learning',
+                  'neural_networks': 'neural networks', 'neural_network': 'neural network',
+                  'deep_learning': 'deep learning', 'artificial_intelligence': 'artificial intelligence'},
+    'primary_labels_wu': {'neural_network': 'neural_networks', 'neural_networks': 'neural_networks'},
+}
+
+
+def compiled(tmp_path):
+    path = str(tmp_path / 'cso.bin')
+    compile_ontology(CSO, path)
+    return CompiledOntology(path)
+
+
+def test_compiled_ontology_matches_dictionary(tmp_path):
+    cso = compiled(tmp_path)
+    assert list(cso) == list(CSO)
+    for field, mapping in CSO.items():
+        assert dict(cso[field]) == mapping
+        assert list(cso[field]) == list(mapping)
+    assert 'quantum computing' not in cso['topics']
+    assert cso['primary_labels'].get('deep learning', 'deep learning') == 'deep learning'
+
+
+def test_compiled_ontology_pickles_by_path(tmp_path):
+    cso = compiled(tmp_path)
+    copy = pickle.loads(pickle.dumps(cso))
+    assert copy.path == cso.path
+    assert dict(copy['broaders']) == CSO['broaders']
+
+
+def test_compiled_ontology_works_with_misc(tmp_path):
+    cso = compiled(tmp_path)
+    found = ['computer science', 'neural network']
+    for climb in ('first', 'all'):
+        assert misc.climb_ontology(cso, found, climb) == misc.climb_ontology(CSO, found, climb)
+    assert misc.get_network(cso, found) == misc.get_network(CSO, found)
+    assert misc.get_coverage(cso, found) == misc.get_coverage(CSO, found)
@@ -0,0 +1,63 @@
+import random
+
+from classifier.prunedmodel import PrunedModel
+from classifier.semanticmodule import CSOClassifierSemantic
+from classifier.test_ontology import CSO, compiled
+from classifier.tokenstore import TokenStore, build_token_store
+
+
+def random_model(seed=0):
+    rng = random.Random(seed)
+    topics = list(CSO['topics_wu']) + ['not_a_topic', 'quantum_computing']
+    return {'token_{}'.format(i): [{'topic': rng.choice(topics), 'sim_t': rng.choice([0.9, 0.94, 0.97, 1]),
+                                    'wet': 'w', 'sim_w': rng.choice([0.7, 1])} for _ in range(rng.randint(0, 6))]
+            for i in range(12)}
+
+
+def test_pruned_model_finds_the_same_topics():
+    rng = random.Random(1)
+    model = random_model()
+    pruned = CSOClassifierSemantic(model, CSO, nlp=object())
+    pruned.cache.maxsize = 0
+    unpruned = CSOClassifierSemantic(model, CSO, nlp=object())
+    unpruned.prune_model = False
+    unpruned.cache.maxsize = 0
+    for _ in range(200):
+        concepts = [' '.join('token_{}'.format(rng.randrange(14)) for _ in range(rng.randint(1, 4)))
+                    for _ in range(rng.randint(1, 5))]
+        for n in range(1, 4):
+            for start in range(3):
+                grams = tuple(concepts[0].split()[start:start + n])
+                if grams:
+                    assert pruned.match_gram(grams, 0.94) == unpruned.match_gram(grams, 0.94)
+        assert pruned.classify_concepts(concepts) == unpruned.classify_concepts(concepts)
+
+
+def test_pruned_model_is_saved_per_threshold(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    build_token_store(random_model(), path)
+    model, cso = TokenStore(path), compiled(tmp_path)
+    pruned = PrunedModel.for_model(model, cso, 0.94)
+    saved = PrunedModel.path_for(model, cso, 0.94)
+    assert saved != PrunedModel.path_for(model, cso, 0.96)
+    loaded = PrunedModel.load(saved, 0.94)
+    assert dict(loaded) == dict(pruned)
+    assert loaded.primary_labels == pruned.primary_labels == {'neural_network': 'neural_networks'}
+    assert all(item['sim_t'] >= 0.94 for items in loaded.values() for item in items)
+    assert loaded.shared(('token_1', 'token_2')) == pruned.shared(('token_1', 'token_2'))
+
+
+def test_pruned_model_is_read_back_from_its_file(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    build_token_store(random_model(), path)
+    model, cso = TokenStore(path), compiled(tmp_path)
+    stale = tmp_path / 'token-to-cso-pruned-v1-0123-4567-0.94.bin'
+    stale.write_bytes(b'')
+    pruned = PrunedModel.for_model(model, cso, 0.94)
+    assert isinstance(pruned.entries, TokenStore)
+    assert pruned.primary_labels == PrunedModel.build(model, cso, 0.94).primary_labels
+    assert dict(pruned) == dict(PrunedModel.build(model, cso, 0.94))
+    assert not stale.exists()
+    assert PrunedModel.for_model(model, cso, 0.94) is pruned
+    PrunedModel.clear_cache()
+    assert PrunedModel.for_model(model, cso, 0.94) is not pruned
@@ -0,0 +1,21 @@
+import random
+
+from classifier.ranking import rank_batch
+from classifier.semanticmodule import CSOClassifierSemantic
+from classifier.test_ontology import CSO
+from classifier.test_prunedmodel import random_model
+
+
+def test_batch_ranking_matches_per_paper_ranking():
+    rng = random.Random(2)
+    module = CSOClassifierSemantic(random_model(3), CSO, nlp=object())
+    batch = [[' '.join('token_{}'.format(rng.randrange(14)) for _ in range(rng.randint(1, 4)))
+              for _ in range(rng.randint(0, 8))] for _ in range(300)]
+    assert module.classify_concepts_batch(batch) == [module.classify_concepts(concepts) for concepts in batch]
+    assert any(module.classify_concepts_batch(batch))
+
+
+def test_ties_keep_the_first_topic_found():
+    matches = [[('a', 'x', False), ('b', 'y', False), ('c', 'z', False), ('c', 'x', False)], [],
+               [('a', 'y', False), ('b', 'x', True)]]
+    assert rank_batch(matches, lambda topic: topic) == [[('x', 4), ('y', 1), ('z', 1)], [], [('y', 1), ('x', 1)]]
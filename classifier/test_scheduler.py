@@ -0,0 +1,29 @@
+import random
+
+from classifier.scheduler import Utilization, pack, paper_cost, run_unit
+
+
+def test_units_have_about_the_same_cost():
+    rng = random.Random(0)
+    papers = {paper_id: {'title': 'paper', 'abstract': 'word ' * int(rng.paretovariate(1) * 20), 'keywords': ''}
+              for paper_id in range(500)}
+    units = pack(papers, 8)
+    assert sorted(paper_id for _, unit in units for paper_id in unit) == list(papers)
+    costs = [cost for cost, _ in units]
+    assert costs == sorted(costs, reverse=True)
+    assert all(list(unit) == sorted(unit) for _, unit in units)
+    largest = max(paper_cost(paper) for paper in papers.values())
+    assert costs[0] - costs[-1] <= largest
+    assert [cost for cost, _ in pack({1: 'a b c'}, 4)] == [paper_cost('a b c')]
+    assert pack({}, 4) == []
+
+
+def test_utilization_of_the_units():
+    utilization = Utilization()
+    for unit in pack({1: 'a b c', 2: 'd e', 3: 'f'}, 2):
+        result, stats = run_unit(len, unit)
+        assert result == stats[4]
+        utilization.add(stats)
+    stats = utilization.finish().stats()
+    assert len(stats['workers']) == 1 and stats['workers'][0]['papers'] == 3
+    assert 'elapsed' in utilization.report()
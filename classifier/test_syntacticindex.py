@@ -0,0 +1,45 @@
+import random
+
+import Levenshtein
+
+from classifier.ontology import CompiledOntology, compile_ontology
+from classifier.syntacticindex import SyntacticIndex
+from classifier.test_ontology import CSO
+
+
+def test_candidates_include_every_match():
+    rng = random.Random(0)
+    topics = {''.join(rng.choice('ab ') for _ in range(rng.randint(4, 30))): True for _ in range(2000)}
+    index = SyntacticIndex.build({'topics': topics, 'primary_labels': {}})
+    for _ in range(500):
+        gram = ''.join(rng.choice('ab ') for _ in range(rng.randint(4, 30)))
+        for min_similarity in (0.5, 0.9, 0.94, 0.96, 1):
+            candidates = {topic for topic, _ in index.candidates(gram, min_similarity)}
+            expected = {topic for topic in index.stems.get(gram[:4], [])
+                        if Levenshtein.ratio(topic, gram) >= min_similarity}
+            assert expected <= candidates
+
+
+def test_index_is_saved_next_to_compiled_ontology(tmp_path):
+    compile_ontology(CSO, str(tmp_path / 'cso.bin'))
+    cso = CompiledOntology(str(tmp_path / 'cso.bin'))
+    index = SyntacticIndex.for_ontology(cso)
+    assert SyntacticIndex.for_ontology(cso) is index
+    path = SyntacticIndex.path_for(cso)
+    assert path.startswith(str(tmp_path))
+    loaded = SyntacticIndex.load(path)
+    assert loaded.buckets == index.buckets
+    assert ('neural network', 'neural networks') in index.candidates('neural network', 0.94)
+
+
+def test_only_the_last_index_is_kept(tmp_path):
+    compile_ontology(CSO, str(tmp_path / 'cso.bin'))
+    cso = CompiledOntology(str(tmp_path / 'cso.bin'))
+    stale = tmp_path / 'cso-syntactic-v1-0123456789abcdef.p'
+    stale.write_bytes(b'')
+    index = SyntacticIndex.for_ontology(cso)
+    assert not stale.exists()
+    assert [path.name for path in tmp_path.glob('cso-syntactic-*')] == [SyntacticIndex.path_for(cso).split('/')[-1]]
+    other = SyntacticIndex.for_ontology(CSO)
+    assert SyntacticIndex.for_ontology(CSO) is other
+    assert SyntacticIndex.for_ontology(cso) is not index
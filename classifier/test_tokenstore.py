@@ -0,0 +1,63 @@
+import pickle
+import tracemalloc
+from collections.abc import Mapping
+
+from classifier.tokenstore import TokenStore, build_token_store
+
+MODEL = {
+    'neural': [{'topic': 'neural_networks', 'sim_t': 0.95, 'wet': 'neural_network', 'sim_w': 0.71}],
+    'network': [{'topic': 'neural_networks', 'sim_t': 0.95, 'wet': 'neural_network', 'sim_w': 0.68},
+                {'topic': 'network_architecture', 'sim_t': 1, 'wet': 'network_architecture', 'sim_w': 0.6}],
+    'données': [],
+}
+
+
+def test_token_store_matches_dictionary(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    build_token_store(MODEL, path)
+    store = TokenStore(path, cache_size=2)
+    assert dict(store) == MODEL
+    assert 'deep' not in store
+    assert store.get('deep') is None
+    assert store['network'] == MODEL['network']
+    assert store.cache_info().hits > 0
+    assert dict(pickle.loads(pickle.dumps(store))) == MODEL
+
+
+def test_lookups_return_their_own_copy(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    build_token_store(MODEL, path)
+    store = TokenStore(path)
+    store['network'].append({'topic': 'cooking'})
+    store['network'][0]['topic'] = 'cooking'
+    assert store['network'] == MODEL['network']
+
+
+class ComputedModel(Mapping):
+    # entries computed when they are read, as the pruned model writes them
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, token):
+        return [{'topic': 'topic_of_' + token, 'sim_t': 0.95, 'wet': 'word_of_' + token * 10, 'sim_w': 0.9}] * 3
+
+    def __iter__(self):
+        return ('token_{}'.format(i) for i in range(self.size))
+
+    def __len__(self):
+        return self.size
+
+
+def test_entries_are_written_one_at_a_time(tmp_path):
+    path = str(tmp_path / 'model.bin')
+    model = ComputedModel(10000)
+    tracemalloc.start()
+    try:
+        build_token_store(model, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    store = TokenStore(path)
+    assert store['token_7'] == model['token_7']
+    # less than the encoded entries alone
+    assert peak < store._offsets[-1]
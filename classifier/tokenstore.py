@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disk-backed, lazily decoded version of the cached model (token-to-cso-combined.json).
+
+json.load of the cached model builds every entry up front, although a paper only ever looks up a few hundred grams.
+The token store keeps the entries in a table file opened with mmap: grams are interned in a hashed string table and
+each entry is kept as its own small JSON document, which is decoded only when the gram is looked up. Recently used
+entries are kept decoded in an in-process LRU cache, and each lookup returns a copy of the cached entry.
+
+A lookup costs more than in the dictionary: about 13 us when the entry is decoded, and 2 us for the copy of a cached
+entry of 5 items, against well under 1 us. This is the price of loading in milliseconds instead of seconds and of
+keeping the entries out of the heap of every process. The classifier only looks up the grams that its own n-gram
+caches miss (see classifier.cache), so lookups are a small share of the time it spends on a paper.
+
+TokenStore is a read-only mapping from grams to lists of {"topic", "sim_t", "wet", "sim_w"} items, so it can be used
+wherever the dictionary loaded from the JSON file is used.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
+
+from classifier.mmapstore import MappedTables, StringTable, build_string_table, write_tables
+
+KIND = 'token-to-cso'
+FORMAT_VERSION = 1
+
+
+def build_token_store(model, path):
+    """Function that writes the cached model into a token store.
+
+    Args:
+        model (dictionary): the cached model, i.e., each token is linked to the corresponding CSO topics.
+        path (string): destination of the token store.
+    """
+
+    arrays = {}
+    keys = list(model)
+    for name, array in build_string_table(keys).items():
+        arrays['keys.' + name] = array
+
+    # the entries are encoded one at a time into a file next to the store, which is then mapped, so that they are
+    # never all in memory, even when the model computes them as they are read (see prunedmodel)
+    offsets = np.zeros(len(keys) + 1, dtype='<i8')
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))) as values:
+        for i, key in enumerate(keys):
+            entry = json.dumps(model[key], separators=(',', ':')).encode('utf-8')
+            values.write(entry)
+            offsets[i + 1] = offsets[i] + len(entry)
+        values.flush()
+        arrays['values.offsets'] = offsets
+        arrays['values.data'] = np.memmap(values, dtype='|u1', mode='r') if offsets[-1] else np.zeros(0, '|u1')
+
+        fingerprint = hashlib.sha1()
+        for name, array in arrays.items():
+            fingerprint.update(name.encode('utf-8'))
+            fingerprint.update(np.ascontiguousarray(array).data)
+
+        meta = {'version': FORMAT_VERSION, 'fingerprint': fingerprint.hexdigest()[:16], 'size': len(keys)}
+        write_tables(path, KIND, meta, arrays)
+
+
+class TokenStore(Mapping):
+    """The cached model opened from a token store."""
+
+    def __init__(self, path, cache_size=4096):
+        """Function that opens a token store.
+
+        Args:
+            path (string): location of the file created with build_token_store().
+            cache_size (integer): how many decoded entries to keep in memory. None keeps all of them.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.tables = MappedTables(path, kind=KIND)
+        if self.tables.meta['version'] != FORMAT_VERSION:
+            raise ValueError('{} has format version {}, expected {}'.format(path, self.tables.meta['version'],
+                                                                           FORMAT_VERSION))
+        self.fingerprint = self.tables.meta['fingerprint']
+        self.keys_table = StringTable(self.tables, 'keys')
+        self._offsets = self.tables.view('values.offsets')
+        self._data = self.tables.view('values.data')
+        self._lookup = lru_cache(maxsize=cache_size)(self._load)
+
+    def __reduce__(self):
+        # Processes receive the path and map the file themselves, instead of a copy of its content
+        return self.__class__, (self.path, self.cache_size)
+
+    def _load(self, gram):
+        i = self.keys_table.find(gram)
+        if i < 0:
+            return None
+        return json.loads(str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8'))
+
+    def __contains__(self, gram):
+        return isinstance(gram, str) and self._lookup(gram) is not None
+
+    def __getitem__(self, gram):
+        entry = self._lookup(gram) if isinstance(gram, str) else None
+        if entry is None:
+            raise KeyError(gram)
+        # the cached entry is shared by all the lookups of the gram, so each caller gets its own copy
+        return _copy(entry)
+
+    def __iter__(self):
+        for i in range(len(self.keys_table)):
+            yield self.keys_table[i]
+
+    def __len__(self):
+        return len(self.keys_table)
+
+    def cache_info(self):
+        """Function that returns the hits, misses and size of the hot-entry cache."""
+        return self._lookup.cache_info()
+
+
+def _copy(value):
+    """Function that copies an entry: the list and its items, which are flat (see build_token_store), or a dict."""
+    if isinstance(value, list):
+        return [item.copy() if isinstance(item, (dict, list)) else item for item in value]
+    if isinstance(value, dict):
+        return value.copy()
+    return value
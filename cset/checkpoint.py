@@ -0,0 +1,87 @@
+"""
+Checkpointed output of the predictions for an input file.
+
+The predictions are appended to `<output>.partial`. Every `commit_every` predictions, the partial output is flushed
+and synced, and its size is written to `<output>.journal`, which is replaced atomically. A restarted run truncates
+the partial output to the journaled size, which drops any prediction written after the last commit, and reads the ids
+of the committed predictions, so that those papers are not classified again. Once every paper is written, the
+partial output is renamed to the output, which therefore only ever exists complete.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Set
+
+
+class CheckpointedOutput:
+
+    def __init__(self, path: Path, commit_every=100):
+        self.path = path
+        self.partial = path.with_name(path.name + '.partial')
+        self.journal = path.with_name(path.name + '.journal')
+        self.commit_every = commit_every
+        # ids of the papers whose prediction is committed, including those of a previous run
+        self.done: Set = set()
+        self.resumed = 0
+        self._file = None
+        self._pending = 0
+
+    def __enter__(self):
+        committed = int(self.journal.read_text()) if self.journal.exists() else 0
+        self._file = self.partial.open('a+b')
+        committed = min(committed, os.fstat(self._file.fileno()).st_size)
+        # anything after the last commit may be a prediction cut short by the end of the previous run
+        self._file.truncate(committed)
+        self._file.seek(0)
+        for line in self._file:
+            self.done.add(json.loads(line)['id'])
+        self.resumed = len(self.done)
+        return self
+
+    def write(self, prediction: dict) -> None:
+        self._file.write((json.dumps(prediction) + '\n').encode())
+        self.done.add(prediction['id'])
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        # the predictions reach the disk before the journal that points past them
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        _replace(self.journal, str(self._file.tell()))
+        self._pending = 0
+
+    def close(self, finalize=True) -> None:
+        # without finalize, the output stays partial, to be resumed by the next run
+        try:
+            self.commit()
+        finally:
+            self._file.close()
+        if finalize:
+            os.replace(self.partial, self.path)
+            self.journal.unlink()
+            _sync_directory(self.path.parent)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(finalize=exc_type is None)
+
+
+def _replace(path: Path, text: str) -> None:
+    # write aside, sync, then rename over the previous version, so that a crash leaves one of the two versions
+    temporary = path.with_name(path.name + '.tmp')
+    with temporary.open('wt') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _sync_directory(path.parent)
+
+
+def _sync_directory(path: Path) -> None:
+    # makes the renames in the directory durable
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,70 @@
+"""
+Two-pass classification of a corpus.
+
+Across a corpus, the distinct ngrams and concepts are a small fraction of all of them. Pass 1 collects them from the
+analysed papers and matches each of them once, in parallel, into caches for the syntactic and semantic classifiers.
+Pass 2 classifies each paper with these caches, which return the same matches as per-paper classification.
+"""
+import math
+from collections import Counter
+from functools import partial
+from multiprocessing import get_all_start_methods, get_context
+from typing import Callable, Iterable, List, Tuple
+
+from nltk import everygrams, ngrams
+
+from classifier.cache import LRUCache
+from classifier.document import AnalyzedDocument
+from cset.semantic import extract_concepts, lookup_concept
+from cset.syntactic import INDEX
+
+
+def build_caches(documents: Iterable[AnalyzedDocument], workers=1, min_similarity=.96, fuzzy_index=True,
+                 exact_matching=True, merge=True) -> Tuple[LRUCache, LRUCache]:
+    # pass 1: the streams of each document are computed, then its spaCy document is released to save memory
+    grams = Counter()
+    concept_ngrams = set()
+    for document in documents:
+        tokens = document.clean_tokens
+        for n in range(3, 0, -1):
+            grams.update(" ".join(gram) for gram in ngrams(tokens, n))
+        for concept in extract_concepts(document):
+            concept_ngrams.update(everygrams(concept.split(), 1, 3))
+        document.release()
+    # match_ngrams skips the tokens already matched by a longer ngram, so the ngrams seen once are left to pass 2,
+    # and the ngrams that are exactly a topic have their own memo in the index
+    exact = INDEX.matcher.exact if exact_matching else {}
+    grams = sorted(gram for gram, count in grams.items() if count > 1 and gram not in exact)
+
+    # both caches are unbounded, so that pass 2 also matches each remaining ngram only once
+    syntactic_cache = LRUCache(None)
+    for key, found in parallel_map(partial(_match_grams, min_similarity=min_similarity, fuzzy_index=fuzzy_index),
+                                   grams, workers):
+        syntactic_cache.put(key, found)
+    semantic_cache = LRUCache(None)
+    for key, found in parallel_map(partial(_match_concepts, merge=merge, min_similarity=min_similarity),
+                                   sorted(concept_ngrams), workers):
+        semantic_cache.put(key, found)
+    return syntactic_cache, semantic_cache
+
+
+def parallel_map(function: Callable, items: List, workers=1) -> List:
+    # apply function to chunks of items, in forked processes that share the ontology and the model loaded on import.
+    # Without fork, the processes import them again
+    if workers == 1 or len(items) <= 1:
+        return function(items)
+    chunk_size = math.ceil(len(items) / (workers * 4))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with get_context('fork' if 'fork' in get_all_start_methods() else None).Pool(workers) as pool:
+        return [result for chunk in pool.map(function, chunks) for result in chunk]
+
+
+def _match_grams(grams: List[str], min_similarity, fuzzy_index):
+    return [((gram, min_similarity, fuzzy_index), INDEX.match(gram, min_similarity, fuzzy=fuzzy_index))
+            for gram in grams]
+
+
+def _match_concepts(concept_ngrams: List[Tuple], merge, min_similarity):
+    # no cache in the workers, each ngram is only matched once
+    return [((ngram, merge, min_similarity), lookup_concept(ngram, merge, min_similarity, cache=LRUCache(0)))
+            for ngram in concept_ngrams]
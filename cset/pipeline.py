@@ -0,0 +1,218 @@
+"""
+Pipelined classification of the CSET files.
+
+A reader thread streams the papers of the files, in chunks, to classifier processes, and the main process writes
+their predictions. The stages are connected by bounded queues, and at most `max_in_flight` chunks are read and not yet
+written, so that memory stays flat and each stage works while the others wait on I/O or on the CPU. The reader goes
+from one file to the next without waiting for the predictions of the previous one, so the classifiers stay busy
+across files. The writer puts the chunks of each file back in order, so that the output is the same as classifying
+the papers one by one, and checkpoints it (see cset.checkpoint). Each stage reports its throughput at the end.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from classifier.misc import chunks_of_stream
+from classifier.scheduler import Utilization, run_unit
+from cset.checkpoint import CheckpointedOutput
+from cset.model import Paper
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """Papers handled by a stage, and the time it spent on them rather than waiting on the other stages."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.papers = 0
+        self.busy = 0.0
+
+    def add(self, papers: int, start: float) -> None:
+        self.papers += papers
+        self.busy += time.monotonic() - start
+
+    def report(self, elapsed: float) -> str:
+        return '{}: {} papers, busy {:.1f} s, {:.1f} papers / busy s, {:.1f} papers / s'.format(
+            self.name, self.papers, self.busy, self.papers / self.busy if self.busy else 0.0,
+            self.papers / elapsed if elapsed else 0.0)
+
+
+def read_papers(path: Path, done=()) -> Iterator[Tuple[str, Paper]]:
+    # the papers of a file, except those already written, as in a dict of the papers by id: a repeated id is read once,
+    # at its first line, with its last record. A record without an id can't be written, so it's skipped
+    last = {}  # offset of the last record of each id
+    with path.open('rb') as f:
+        offset = 0
+        for line in f:
+            record = json.loads(line)
+            if 'id' in record:
+                last[record['id']] = offset
+            offset += len(line)
+    sent = set()
+    with path.open('rb') as f, path.open('rb') as repeated:
+        offset = 0
+        for number, line in enumerate(f, 1):
+            record = json.loads(line)
+            if 'id' not in record:
+                logger.error(f'Skipping the record without id on line {number} of {path}')
+            elif record['id'] not in done and record['id'] not in sent:
+                sent.add(record['id'])
+                if last[record['id']] != offset:
+                    repeated.seek(last[record['id']])
+                    record = json.loads(repeated.readline())
+                yield record['id'], Paper(title=record.get('title'), keywords=record.get('keywords'),
+                                          abstract=record.get('abstract'))
+            offset += len(line)
+
+
+def classify_files(files: List[Tuple[Path, Path]], classify: Callable, workers=1, chunk_size=64, commit_every=100,
+                   max_in_flight=None, counter: Optional[Counter] = None) -> dict:
+    """Classify the papers of input files into their outputs, with a reader, `workers` classifier processes and a
+    writer.
+
+    `classify` takes a dict of papers by id and returns their predictions, in order, each with its 'id'. Where the
+    "fork" start method is available, it runs in processes forked from this one, so it need not be picklable.
+    Elsewhere, it is pickled to processes started with the default method, which import its module again. The counts
+    that it adds to `counter` (e.g. cset.semantic.MISSES) in the workers are added to it here. Records without an id
+    are logged and skipped. If a stage fails, the outputs are left partial, to be resumed by the next run.
+    """
+    max_in_flight = 4 * workers if max_in_flight is None else max_in_flight
+    outputs = []
+    for path, output_path in files:
+        output = CheckpointedOutput(output_path, commit_every=commit_every).__enter__()
+        if output.resumed:
+            logger.info(f'Resuming {output_path} after {output.resumed} written predictions')
+        outputs.append(output)
+
+    context = get_context('fork' if 'fork' in get_all_start_methods() else None)
+    tasks = context.Queue(maxsize=workers * 2)
+    results = context.Queue(maxsize=workers * 2)
+    # taken by the reader for each chunk, given back by the writer once the chunk is written
+    slots = threading.Semaphore(max_in_flight)
+    stop = threading.Event()
+    reader, writer, utilization = StageStats('reader'), StageStats('writer'), Utilization()
+
+    # the classifiers are started before the reader thread, so that no thread runs when they are forked
+    processes = [context.Process(target=_classify_worker, args=(classify, tasks, results, counter), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # the writer adds to output.done as it goes, so the reader skips the ids written when the run starts
+    done = [set(output.done) for output in outputs]
+    thread = threading.Thread(target=_read, args=([path for path, _ in files], done, tasks, results, slots, stop,
+                                                  chunk_size, workers, reader), daemon=True)
+    thread.start()
+
+    pending = [dict() for _ in files]
+    written = [0] * len(files)
+    ends = [None] * len(files)
+    open_files, stopped = len(files), 0
+    progress = tqdm(unit='papers')
+    try:
+        while open_files or stopped < workers:
+            message = results.get()
+            if message[0] == 'error':
+                raise RuntimeError('A stage of the pipeline failed:\n' + message[1])
+            if message[0] == 'stop':
+                if counter is not None:
+                    counter.update(message[1])
+                stopped += 1
+                continue
+            if message[0] == 'end':
+                _, index, chunks = message
+                ends[index] = chunks
+            else:
+                _, index, seq, predictions, stats = message
+                pending[index][seq] = predictions
+                utilization.add(stats)
+            # the chunks of the file that are next in order
+            while written[index] in pending[index]:
+                start = time.monotonic()
+                predictions = pending[index].pop(written[index])
+                for prediction in predictions:
+                    outputs[index].write(prediction)
+                writer.add(len(predictions), start)
+                progress.update(len(predictions))
+                written[index] += 1
+                slots.release()
+            if ends[index] is not None and written[index] == ends[index]:
+                outputs[index].close()
+                outputs[index] = ends[index] = None
+                open_files -= 1
+    except BaseException:
+        stop.set()
+        slots.release(max_in_flight)
+        for process in processes:
+            process.terminate()
+        tasks.cancel_join_thread()
+        for output in outputs:
+            if output is not None:
+                output.close(finalize=False)
+        raise
+    finally:
+        progress.close()
+    for process in processes:
+        process.join()
+
+    utilization.finish()
+    elapsed = utilization.end - utilization.start
+    classifier_stats = utilization.stats()
+    classifiers = StageStats('classifiers')
+    classifiers.papers = sum(worker['papers'] for worker in classifier_stats['workers'])
+    classifiers.busy = sum(worker['busy'] for worker in classifier_stats['workers'])
+    for stage in (reader, classifiers, writer):
+        logger.info(stage.report(elapsed))
+    logger.info('classifier processes:\n' + utilization.report())
+    return {'elapsed': elapsed, 'reader': vars(reader), 'classifiers': classifier_stats, 'writer': vars(writer)}
+
+
+def _read(paths, done, tasks, results, slots, stop, chunk_size, workers, stats):
+    # reader thread: chunks of the papers of each file, numbered in order, then the number of chunks of the file
+    try:
+        for index, path in enumerate(paths):
+            chunks = 0
+            papers = chunks_of_stream(read_papers(path, done[index]), chunk_size)
+            while True:
+                start = time.monotonic()
+                chunk = next(papers, None)
+                if chunk is None:
+                    break
+                stats.add(len(chunk), start)
+                slots.acquire()
+                if stop.is_set():
+                    return
+                tasks.put((index, chunks, (sum(len(paper.text) for paper in chunk.values()), chunk)))
+                chunks += 1
+            results.put(('end', index, chunks))
+        for _ in range(workers):
+            tasks.put(None)
+    except BaseException:
+        results.put(('error', traceback.format_exc()))
+
+
+def _classify_worker(classify, tasks, results, counter):
+    # classifier process: predictions of each chunk, then the counts of the process once there are no more chunks
+    if counter is not None:
+        counter.clear()
+    while True:
+        task = tasks.get()
+        if task is None:
+            results.put(('stop', counter))
+            return
+        index, seq, unit = task
+        try:
+            predictions, stats = run_unit(classify, unit)
+        except BaseException:
+            results.put(('error', 'process {}: {}'.format(os.getpid(), traceback.format_exc())))
+            return
+        results.put(('chunk', index, seq, predictions, stats))
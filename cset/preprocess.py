@@ -1,19 +1,38 @@
+from typing import Iterable, Iterator, Union
+
 import spacy
 
+from classifier.document import AnalyzedDocument, analyze_texts
 from cset.model import Paper
 
 tokenizer = spacy.load('en_core_web_sm', disable=['tagger', 'parser', 'ner'])
 tagger = spacy.load('en_core_web_sm', disable=['parser', 'ner'])
 
 
-def clean_tokens(paper: Paper) -> str:
+def analyze(paper: Paper) -> AnalyzedDocument:
+    # tokenize and tag the paper once, for both the syntactic and semantic classifiers
+    return AnalyzedDocument(paper.text, tagger)
+
+
+def analyze_many(papers: Iterable[Paper], batch_size=64) -> Iterator[AnalyzedDocument]:
+    # tag the papers in batches with nlp.pipe; the parser and the entity recognizer are disabled in the tagger
+    return analyze_texts((paper.text for paper in papers), tagger, batch_size=batch_size)
+
+
+def clean_tokens(paper: Union[Paper, AnalyzedDocument]) -> str:
+    if isinstance(paper, AnalyzedDocument):
+        yield from paper.clean_tokens
+        return
     doc = tokenizer(paper.text)
     for token in doc:
         if not any((token.is_stop, token.is_punct)):
             yield token.lower_
 
 
-def tag_tokens(paper: Paper) -> str:
+def tag_tokens(paper: Union[Paper, AnalyzedDocument]) -> str:
+    if isinstance(paper, AnalyzedDocument):
+        yield from paper.tagged
+        return
     doc = tagger(paper.text)
     for token in doc:
         if token.tag_:
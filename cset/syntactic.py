@@ -1,29 +1,40 @@
-import re
-from collections import defaultdict
+from collections import Counter, defaultdict
 from typing import List
 
-from Levenshtein.StringMatcher import StringMatcher
 from nltk import ngrams
 
+from classifier.cache import LRUCache
+from classifier.syntacticindex import SyntacticIndex
 from cset.classify import CSO
 from cset.preprocess import clean_tokens
 
-# Computing the topic stems once here instead of with each iteration offers compute gains
-TOPIC_STEMS = defaultdict(list)
-for k in CSO['topics'].keys():
-    TOPIC_STEMS[k[:4]].append(k)
+# The index groups topics by their first 4 characters and by length, with their primary labels resolved. It's built
+# once per ontology version and shared with classifier.syntacticmodule
+INDEX = SyntacticIndex.for_ontology(CSO)
+TOPIC_STEMS = INDEX.stems
+# Matches of the ngrams by ngram and thresholds, shared by the papers classified in this process. Pass another cache to
+# match_ngrams to change its size, or LRUCache(0) to disable it
+GRAM_CACHE = LRUCache(100000)
 
 
-def classify_syntactic(paper, min_similarity=.96):
+def classify_syntactic(paper, min_similarity=.96, fuzzy_index=True, exact_matching=True, stats: Counter = None,
+                       cache: LRUCache = GRAM_CACHE):
     tokens = clean_tokens(paper)
-    topics = match_ngrams(list(tokens), min_similarity=min_similarity)
+    topics = match_ngrams(list(tokens), min_similarity=min_similarity, fuzzy_index=fuzzy_index,
+                          exact_matching=exact_matching, stats=stats, cache=cache)
     topics = list(set(topics.keys()))
     return topics
 
 
-def match_ngrams(tokens: List, min_similarity=.96):
+def match_ngrams(tokens: List, min_similarity=.96, fuzzy_index=True, exact_matching=True, stats: Counter = None,
+                 cache: LRUCache = GRAM_CACHE):
     found_topics = defaultdict(list)
     matches = set()
+    # count the ngrams analysed, matched exactly and compared with the topics, if asked to
+    if stats is None:
+        stats = Counter()
+    # ngrams that are exactly a topic, by (n, i), found in one pass over the tokens
+    exact = INDEX.exact_grams(tokens) if exact_matching else {}
     for n in range(3, 0, -1):
         # i indexes the same token in the text whether we're matching by unigram, bigram, or trigram
         for i, grams in enumerate(ngrams(tokens, n)):
@@ -32,34 +43,25 @@ def match_ngrams(tokens: List, min_similarity=.96):
                 continue
             # otherwise unsplit the ngram for matching so ('quick', 'brown') => 'quick brown'
             gram = " ".join(grams)
-            try:
-                # if there isn't an exact match on the first 4 characters of the ngram and a topic, move on
-                topic_block = TOPIC_STEMS[gram[:4]]
-            except KeyError:
-                continue
-            for topic in topic_block:
-                # otherwise look for an inexact match
-                match_ratio = StringMatcher(None, topic, gram).ratio()
-                if match_ratio >= min_similarity:
-                    try:
-                        # if a 'primary label' exists for the current topic, use it instead of the matched topic
-                        topic = CSO['primary_labels'][topic]
-                    except KeyError:
-                        pass
-                    # note the tokens that matched the topic and how closely
-                    found_topics[topic].append({'matched': gram, 'similarity': match_ratio})
-                    # don't reprocess the current token
-                    matches.add(i)
+            stats['grams'] += 1
+            if (n, i) in exact:
+                # the ngram is a topic, whose matches are computed once and reused
+                found = INDEX.match_topic(exact[n, i], min_similarity, fuzzy=fuzzy_index)
+                stats['exact'] += 1
+            else:
+                # the ngram may have been matched already, in this paper or an earlier one
+                found = cache.get((gram, min_similarity, fuzzy_index))
+                if found is None:
+                    # look for inexact matches among the topics sharing the first 4 characters of the ngram, either
+                    # with the fuzzy matcher or by comparing the ngram with each of them: both find the same topics
+                    found = INDEX.match(gram, min_similarity, fuzzy=fuzzy_index)
+                    cache.put((gram, min_similarity, fuzzy_index), found)
+                    stats['fuzzy'] += 1
+                else:
+                    stats['cached'] += 1
+            for topic, primary_label, match_ratio in found:
+                # note the tokens that matched the topic (by its 'primary label') and how closely
+                found_topics[primary_label].append({'matched': gram, 'similarity': match_ratio})
+                # don't reprocess the current token
+                matches.add(i)
     return found_topics
-
-
-def collapse_tree(node):
-    concept = ''
-    for text, tag in node.leaves():
-        text = re.sub('[\=\,\…\’\'\+\-\–\“\”\"\/\‘\[\]\®\™\%]', ' ', text)
-        text = re.sub('\.$|^\.', '', text)
-        text = text.lower().strip()
-        concept += ' ' + text
-    concept = re.sub('\.+', '.', concept)
-    concept = re.sub('\s+', ' ', concept)
-    return concept
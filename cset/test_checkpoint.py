@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from cset.checkpoint import CheckpointedOutput
+
+
+def test_interrupted_output_resumes_after_the_last_commit(tmp_path):
+    path = tmp_path / 'predictions.jsonl'
+    with pytest.raises(KeyboardInterrupt):
+        with CheckpointedOutput(path, commit_every=2) as output:
+            for paper_id in range(5):
+                output.write({'id': paper_id, 'topics': []})
+            # a prediction cut short, after the last commit
+            output._file.write(b'{"id": 5, "to')
+            output._file.flush()
+            output.commit = lambda: None
+            raise KeyboardInterrupt
+    assert not path.exists()
+
+    with CheckpointedOutput(path, commit_every=2) as output:
+        assert output.done == {0, 1, 2, 3} and output.resumed == 4
+        for paper_id in range(6):
+            if paper_id not in output.done:
+                output.write({'id': paper_id, 'topics': []})
+    assert [json.loads(line)['id'] for line in path.open()] == list(range(6))
+    assert not output.partial.exists() and not output.journal.exists()
+
+
+def test_error_commits_the_written_predictions(tmp_path):
+    path = tmp_path / 'predictions.jsonl'
+    with pytest.raises(KeyError):
+        with CheckpointedOutput(path, commit_every=100) as output:
+            output.write({'id': 'a'})
+            raise KeyError('b')
+    with CheckpointedOutput(path) as output:
+        assert output.done == {'a'}
+    assert path.read_text() == '{"id": "a"}\n'
@@ -0,0 +1,95 @@
+import json
+import time
+from collections import Counter
+from multiprocessing import get_context
+
+import pytest
+
+from cset.checkpoint import CheckpointedOutput
+from cset.pipeline import classify_files
+
+COUNTS = Counter()
+
+
+def classify(papers):
+    # slower for the first papers of each file, so that the chunks complete out of order
+    predictions = []
+    for paper_id, paper in papers.items():
+        time.sleep(0.02 if paper_id.endswith('-0') else 0)
+        COUNTS.update(paper.title.split())
+        predictions.append({'id': paper_id, 'length': len(paper.text)})
+    return predictions
+
+
+def write_file(path, size):
+    with path.open('wt') as f:
+        for i in range(size):
+            f.write(json.dumps({'id': '{}-{}'.format(path.stem, i), 'title': 'paper {}'.format(i)}) + '\n')
+
+
+def test_pipeline_writes_the_files_in_order(tmp_path):
+    files = []
+    for name, size in (('a', 25), ('b', 0), ('c', 40)):
+        write_file(tmp_path / (name + '.jsonl'), size)
+        files.append((tmp_path / (name + '.jsonl'), tmp_path / ('out-' + name + '.jsonl')))
+    # a previous run wrote the first papers of c
+    with pytest.raises(KeyboardInterrupt):
+        with CheckpointedOutput(files[2][1]) as output:
+            for i in range(7):
+                output.write({'id': 'c-{}'.format(i), 'length': 7})
+            raise KeyboardInterrupt
+
+    COUNTS.clear()
+    stats = classify_files(files, classify, workers=2, chunk_size=3, max_in_flight=4, counter=COUNTS)
+    for (path, output_path), size in zip(files, (25, 0, 40)):
+        ids = [json.loads(line)['id'] for line in output_path.open()]
+        assert ids == ['{}-{}'.format(path.stem, i) for i in range(size)]
+    assert COUNTS['paper'] == 25 + 40 - 7
+    assert stats['reader']['papers'] == stats['writer']['papers'] == 25 + 40 - 7
+
+
+def test_pipeline_skips_the_records_without_id(tmp_path):
+    path = tmp_path / 'a.jsonl'
+    write_file(path, 10)
+    lines = path.read_text().splitlines(keepends=True)
+    lines.insert(5, json.dumps({'title': 'no id'}) + '\n')
+    path.write_text(''.join(lines))
+    output_path = tmp_path / 'out-a.jsonl'
+    classify_files([(path, output_path)], classify, workers=1, chunk_size=4)
+    ids = [json.loads(line)['id'] for line in output_path.open()]
+    assert ids == ['a-{}'.format(i) for i in range(10)]
+
+
+def test_pipeline_runs_without_fork(tmp_path, monkeypatch):
+    # the classifiers are then started with the default method, which pickles classify
+    monkeypatch.setattr('cset.pipeline.get_all_start_methods', lambda: ['spawn'])
+    monkeypatch.setattr('cset.pipeline.get_context', lambda method=None: get_context(method or 'spawn'))
+    path = tmp_path / 'a.jsonl'
+    write_file(path, 10)
+    output_path = tmp_path / 'out-a.jsonl'
+    classify_files([(path, output_path)], classify, workers=2, chunk_size=4)
+    ids = [json.loads(line)['id'] for line in output_path.open()]
+    assert ids == ['a-{}'.format(i) for i in range(10)]
+
+
+def test_pipeline_writes_a_repeated_id_once(tmp_path):
+    # as a dict of the papers by id: at the first line of the id, with its last record
+    path = tmp_path / 'a.jsonl'
+    with path.open('wt') as f:
+        for title in ('paper', 'paper with a longer title'):
+            for i in range(400):
+                f.write(json.dumps({'id': 'a-{}'.format(i), 'title': '{} {}'.format(title, i)}) + '\n')
+    expected = [{'id': 'a-{}'.format(i), 'length': len('paper with a longer title {}'.format(i))} for i in range(400)]
+    output_path = tmp_path / 'out-a.jsonl'
+    classify_files([(path, output_path)], classify, workers=2, chunk_size=3, max_in_flight=4)
+    assert [json.loads(line) for line in output_path.open()] == expected
+
+    # a resumed run writes the same
+    resumed_path = tmp_path / 'resumed-a.jsonl'
+    with pytest.raises(KeyboardInterrupt):
+        with CheckpointedOutput(resumed_path) as output:
+            for prediction in expected[:150]:
+                output.write(prediction)
+            raise KeyboardInterrupt
+    classify_files([(path, resumed_path)], classify, workers=2, chunk_size=3, max_in_flight=4)
+    assert [json.loads(line) for line in resumed_path.open()] == expected
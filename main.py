@@ -5,20 +5,29 @@ We fetch a set of paper titles, abstracts and keywords from BigQuery, run the CS
 result to the `demo` directory as `demo-predictions.json`.
 """
 import argparse
-import json
 import logging
 import sys
+from collections import Counter
+from functools import partial
 from pathlib import Path
+from typing import Dict, List, Optional
 
 from tqdm import tqdm
 
 from classifier import misc
+from classifier.cachebuilder import write_misses
+from classifier.document import AnalyzedDocument
 from classifier.misc import climb_ontology
 from classifier.semanticmodule import CSOClassifierSemantic
 from classifier.syntacticmodule import CSOClassifierSyntactic
+from cset import semantic, syntactic
+from cset.checkpoint import CheckpointedOutput
+from cset.corpus import build_caches
 from cset.semantic import classify_semantic
 from cset.syntactic import classify_syntactic
 from cset.model import Paper
+from cset.pipeline import classify_files, read_papers
+from cset.preprocess import analyze, analyze_many
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -36,39 +45,96 @@ def load_cso():
     return cso
 
 
-def predict_cset(paper: Paper, cso):
-    syntactic = classify_syntactic(paper)
-    semantic = classify_semantic(paper)
-    enhanced = climb_ontology(cso, set(syntactic).union(semantic), 'all')
-    return dict(syntactic=syntactic, semantic=semantic, enhanced=enhanced)
+def predict_cset(paper: Paper, cso, syntactic_cache=syntactic.GRAM_CACHE, semantic_cache=semantic.GRAM_CACHE,
+                 counter: Optional[Counter] = None):
+    # tokenize and tag the paper once for both classifiers, unless it's already analysed
+    document = paper if isinstance(paper, AnalyzedDocument) else analyze(paper)
+    syntactic_topics = classify_syntactic(document, cache=syntactic_cache)
+    semantic_topics = classify_semantic(document, cache=semantic_cache, counter=counter)
+    enhanced = climb_ontology(cso, set(syntactic_topics).union(semantic_topics), 'all')
+    return dict(syntactic=syntactic_topics, semantic=semantic_topics, enhanced=enhanced)
 
 
-def classify_cset(output_prefix='cset-predictions') -> None:
-    """Run the CSO Classifier on CS articles from Web of Science."""
+def predict_papers(papers: Dict[str, Paper], cso, batch_size=64, counter: Optional[Counter] = None) -> List[dict]:
+    # the predictions of a chunk of papers, for the classifier processes of the pipeline
+    predictions = []
+    for paper_id, document in zip(papers, analyze_many(papers.values(), batch_size=batch_size)):
+        prediction = predict_cset(document, cso, counter=counter)
+        prediction.update({'id': paper_id})
+        predictions.append(prediction)
+    return predictions
+
+
+def classify_corpus_file(path: Path, output_path: Path, cso, workers=1, batch_size=64, commit_every=100,
+                         counter: Optional[Counter] = None) -> None:
+    # records without an id are skipped, as in the pipeline
+    papers = dict(read_papers(path))
+    with CheckpointedOutput(output_path, commit_every=commit_every) as output:
+        if output.resumed:
+            logger.info(f'Resuming {output_path} after {output.resumed} written predictions')
+            papers = {paper_id: paper for paper_id, paper in papers.items() if paper_id not in output.done}
+        documents = dict(tqdm(zip(papers, analyze_many(papers.values(), batch_size=batch_size)), total=len(papers)))
+        syntactic_cache, semantic_cache = build_caches(documents.values(), workers=workers)
+        for paper_id, document in tqdm(documents.items()):
+            prediction = predict_cset(document, cso, syntactic_cache, semantic_cache, counter)
+            prediction.update({'id': paper_id})
+            output.write(prediction)
+
+
+def classify_cset(output_prefix='cset-predictions', corpus=False, workers=1, batch_size=64, misses_path=None,
+                  top_misses=None, commit_every=100) -> None:
+    """Run the CSO Classifier on CS articles from Web of Science.
+
+    The papers are tagged by spaCy in batches of `batch_size`.
+
+    By default, a reader streams the papers of all the files in chunks of `batch_size` to `workers` classifier
+    processes, and the predictions are written back in the order of the papers (see cset.pipeline).
+
+    In corpus mode, the papers of each file are analysed first and their distinct ngrams matched once, by `workers`
+    processes, before each paper is classified (see cset.corpus). The predictions are the same.
+
+    The predictions of each file are checkpointed every `commit_every` papers (see cset.checkpoint), so that a run
+    that stops resumes each file after its last committed prediction. The output of a file only appears once all of
+    its papers are written.
+
+    If `misses_path` is given, the ngrams missing from the cached model are counted, and the `top_misses` most frequent
+    ones are written there after the run, for classifier.cachebuilder.
+    """
+    # the missing ngrams are only counted if they are written
+    counter = semantic.MISSES if misses_path is not None else None
     cso = load_cso()
     data_dir = Path(__file__).parent / 'data'
-    for path in data_dir.glob('*.jsonl'):
-        records = (json.loads(line) for line in path.open('rt'))
-        try:
-            papers = {record['id']: Paper(title=record.get('title'), keywords=record.get('keywords'),
-                                          abstract=record.get('abstract'))
-                      for record in records}
-        except KeyError as e:
-            logger.error(f'KeyError reading {path}: {e}')
-            continue
+    files = []
+    for path in sorted(data_dir.glob('*.jsonl')):
         output_path = path.with_name('{}-{}'.format(output_prefix, path.name))
         if output_path.exists():
             logger.info(f'Skipping existing output {output_path}')
-            continue
-        with output_path.open('wt') as f:
-            for paper_id, paper in tqdm(papers.items()):
-                prediction = predict_cset(paper, cso)
-                prediction.update({'id': paper_id})
-                f.write(json.dumps(prediction) + '\n')
+        elif corpus:
+            classify_corpus_file(path, output_path, cso, workers, batch_size, commit_every, counter)
+        else:
+            files.append((path, output_path))
+    if files:
+        classify_files(files, partial(predict_papers, cso=cso, batch_size=batch_size, counter=counter),
+                       workers=workers, chunk_size=batch_size, commit_every=commit_every, counter=counter)
+    if counter is not None:
+        write_misses(counter, misses_path, top_misses)
+        logger.info(f'{len(counter)} ngrams missing from the cached model, written to {misses_path}')
+        counter.clear()
 
 
 if __name__ == '__main__':
     logger.addHandler(logging.StreamHandler(sys.stdout))
     parser = argparse.ArgumentParser(usage='Run the CSO Classifier over CS articles from Web of Science.')
+    parser.add_argument('--corpus', action='store_true',
+                        help='match the distinct ngrams of each file once, before classifying its papers')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='classifier processes, or processes matching the ngrams in corpus mode')
+    parser.add_argument('--batch-size', type=int, default=64, help='papers tagged by spaCy at once')
+    parser.add_argument('--commit-every', type=int, default=100,
+                        help='papers written between two checkpoints of the output of a file')
+    parser.add_argument('--misses', default=None,
+                        help='file where to write the ngrams most often missing from the cached model')
+    parser.add_argument('--top-misses', type=int, default=None, help='how many missing ngrams to write, by default all')
     args = parser.parse_args()
-    classify_cset()
+    classify_cset(corpus=args.corpus, workers=args.workers, batch_size=args.batch_size, misses_path=args.misses,
+                  top_misses=args.top_misses, commit_every=args.commit_every)